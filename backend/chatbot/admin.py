@@ -1,3 +1,18 @@
 from django.contrib import admin
+from .models import ChatJob, ChatTrace
 
-# Register your models here.
+
+@admin.register(ChatTrace)
+class ChatTraceAdmin(admin.ModelAdmin):
+    list_display = ['id', 'workspace', 'user', 'endpoint', 'intent', 'total_ms', 'prompt_tokens', 'completion_tokens', 'partial', 'created_at']
+    list_filter = ['created_at', 'endpoint', 'intent', 'partial', 'workspace']
+    search_fields = ['question_message__message', 'workspace__name']
+    readonly_fields = ['created_at']
+
+
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'workspace', 'user', 'status', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at', 'workspace']
+    search_fields = ['prompt', 'user__username', 'workspace__name']
+    readonly_fields = ['id', 'created_at', 'finished_at']
@@ -0,0 +1,278 @@
+"""
+Retrieval benchmark for chatbot workspace indexes.
+
+Builds synthetic workspaces of configurable size with a deterministic local
+embedding model, so index build time, load time, query latency percentiles
+and recall@k can be measured without Cohere or Gemini keys. Results are
+plain dicts suitable for JSON output and regression comparison; see
+`manage.py benchmark_retrieval`.
+"""
+import os
+import platform
+import shutil
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .lexical import LexicalIndex, reciprocal_rank_fusion
+
+VECTOR_CONFIGS = ("faiss_flat", "faiss_hnsw", "faiss_ivf")
+INDEX_CONFIGS = VECTOR_CONFIGS + ("bm25", "hybrid")
+
+
+class DeterministicEmbeddings(Embeddings):
+    """
+    Offline stand-in for the embedding provider: a normalized bag-of-words of
+    pseudo-random token vectors seeded by each token's CRC32. Identical text
+    always maps to the identical vector, and texts sharing words are close.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+        self.model = f"deterministic-bow-{dimension}"
+        self._token_vectors = {}
+
+    def token_vector(self, token):
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            vector = rng.standard_normal(self.dimension).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+    def _embed(self, text):
+        total = np.zeros(self.dimension, dtype=np.float32)
+        for token in text.lower().split():
+            total += self.token_vector(token)
+        norm = np.linalg.norm(total)
+        return (total / norm if norm else total).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class SyntheticWorkspace:
+    """
+    A synthetic corpus: chunks of words drawn from a Zipf-like vocabulary,
+    and queries built from a subset of one chunk's words (its "planted"
+    relevant chunk) plus noise words.
+    """
+
+    def __init__(self, num_chunks, embeddings, num_queries=200, words_per_chunk=60,
+                 words_per_query=6, vocabulary_size=20000, seed=42):
+        self.num_chunks = num_chunks
+        self.embeddings = embeddings
+        rng = np.random.default_rng(seed)
+
+        vocabulary = [f"w{i}" for i in range(vocabulary_size)]
+        weights = 1.0 / np.arange(1, vocabulary_size + 1)
+        weights /= weights.sum()
+        token_matrix = np.stack([embeddings.token_vector(word) for word in vocabulary])
+
+        self.texts = []
+        self.vectors = np.empty((num_chunks, embeddings.dimension), dtype=np.float32)
+        batch_size = 10000
+        for start in range(0, num_chunks, batch_size):
+            count = min(batch_size, num_chunks - start)
+            word_ids = rng.choice(vocabulary_size, size=(count, words_per_chunk), p=weights)
+            batch_vectors = token_matrix[word_ids].sum(axis=1)
+            batch_vectors /= np.linalg.norm(batch_vectors, axis=1, keepdims=True)
+            self.vectors[start:start + count] = batch_vectors
+            self.texts.extend(" ".join(vocabulary[i] for i in row) for row in word_ids)
+
+        self.metadatas = [{"pdf_id": i % 20, "page": i // 20, "chunk_id": i} for i in range(num_chunks)]
+
+        num_queries = min(num_queries, num_chunks)
+        self.query_targets = rng.choice(num_chunks, size=num_queries, replace=False).tolist()
+        self.queries = []
+        for target in self.query_targets:
+            words = self.texts[target].split()
+            picked = rng.choice(len(words), size=min(words_per_query, len(words)), replace=False)
+            noise = rng.choice(vocabulary_size, size=1)
+            self.queries.append(" ".join([words[i] for i in picked] + [vocabulary[i] for i in noise]))
+        self.query_vectors = np.asarray(embeddings.embed_documents(self.queries), dtype=np.float32)
+
+    def documents(self):
+        return [Document(page_content=text, metadata=metadata) for text, metadata in zip(self.texts, self.metadatas)]
+
+    def exact_top_k(self, k):
+        """Ground-truth nearest neighbours by brute force, for approximate-index recall."""
+        results = []
+        for start in range(0, len(self.query_vectors), 256):
+            scores = self.query_vectors[start:start + 256] @ self.vectors.T
+            top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+            results.extend(set(row.tolist()) for row in top)
+        return results
+
+
+def _faiss_index(config, dimension, num_chunks):
+    import faiss
+
+    if config == "faiss_flat":
+        return faiss.IndexFlatL2(dimension)
+    if config == "faiss_hnsw":
+        index = faiss.IndexHNSWFlat(dimension, 32)
+        index.hnsw.efSearch = 64
+        return index
+    if config == "faiss_ivf":
+        nlist = max(1, int(4 * np.sqrt(num_chunks)))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+        index.nprobe = 8
+        return index
+    raise ValueError(f"Unknown vector index configuration: {config}")
+
+
+def _build_vectorstore(config, workspace):
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    index = _faiss_index(config, workspace.embeddings.dimension, workspace.num_chunks)
+    if not index.is_trained:
+        index.train(workspace.vectors)
+    index.add(workspace.vectors)
+    ids = [str(i) for i in range(workspace.num_chunks)]
+    docstore = InMemoryDocstore(dict(zip(ids, workspace.documents())))
+    return FAISS(workspace.embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _percentiles(latencies):
+    values = np.asarray(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def _chunk_id(doc):
+    return doc.metadata["chunk_id"]
+
+
+def run_config(config, workspace, k=5, work_dir=None):
+    """Build, save, load and query one index configuration; return its metrics."""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="retrieval-bench-")
+    index_path = os.path.join(work_dir, config)
+    os.makedirs(index_path, exist_ok=True)
+    result = {"config": config, "num_chunks": workspace.num_chunks, "k": k}
+
+    try:
+        if config in VECTOR_CONFIGS:
+            from langchain_community.vectorstores import FAISS
+
+            started = time.perf_counter()
+            _build_vectorstore(config, workspace).save_local(index_path)
+            result["build_seconds"] = round(time.perf_counter() - started, 4)
+
+            started = time.perf_counter()
+            store = FAISS.load_local(index_path, workspace.embeddings, allow_dangerous_deserialization=True)
+            result["load_seconds"] = round(time.perf_counter() - started, 4)
+
+            def search(position):
+                vector = workspace.query_vectors[position].tolist()
+                return [_chunk_id(doc) for doc in store.similarity_search_by_vector(vector, k=k)]
+        else:
+            started = time.perf_counter()
+            lexical = LexicalIndex()
+            lexical.add_documents(workspace.documents())
+            lexical.save(index_path)
+            result["build_seconds"] = round(time.perf_counter() - started, 4)
+
+            started = time.perf_counter()
+            lexical = LexicalIndex.load(index_path)
+            result["load_seconds"] = round(time.perf_counter() - started, 4)
+
+            if config == "hybrid":
+                # Build/load figures cover the keyword side; see faiss_flat for the vector side.
+                vector_store = _build_vectorstore("faiss_flat", workspace)
+
+                def search(position):
+                    vector = workspace.query_vectors[position].tolist()
+                    vector_docs = vector_store.similarity_search_by_vector(vector, k=k)
+                    lexical_docs = [doc for doc, _ in lexical.search(workspace.queries[position], k=k)[0]]
+                    return [_chunk_id(doc) for doc in reciprocal_rank_fusion([vector_docs, lexical_docs], k=k)]
+            else:
+                def search(position):
+                    return [_chunk_id(doc) for doc, _ in lexical.search(workspace.queries[position], k=k)[0]]
+
+        result["index_bytes"] = _directory_bytes(index_path)
+
+        latencies, hits, retrieved = [], 0, []
+        for position, target in enumerate(workspace.query_targets):
+            started = time.perf_counter()
+            chunk_ids = search(position)
+            latencies.append(time.perf_counter() - started)
+            retrieved.append(chunk_ids)
+            hits += int(target in chunk_ids)
+
+        result.update(_percentiles(latencies))
+        result["queries"] = len(latencies)
+        result["recall_at_k"] = round(hits / len(latencies), 4) if latencies else 0.0
+
+        if config in VECTOR_CONFIGS:
+            exact = workspace.exact_top_k(k)
+            overlap = [len(exact_ids & set(ids)) / k for exact_ids, ids in zip(exact, retrieved)]
+            result["exact_overlap_at_k"] = round(float(np.mean(overlap)), 4) if overlap else 0.0
+    finally:
+        shutil.rmtree(index_path, ignore_errors=True)
+
+    return result
+
+
+def run_benchmark(sizes, configs=INDEX_CONFIGS, k=5, num_queries=200, dimension=384, seed=42):
+    embeddings = DeterministicEmbeddings(dimension=dimension)
+    work_dir = tempfile.mkdtemp(prefix="retrieval-bench-")
+    results = []
+    try:
+        for size in sizes:
+            workspace = SyntheticWorkspace(size, embeddings, num_queries=num_queries, seed=seed)
+            for config in configs:
+                print(f"[Benchmark] {config} @ {size} chunks...")
+                results.append(run_config(config, workspace, k=k, work_dir=work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "chatbot_retrieval",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "parameters": {
+            "sizes": list(sizes),
+            "configs": list(configs),
+            "k": k,
+            "num_queries": num_queries,
+            "dimension": dimension,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report, baseline, latency_tolerance=0.25, recall_tolerance=0.02):
+    """
+    Return a list of human-readable regressions: p95 latency more than
+    `latency_tolerance` slower or recall more than `recall_tolerance` lower
+    than the matching (config, num_chunks) entry in the baseline report.
+    """
+    previous = {(r["config"], r["num_chunks"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for current in report["results"]:
+        before = previous.get((current["config"], current["num_chunks"]))
+        if not before:
+            continue
+        label = f"{current['config']} @ {current['num_chunks']}"
+        if before.get("p95_ms") and current["p95_ms"] > before["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["recall_at_k"] < before.get("recall_at_k", 0) - recall_tolerance:
+            regressions.append(f"{label}: recall@k {before['recall_at_k']} -> {current['recall_at_k']}")
+    return regressions
@@ -0,0 +1,210 @@
+"""
+Circuit breakers for the chatbot's model providers.
+
+When Gemini or the embedding API is degraded, every question would otherwise
+wait out the client timeout, once per call. Each breaker tracks the failure
+rate of recent calls; once it trips, calls fail immediately with CircuitOpen
+so the engine can answer in a degraded mode. After CHATBOT_BREAKER_OPEN_SECONDS
+a single probe call is let through (half-open): success closes the breaker,
+failure opens it again.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"The {name} provider is unavailable; retrying in about {retry_after}s.")
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_rate=0.5, minimum_calls=5, window=60.0, open_seconds=30.0, excluded=()):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        # Errors the provider answered with (e.g. unparseable output); they do not count as outages.
+        self.excluded = excluded
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+        self.last_error = None
+        self._outcomes = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # --- bookkeeping (callers hold self._lock) ---
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _window_failure_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _retry_after(self, now):
+        if self.state != self.OPEN:
+            return 1
+        return max(1, round(self.opened_at + self.open_seconds - now))
+
+    def _trip(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._probing = False
+        self._outcomes.clear()
+        print(f"[Breaker] {self.name} breaker opened ({self.last_error}).")
+
+    # --- public API ---
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpen. In half-open state only one probe runs at a time."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                print(f"[Breaker] {self.name} breaker half-open; probing the provider.")
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._retry_after(now))
+            if self.state == self.HALF_OPEN:
+                self._probing = True
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            self.successes += 1
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.opened_at = None
+                self._probing = False
+                self._outcomes.clear()
+                print(f"[Breaker] {self.name} breaker closed; provider recovered.")
+                return
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}" if error is not None else None
+            if self.state == self.HALF_OPEN:
+                self._trip(now)
+                return
+            if self.state == self.OPEN:
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            if len(self._outcomes) >= self.minimum_calls and self._window_failure_rate() >= self.failure_rate:
+                self._trip(now)
+
+    def release(self):
+        """Forget an admitted call that ended without an outcome (e.g. the client went away)."""
+        with self._lock:
+            self._probing = False
+
+    def _record_error(self, error):
+        if isinstance(error, self.excluded):
+            self.record_success()
+        else:
+            self.record_failure(error)
+
+    def call(self, fn, *args, **kwargs):
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, awaitable):
+        try:
+            self.before_call()
+        except CircuitOpen:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self.record_success()
+        return result
+
+    def is_open(self):
+        """True while calls are being rejected (open, and not yet due for a probe)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.open_seconds
+
+    def check(self):
+        """Raise CircuitOpen while calls are being rejected, without taking the half-open probe."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.OPEN and now - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._retry_after(now))
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.opened_at = None
+            self._probing = False
+            self._outcomes.clear()
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            return {
+                'state': self.state,
+                'failure_rate': round(self._window_failure_rate(), 3),
+                'recent_calls': len(self._outcomes),
+                'retry_after': self._retry_after(now) if self.state == self.OPEN else None,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'trips': self.trips,
+                'last_error': self.last_error,
+            }
+
+
+def _breaker(name, excluded=()):
+    return CircuitBreaker(
+        name,
+        failure_rate=getattr(settings, 'CHATBOT_BREAKER_FAILURE_RATE', 0.5),
+        minimum_calls=getattr(settings, 'CHATBOT_BREAKER_MIN_CALLS', 5),
+        window=getattr(settings, 'CHATBOT_BREAKER_WINDOW', 60.0),
+        open_seconds=getattr(settings, 'CHATBOT_BREAKER_OPEN_SECONDS', 30.0),
+        excluded=excluded,
+    )
+
+
+# LangChain's OutputParserException is a ValueError: the model answered, just not as JSON.
+LLM_BREAKER = _breaker('llm', excluded=(ValueError,))
+EMBEDDINGS_BREAKER = _breaker('embeddings')
+BREAKERS = {'llm': LLM_BREAKER, 'embeddings': EMBEDDINGS_BREAKER}
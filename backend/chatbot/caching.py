@@ -0,0 +1,373 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from pdfs.models import PDFFile
+from .deadlines import DeadlineExceeded
+
+
+class TTLCache:
+    """
+    A small thread-safe LRU cache with per-entry expiry.
+
+    Instances are module-level, so they are shared by every request served
+    by the same worker process.
+    """
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_if(self, predicate):
+        """Drop every entry whose key matches `predicate`."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def items(self):
+        """Snapshot of the live (non-expired) entries."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value)
+                for key, (expires_at, value) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits / total) if total else 0.0,
+        }
+
+
+def normalize_question(text):
+    """Casefold and collapse whitespace so trivially different questions share a key."""
+    if not text:
+        return ''
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+QUERY_EMBEDDING_CACHE = TTLCache(
+    maxsize=getattr(settings, 'CHATBOT_QUERY_EMBEDDING_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'CHATBOT_QUERY_EMBEDDING_CACHE_TTL', 3600),
+)
+
+
+# --- Workspace index versioning ---
+
+def pdf_generation(workspace_id):
+    """
+    Token for the current PDF set of a workspace. It is read from the
+    database, so every web and task worker sees an upload, rename or delete
+    as soon as it is committed: uploads and deletes change the count and
+    newest id, renames and other edits the newest `updated_at`.
+    """
+    stats = PDFFile.objects.filter(workspace_id=workspace_id).aggregate(
+        count=Count('id'), last_id=Max('id'), last_update=Max('updated_at')
+    )
+    last_update = stats['last_update'].timestamp() if stats['last_update'] else 0
+    return f"{stats['count']}.{stats['last_id'] or 0}.{last_update}"
+
+
+def workspace_index_version(workspace):
+    """
+    Opaque token that changes whenever the workspace index is rebuilt or its
+    PDF set changes. Used as part of every workspace-scoped cache key.
+    """
+    generation = pdf_generation(workspace.id)
+    index_mtime = 0
+    if workspace.index_path:
+        try:
+            index_mtime = os.stat(os.path.join(workspace.index_path, "index.faiss")).st_mtime_ns
+        except OSError:
+            pass
+    return f"{workspace.processing_status}:{index_mtime}:{generation}"
+
+
+# --- Answer cache ---
+
+class AnswerCache:
+    """
+    Caches final chatbot answers per (workspace, index version, normalized
+    question). Each entry also records the PDF the answer was scoped to; when
+    a similarity threshold is configured, a new question whose embedding is
+    close enough to a cached one for the same workspace, version and target
+    PDF is served from the cache as well.
+    """
+
+    def __init__(self, maxsize=512, ttl=3600, similarity_threshold=0.0):
+        self.similarity_threshold = similarity_threshold
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.saved_seconds = 0.0
+
+    def _record_hit(self, entry, similar=False):
+        with self._lock:
+            if similar:
+                self.similar_hits += 1
+            else:
+                self.hits += 1
+            self.saved_seconds += entry['elapsed']
+
+    def get(self, workspace_id, version, question):
+        with self._lock:
+            self.lookups += 1
+        entry = self._entries.get((workspace_id, version, normalize_question(question)))
+        if entry is None:
+            return None
+        self._record_hit(entry)
+        return entry['answer']
+
+    def get_similar(self, workspace_id, version, target_pdf_id, vector):
+        if not self.similarity_threshold or vector is None:
+            return None
+
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if not query_norm:
+            return None
+
+        best_entry, best_score = None, 0.0
+        for (ws_id, ws_version, _), entry in self._entries.items():
+            if ws_id != workspace_id or ws_version != version:
+                continue
+            if entry['target_pdf_id'] != target_pdf_id or entry['vector'] is None:
+                continue
+            score = float(np.dot(query, entry['vector'])) / (query_norm * entry['vector_norm'])
+            if score > best_score:
+                best_entry, best_score = entry, score
+
+        if best_entry is not None and best_score >= self.similarity_threshold:
+            self._record_hit(best_entry, similar=True)
+            return best_entry['answer']
+        return None
+
+    def set(self, workspace_id, version, question, answer, target_pdf_id=None, vector=None, elapsed=0.0):
+        stored_vector, vector_norm = None, None
+        if vector is not None:
+            stored_vector = np.asarray(vector, dtype=np.float32)
+            vector_norm = float(np.linalg.norm(stored_vector))
+            if not vector_norm:
+                stored_vector, vector_norm = None, None
+
+        self._entries.set((workspace_id, version, normalize_question(question)), {
+            'answer': answer,
+            'target_pdf_id': target_pdf_id,
+            'vector': stored_vector,
+            'vector_norm': vector_norm,
+            'elapsed': elapsed,
+        })
+
+    def invalidate_workspace(self, workspace_id):
+        self._entries.discard_if(lambda key: key[0] == workspace_id)
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self.lookups = 0
+            self.hits = 0
+            self.similar_hits = 0
+            self.saved_seconds = 0.0
+
+    def stats(self):
+        served = self.hits + self.similar_hits
+        return {
+            'size': len(self._entries),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'hit_ratio': (served / self.lookups) if self.lookups else 0.0,
+            'saved_seconds': round(self.saved_seconds, 3),
+        }
+
+
+ANSWER_CACHE = AnswerCache(
+    maxsize=getattr(settings, 'CHATBOT_ANSWER_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'CHATBOT_ANSWER_CACHE_TTL', 3600),
+    similarity_threshold=getattr(settings, 'CHATBOT_ANSWER_CACHE_SIMILARITY', 0.0),
+)
+
+
+# --- Request coalescing ---
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _fresh_error(error):
+    """
+    A new exception of the same type and state as `error`, for one waiter to
+    raise. Raising the shared object from several threads would keep adding
+    their frames to its one traceback.
+    """
+    fresh = type(error).__new__(type(error), *error.args)
+    fresh.__dict__.update(error.__dict__)
+    return fresh
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time. Requests that arrive while a call for
+    the same key is in flight wait for it and share its result (or
+    exception) instead of repeating the work.
+
+    Sync callers (`do`) and async callers (`ado`) are tracked separately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._tasks = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Call `fn`, or wait for the call already in flight for `key`. A
+        follower waits at most `timeout` seconds (its own remaining request
+        budget) and then raises DeadlineExceeded, so a hung leader does not
+        hang every coalesced request with it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            print(f"[SingleFlight] Waiting on in-flight call for {key!r}.")
+            if not flight.done.wait(timeout):
+                raise DeadlineExceeded(f"in-flight call for {key!r} did not finish within {timeout:.1f}s")
+            if flight.error is not None:
+                raise _fresh_error(flight.error) from flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result
+
+    async def ado(self, key, coroutine_fn):
+        """
+        Await the shared task for `key`, starting it if none is running. The
+        task is only cancelled once every waiter has gone away.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._tasks.get(key)
+            if entry is None or entry[0].get_loop() is not loop or entry[0].done():
+                task = loop.create_task(coroutine_fn())
+                entry = self._tasks[key] = [task, 0]
+                task.add_done_callback(lambda done, key=key: self._forget_task(key, done))
+                self.leaders += 1
+            else:
+                self.followers += 1
+                print(f"[SingleFlight] Waiting on in-flight call for {key!r}.")
+            entry[1] += 1
+        task = entry[0]
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            with self._lock:
+                entry[1] -= 1
+                abandoned = entry[1] == 0
+                if abandoned and self._tasks.get(key) is entry:
+                    del self._tasks[key]
+            if abandoned:
+                task.cancel()
+            raise
+        except Exception as e:
+            raise _fresh_error(e) from e
+
+    def _forget_task(self, key, task):
+        with self._lock:
+            entry = self._tasks.get(key)
+            if entry is not None and entry[0] is task:
+                del self._tasks[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights) + len(self._tasks)
+
+    def stats(self):
+        total = self.leaders + self.followers
+        return {
+            'in_flight': self.in_flight(),
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'coalesced_ratio': (self.followers / total) if total else 0.0,
+        }
+
+
+QUESTION_FLIGHTS = SingleFlight()
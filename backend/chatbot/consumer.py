@@ -0,0 +1,31 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+
+def job_group(user_id):
+    """Channel layer group that receives a user's finished chatbot jobs."""
+    return f"chatbot_jobs_{user_id}"
+
+
+class ChatbotJobConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes finished chatbot jobs to the user who asked. Kept apart from the
+    notification socket, whose clients treat every message as an unread count.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = job_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def chatbot_job(self, event):
+        await self.send(json.dumps(event["data"]))
@@ -0,0 +1,160 @@
+"""
+Builds the QA prompt context from retrieved chunks.
+
+Chunks are split with a 200 character overlap and neighbours from the same
+page often repeat each other, so the raw top-k concatenation carries a lot of
+duplicate text. This module merges overlapping chunks, drops repeated spans
+and packs the result into a token budget.
+"""
+import re
+
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+MIN_DUPLICATE_SENTENCE_CHARS = 40
+MIN_TRUNCATED_BLOCK_TOKENS = 50
+
+SOURCE_PREFIX_PATTERN = re.compile(r"Source Document: .*?\(filename: [^)]*\)\s*Content follows:\s*", re.DOTALL)
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Cheap provider-independent estimate (~4 characters per token)."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _metadata(doc):
+    metadata = getattr(doc, "metadata", None)
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def source_label(doc):
+    metadata = _metadata(doc)
+    return metadata.get("pdf_title") or metadata.get("pdf_filename") or metadata.get("source") or "Unknown Document"
+
+
+def _overlap_length(left, right):
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    position = left.find(probe, max(0, len(left) - MAX_OVERLAP_CHARS))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def merge_texts(first, second):
+    """Merge two chunk texts if one contains or overlaps the other, else None."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    overlap = _overlap_length(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = _overlap_length(second, first)
+    if overlap:
+        return second + first[overlap:]
+    return None
+
+
+def _drop_repeated_sentences(text, seen):
+    kept = []
+    for sentence in SENTENCE_SPLIT_PATTERN.split(text):
+        key = " ".join(sentence.lower().split())
+        if len(key) >= MIN_DUPLICATE_SENTENCE_CHARS:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(sentence)
+    return " ".join(kept)
+
+
+def _truncate_to_tokens(text, max_tokens):
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    if sentence_end > limit // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def build_context(docs, token_budget=1500):
+    """
+    Return (context, stats). Blocks keep the rank of their best chunk and are
+    formatted as "[<source>] <text>" like the original prompt context.
+    """
+    raw_context = "\n\n".join(f"[{source_label(doc)}] {doc.page_content}" for doc in docs)
+
+    # 1. Merge overlapping chunks from the same page into blocks, in rank order.
+    blocks = []
+    for doc in docs:
+        metadata = _metadata(doc)
+        label = source_label(doc)
+        group = (label, metadata.get("pdf_id"), metadata.get("page"))
+        text = SOURCE_PREFIX_PATTERN.sub("", doc.page_content or "").strip()
+        if not text:
+            continue
+
+        for block in blocks:
+            if block["group"] != group:
+                continue
+            merged = merge_texts(block["text"], text)
+            if merged is not None:
+                block["text"] = merged
+                block["chunks"] += 1
+                break
+        else:
+            blocks.append({"group": group, "label": label, "text": text, "chunks": 1})
+
+    # 2. Drop sentences already present in a higher-ranked block, then pack.
+    seen_sentences = set()
+    parts = []
+    used_tokens = 0
+    for block in blocks:
+        text = _drop_repeated_sentences(block["text"], seen_sentences)
+        if not text.strip():
+            continue
+        entry = f"[{block['label']}] {text}"
+        entry_tokens = estimate_tokens(entry) + 1
+        remaining = token_budget - used_tokens
+        if entry_tokens > remaining:
+            if remaining >= MIN_TRUNCATED_BLOCK_TOKENS:
+                entry = _truncate_to_tokens(entry, remaining - 1)
+                parts.append(entry)
+                used_tokens += estimate_tokens(entry) + 1
+            break
+        parts.append(entry)
+        used_tokens += entry_tokens
+
+    context = "\n\n".join(parts)
+    tokens_before = estimate_tokens(raw_context)
+    tokens_after = estimate_tokens(context)
+    stats = {
+        "chunks": len(docs),
+        "blocks": len(parts),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+    }
+    return context, stats
+
+
+def format_excerpts(docs, limit=3, max_tokens=120):
+    """The top retrieved passages as a readable list, for answers given without the LLM."""
+    lines = []
+    for doc in docs:
+        text = " ".join(SOURCE_PREFIX_PATTERN.sub("", doc.page_content or "").split())
+        if not text:
+            continue
+        lines.append(f"- [{source_label(doc)}] {_truncate_to_tokens(text, max_tokens)}")
+        if len(lines) >= limit:
+            break
+    return "\n\n".join(lines)
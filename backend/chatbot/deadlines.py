@@ -0,0 +1,139 @@
+"""
+Request deadlines for the chatbot pipeline.
+
+A Deadline is created once per question and passed through classification,
+retrieval and generation. Each stage runs within its own sub-budget (capped
+by what is left of the request), optional stages are skipped when time is
+short, and the engine answers with what it already has instead of letting
+an outer timeout discard the work.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+
+
+# An optional stage is skipped rather than started with less time than this.
+MIN_STAGE_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """A pipeline stage did not finish within its budget."""
+
+
+class Deadline:
+    """Point in time by which an answer is due. `Deadline(None)` never expires."""
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    @property
+    def bounded(self):
+        return self.expires_at is not None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def budget(self, cap=None, reserve=0.0):
+        """
+        Seconds a stage may use: its own cap, limited by what is left after
+        keeping `reserve` seconds for later stages. None when unbounded.
+        """
+        if self.expires_at is None:
+            return None
+        available = max(0.0, self.remaining() - reserve)
+        return available if cap is None else min(cap, available)
+
+    def allows(self, seconds):
+        """Whether at least `seconds` are left."""
+        return self.remaining() >= seconds
+
+    def __repr__(self):
+        if self.expires_at is None:
+            return "Deadline(unbounded)"
+        return f"Deadline({self.remaining():.1f}s left)"
+
+
+def stage_budget(name):
+    """The configured cap for a pipeline stage, in seconds."""
+    return {
+        'classify': getattr(settings, 'CHATBOT_CLASSIFY_TIMEOUT', 8.0),
+        'retrieve': getattr(settings, 'CHATBOT_RETRIEVAL_TIMEOUT', 15.0),
+    }.get(name)
+
+
+def min_generation_seconds():
+    return getattr(settings, 'CHATBOT_MIN_GENERATION_SECONDS', 5.0)
+
+
+# When the call running in this context must be done (time.monotonic()). Set by
+# call_with_timeout for clients that can bound their own request (see call_time_left).
+_CALL_EXPIRES_AT = contextvars.ContextVar('chatbot_call_expires_at', default=None)
+
+
+def call_time_left():
+    """Seconds left for the call_with_timeout call running in this context; None when unbounded."""
+    expires_at = _CALL_EXPIRES_AT.get()
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_DEADLINE_WORKERS', 32),
+                thread_name_prefix="chatbot-deadline",
+            )
+    return _EXECUTOR
+
+
+def call_with_timeout(timeout, fn, *args, **kwargs):
+    """
+    Run `fn` and raise DeadlineExceeded if it takes longer than `timeout`.
+    Without a timeout it is simply called. A sync call cannot be interrupted
+    from outside, so `fn` runs with call_time_left() set: the chat models
+    use it as their request timeout and stop, freeing the pool thread, when
+    the caller gives up.
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+    if timeout <= 0:
+        raise DeadlineExceeded(f"{getattr(fn, '__name__', 'call')} had no time left")
+    context = contextvars.copy_context()
+    context.run(_CALL_EXPIRES_AT.set, time.monotonic() + timeout)
+    future = _executor().submit(context.run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(f"{getattr(fn, '__name__', 'call')} exceeded {timeout:.1f}s")
+
+
+async def acall_with_timeout(timeout, awaitable):
+    """Await `awaitable`, cancelling it and raising DeadlineExceeded past `timeout`."""
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("no time left")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"exceeded {timeout:.1f}s")
@@ -0,0 +1,100 @@
+"""
+Workspace-level combined summaries and abstracts.
+
+"Summarize all documents" used to run one LLM call over every PDFFile summary
+on each request. The combined text is now stored as a WorkspaceDigest and
+refreshed in the background whenever a document's summary or abstract
+changes; requests serve it directly and only fall back to the live
+combination when the stored digest no longer matches the workspace's PDFs.
+"""
+import hashlib
+import json
+
+from pdfs.models import PDFFile
+from .models import WorkspaceDigest
+
+DIGEST_KINDS = (WorkspaceDigest.Kind.SUMMARY, WorkspaceDigest.Kind.ABSTRACT)
+
+
+def digest_sections(workspace_id, kind):
+    """The (pdf_id, section text) pairs a combined `kind` is built from, in upload order."""
+    rows = PDFFile.objects.filter(workspace_id=workspace_id).order_by('id').values_list('id', 'title', kind)
+    return [
+        (pdf_id, f"Document: {title}\n\n{content}")
+        for pdf_id, title, content in rows
+        if content and content != 'N/A'
+    ]
+
+
+def section_hashes(sections):
+    return {str(pdf_id): hashlib.sha1(text.encode('utf-8')).hexdigest() for pdf_id, text in sections}
+
+
+def fingerprint(hashes):
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_fresh_digest(workspace_id, kind, sections):
+    """Stored combined text if it was built from exactly these sections, else None."""
+    digest = WorkspaceDigest.objects.filter(workspace_id=workspace_id, kind=kind).only(
+        'content', 'source_fingerprint'
+    ).first()
+    if digest and digest.source_fingerprint == fingerprint(section_hashes(sections)):
+        return digest.content
+    return None
+
+
+def save_digest(workspace_id, kind, sections, content):
+    hashes = section_hashes(sections)
+    WorkspaceDigest.objects.update_or_create(
+        workspace_id=workspace_id,
+        kind=kind,
+        defaults={'content': content, 'sources': hashes, 'source_fingerprint': fingerprint(hashes)},
+    )
+
+
+def refresh_workspace_digest(workspace_id, kind):
+    """
+    Bring one digest up to date. When documents were only added since the
+    last build, the LLM extends the stored text with the new sections
+    instead of re-reading every document.
+    """
+    from . import engine
+
+    sections = digest_sections(workspace_id, kind)
+    if not sections:
+        WorkspaceDigest.objects.filter(workspace_id=workspace_id, kind=kind).delete()
+        return None
+
+    hashes = section_hashes(sections)
+    digest = WorkspaceDigest.objects.filter(workspace_id=workspace_id, kind=kind).first()
+    if digest and digest.source_fingerprint == fingerprint(hashes):
+        print(f"[Digest] Workspace {workspace_id} {kind} is up to date.")
+        return digest.content
+
+    engine.load_models()
+    if engine.LLM is None:
+        print(f"[Digest] LLM not loaded; cannot refresh workspace {workspace_id} {kind}.")
+        return None
+
+    previous = digest.sources if digest else {}
+    unchanged = bool(previous) and all(hashes.get(pdf_id) == digest_hash for pdf_id, digest_hash in previous.items())
+    if unchanged:
+        new_sections = [text for pdf_id, text in sections if str(pdf_id) not in previous]
+        print(f"[Digest] Extending workspace {workspace_id} {kind} with {len(new_sections)} new document(s).")
+        content = engine._extend_combined_text(kind, digest.content, new_sections)
+    else:
+        print(f"[Digest] Rebuilding workspace {workspace_id} {kind} from {len(sections)} document(s).")
+        content = engine._combine_sections(kind, [text for _, text in sections])
+
+    if isinstance(content, str) and content:
+        save_digest(workspace_id, kind, sections, content)
+    return content
+
+
+def refresh_workspace_digests(workspace_id):
+    for kind in DIGEST_KINDS:
+        try:
+            refresh_workspace_digest(workspace_id, kind)
+        except Exception as e:
+            print(f"[Digest] Could not refresh workspace {workspace_id} {kind}: {e}")
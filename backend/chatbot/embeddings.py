@@ -0,0 +1,185 @@
+"""
+Embedding providers for workspace indexes.
+
+CHATBOT_EMBEDDING_PROVIDER selects the backend per deployment:
+- "cohere" (default): Cohere API, needs COHERE_API_KEY.
+- "local": an ONNX model run on CPU through the optional `fastembed` package,
+  so ingestion and queries need no network round trip and no API key.
+
+Each index directory records the model it was built with in
+embedding_model.json; loading or extending an index with another model is
+refused, because vectors from different models are not comparable.
+"""
+import json
+import os
+
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+from .caching import QUERY_EMBEDDING_CACHE, normalize_question
+from .telemetry import current_trace
+
+MANIFEST_FILENAME = "embedding_model.json"
+
+# Indexes written before the manifest existed were all built with Cohere.
+LEGACY_MODEL_ID = "cohere:embed-english-v3.0"
+
+DEFAULT_MODELS = {
+    "cohere": "embed-english-v3.0",
+    "local": "BAAI/bge-small-en-v1.5",
+}
+
+
+class EmbeddingModelMismatch(Exception):
+    """An index was built with a different embedding model than the one configured."""
+
+
+class LocalONNXEmbeddings(Embeddings):
+    """CPU embeddings through fastembed's ONNX runtime models."""
+
+    def __init__(self, model_name):
+        from fastembed import TextEmbedding
+
+        self.model = model_name
+        self._model = TextEmbedding(model_name=model_name)
+
+    def embed_documents(self, texts):
+        return [vector.tolist() for vector in self._model.embed(list(texts))]
+
+    def embed_query(self, text):
+        return next(iter(self._model.query_embed(text))).tolist()
+
+    def embed(self, texts, input_type=None):
+        if input_type == "search_query":
+            return [vector.tolist() for vector in self._model.query_embed(list(texts))]
+        return self.embed_documents(texts)
+
+
+def configured_model_id():
+    provider = getattr(settings, 'CHATBOT_EMBEDDING_PROVIDER', 'cohere')
+    model = getattr(settings, 'CHATBOT_EMBEDDING_MODEL', '') or DEFAULT_MODELS.get(provider, '')
+    return f"{provider}:{model}"
+
+
+def load_embeddings():
+    """Build the configured embedding model; returns (embeddings or None, model_id)."""
+    model_id = configured_model_id()
+    provider, _, model = model_id.partition(":")
+    print(f"Loading Embedding Model ({model_id})...")
+    try:
+        if provider == "cohere":
+            from langchain_cohere import CohereEmbeddings
+            embeddings = CohereEmbeddings(model=model, cohere_api_key=os.getenv("COHERE_API_KEY"))
+        elif provider == "local":
+            embeddings = LocalONNXEmbeddings(model)
+        else:
+            raise ValueError(f"Unknown CHATBOT_EMBEDDING_PROVIDER '{provider}'")
+    except Exception as e:
+        print(f"[ERROR] Error loading embedding model {model_id}: {e}")
+        return None, model_id
+
+    print(f"[OK] Embedding Model Loaded ({model_id}).")
+    return embeddings, model_id
+
+
+def read_index_model_id(index_path):
+    try:
+        with open(os.path.join(index_path, MANIFEST_FILENAME), encoding="utf-8") as handle:
+            return json.load(handle).get("model_id") or LEGACY_MODEL_ID
+    except FileNotFoundError:
+        return LEGACY_MODEL_ID
+
+
+def write_index_manifest(index_path, model_id, dimension=None):
+    manifest = {"model_id": model_id}
+    if isinstance(dimension, int):
+        manifest["dimension"] = dimension
+    with open(os.path.join(index_path, MANIFEST_FILENAME), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle)
+
+
+def ensure_index_model(index_path, model_id):
+    """Raise EmbeddingModelMismatch unless the index at index_path was built with model_id."""
+    index_model_id = read_index_model_id(index_path)
+    if index_model_id != model_id:
+        raise EmbeddingModelMismatch(
+            f"Index {index_path} was built with '{index_model_id}' but the configured model is '{model_id}'."
+        )
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and memoizes `embed_query` in QUERY_EMBEDDING_CACHE.
+
+    Document embedding (ingestion) is passed straight through. Query misses
+    go through `breaker` (a CircuitBreaker) when one is given.
+    """
+
+    def __init__(self, embeddings, cache=None, model_id=None, breaker=None):
+        self.embeddings = embeddings
+        self.cache = cache if cache is not None else QUERY_EMBEDDING_CACHE
+        self.model_id = model_id or getattr(embeddings, 'model', None) or type(embeddings).__name__
+        self.breaker = breaker
+
+    def _provider_call(self, fn, *args, **kwargs):
+        if self.breaker is None:
+            return fn(*args, **kwargs)
+        return self.breaker.call(fn, *args, **kwargs)
+
+    def _key(self, text):
+        return (self.model_id, normalize_question(text))
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self.cache.get(key)
+        current_trace().cache('query_embedding', vector is not None)
+        if vector is not None:
+            return list(vector)
+
+        vector = self._provider_call(self.embeddings.embed_query, text)
+        self.cache.set(key, tuple(vector))
+        return vector
+
+    async def aembed_query(self, text):
+        key = self._key(text)
+        vector = self.cache.get(key)
+        current_trace().cache('query_embedding', vector is not None)
+        if vector is not None:
+            return list(vector)
+
+        if self.breaker is None:
+            vector = await self.embeddings.aembed_query(text)
+        else:
+            vector = await self.breaker.acall(self.embeddings.aembed_query(text))
+        self.cache.set(key, tuple(vector))
+        return vector
+
+    def embed_queries(self, texts):
+        """
+        Embed several questions, hitting the cache first and sending all
+        misses to the provider in a single batch when it supports one.
+        """
+        vectors = [None] * len(texts)
+        missing = []
+        for position, text in enumerate(texts):
+            cached = self.cache.get(self._key(text))
+            if cached is not None:
+                vectors[position] = list(cached)
+            else:
+                missing.append(position)
+
+        if missing:
+            missing_texts = [texts[position] for position in missing]
+            embed = getattr(self.embeddings, 'embed', None)
+            if callable(embed):
+                fresh = self._provider_call(embed, missing_texts, input_type="search_query")
+            else:
+                fresh = [self._provider_call(self.embeddings.embed_query, text) for text in missing_texts]
+            for position, vector in zip(missing, fresh):
+                self.cache.set(self._key(texts[position]), tuple(vector))
+                vectors[position] = vector
+
+        return vectors
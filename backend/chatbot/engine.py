@@ -1,54 +1,93 @@
 
 import os
 import json 
+import asyncio
 import traceback
+import importlib
 import io
 import tempfile
 import re
-from difflib import SequenceMatcher
+import threading
+import time
+import concurrent.futures
+import contextvars
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import models  
 from pdfs.models import PDFFile
 from workspaces.models import Workspace
+from .breaker import EMBEDDINGS_BREAKER, LLM_BREAKER, CircuitOpen
+from .caching import ANSWER_CACHE, QUESTION_FLIGHTS, normalize_question, workspace_index_version
+from .context import build_context, format_excerpts
+from .deadlines import (
+    MIN_STAGE_SECONDS,
+    Deadline,
+    DeadlineExceeded,
+    acall_with_timeout,
+    call_with_timeout,
+    min_generation_seconds,
+    stage_budget,
+)
+from .digests import digest_sections, get_fresh_digest, save_digest
+from .embeddings import CachedQueryEmbeddings, EmbeddingModelMismatch, configured_model_id, ensure_index_model, load_embeddings, write_index_manifest
+from .hedging import HEDGERS
+from .index_server import IndexServerUnavailable, get_index_server_client
+from .intent import ROUTER_STATS, classify_locally
+from .llms import build_chat_model, chain_config, config_key, default_config, metered
+from .memory import format_turns, load_memory, looks_like_follow_up, summary_chars
+from .lexical import is_decisive, load_lexical_index, rebuild_lexical_index, reciprocal_rank_fusion, stored_documents, update_lexical_index
+from .scheduler import SCHEDULER, SchedulerBusy
+from .telemetry import activate, current_trace
+from .titles import get_title_index
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_cohere import CohereEmbeddings 
-
-
-try:
-    print("Loading Embedding Model (Cohere)...")
-    EMBEDDINGS = CohereEmbeddings(model="embed-english-v3.0", cohere_api_key=os.getenv("COHERE_API_KEY"))
-    print("[OK] Cohere Embedding Model Loaded.")
-except Exception as e:
-    print(f"[ERROR] Error loading Cohere embedding model: {e}")
-    EMBEDDINGS = None
-
-try:
-    print("Loading Chat LLM (gemini-flash-latest)...")
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        print("[ERROR] GOOGLE_API_KEY environment variable is not set!")
-        LLM = None
-    else:
-        LLM = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest", 
-            google_api_key=google_api_key, 
-            temperature=0.2,
-            timeout=30 
-        )
-        print("[OK] Google Chat LLM Loaded.")
-except Exception as e:
-    print(f"[ERROR] Error loading Google Chat LLM: {e}")
-    import traceback
-    traceback.print_exc()
-    LLM = None
+
+
+class _LazyClass:
+    """
+    Stands in for a heavy LangChain class and imports it on first use, so
+    importing this module (and with it every manage.py command, test run
+    and worker boot) does not pay for the integration packages.
+    """
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self._cls = None
+
+    def load(self):
+        if self._cls is None:
+            self._cls = getattr(importlib.import_module(self.module), self.name)
+        return self._cls
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+
+RecursiveCharacterTextSplitter = _LazyClass('langchain_text_splitters', 'RecursiveCharacterTextSplitter')
+FAISS = _LazyClass('langchain_community.vectorstores', 'FAISS')
+PDFPlumberLoader = _LazyClass('langchain_community.document_loaders', 'PDFPlumberLoader')
+
+
+# --- MODELS ---
+# Built on first use by load_models() (or ahead of time by warm_up()), not at
+# import. Each stays _NOT_LOADED until then and None if loading failed.
+_NOT_LOADED = object()
+_MODELS_LOCK = threading.Lock()
+# Chat clients keyed by (model, temperature, timeout); see chatbot/llms.py.
+_CHAT_LLMS = {}
+
+# Provider is chosen per deployment (CHATBOT_EMBEDDING_PROVIDER); see chatbot/embeddings.py.
+EMBEDDINGS = _NOT_LOADED
+EMBEDDING_MODEL_ID = configured_model_id()
+# The default-tier chat model; chains without their own settings in CHATBOT_CHAIN_LLMS use it.
+LLM = _NOT_LOADED
 
 PARSER = StrOutputParser()
 
@@ -60,12 +99,14 @@ Possible "intent" values:
 - "summary": User wants a summary.
 - "abstract": User wants an abstract.
 - "pdf_question": User wants to ask a Q&A question about the content.
+- "comparison": User wants to compare or contrast two or more documents.
 - "off_topic": User is asking a general knowledge question.
 
 For "doc_name":
 - If the user specifies a document (e.g., "pdf1", "the paper on optimizers", "EJ1172284"), extract that name or title.
 - If the user asks about "both", "all", or "all documents", return "all".
 - If the user doesn't specify (e.g., "explain in short"), return "all".
+- For "comparison", return a list of the documents named, or "all" if none are named.
 
 Examples:
 Query: "give summary of pdf1 in very very short"
@@ -80,6 +121,9 @@ Query: "what is a query optimizer?"
 Query: "explain pdf in short"
 {{"intent": "summary", "doc_name": "all"}}
 
+Query: "how do the methods of pdf1 and the paper on optimizers differ?"
+{{"intent": "comparison", "doc_name": ["pdf1", "the paper on optimizers"]}}
+
 Query: "what is the capital of France?"
 {{"intent": "off_topic", "doc_name": "none"}}
 
@@ -87,7 +131,7 @@ User Query: "{question}"
 JSON Output:
 """)
 JSON_PARSER = JsonOutputParser()
-CLASSIFIER_CHAIN = CLASSIFIER_PROMPT | LLM | JSON_PARSER
+CLASSIFIER_CHAIN = _NOT_LOADED
 
 
 QA_PROMPT = ChatPromptTemplate.from_template("""
@@ -99,7 +143,107 @@ Context:
 Question:
 {question}
 """)
-QA_CHAIN = QA_PROMPT | LLM | PARSER
+QA_CHAIN = _NOT_LOADED
+
+
+MEMORY_SUMMARY_PROMPT = ChatPromptTemplate.from_template("""
+Update the running summary of a conversation between a researcher and an assistant about the researcher's documents.
+Fold in the new exchanges below. Keep the documents, topics and findings that were discussed, so later questions can refer back to them.
+Use at most {max_chars} characters. Return only the summary.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}
+
+Updated summary:
+""")
+
+CONDENSE_PROMPT = ChatPromptTemplate.from_template("""
+Rewrite the follow-up question so it can be understood without the conversation, using the conversation only to resolve what it refers to.
+Name documents and topics explicitly (e.g. "pdf2", "the paper on optimizers"). If it is already standalone, return it unchanged.
+Return only the question.
+
+Conversation:
+{history}
+
+Follow-up question: {question}
+Standalone question:
+""")
+
+
+def _chat_llm(chain=None):
+    """The chat model for `chain` (the default tier when None), built once per configuration."""
+    config = chain_config(chain) if chain else default_config()
+    key = config_key(config)
+    if key not in _CHAT_LLMS:
+        _CHAT_LLMS[key] = build_chat_model(config)
+    return _CHAT_LLMS[key]
+
+
+def _build_chain(prompt, chain, parser):
+    llm = _chat_llm(chain)
+    return prompt | metered(llm, chain) | parser if llm else None
+
+
+def _chain_llm(chain):
+    """
+    Model for a chain assembled per call (ingestion and digests). Chains
+    without their own settings share LLM.
+    """
+    load_models()
+    if chain_config(chain) == default_config():
+        return metered(LLM, chain)
+    return metered(_chat_llm(chain), chain)
+
+
+def _models_pending():
+    return any(model is _NOT_LOADED for model in (EMBEDDINGS, LLM, CLASSIFIER_CHAIN, QA_CHAIN))
+
+
+async def _aload_models():
+    """load_models() off the event loop; client construction can take a second."""
+    if _models_pending():
+        await sync_to_async(load_models, thread_sensitive=False)()
+
+
+def load_models():
+    """
+    Build whichever of EMBEDDINGS, LLM and the chains are still unloaded.
+    Cheap after the first call; names that tests patch are left alone.
+    """
+    global EMBEDDINGS, LLM, CLASSIFIER_CHAIN, QA_CHAIN
+    if not _models_pending():
+        return
+    with _MODELS_LOCK:
+        if EMBEDDINGS is _NOT_LOADED:
+            EMBEDDINGS, _ = load_embeddings()
+        if LLM is _NOT_LOADED:
+            LLM = _chat_llm()
+        # The chains always wrap the real model, so they are never built around a patched LLM.
+        if CLASSIFIER_CHAIN is _NOT_LOADED:
+            CLASSIFIER_CHAIN = _build_chain(CLASSIFIER_PROMPT, 'classifier', JSON_PARSER)
+        if QA_CHAIN is _NOT_LOADED:
+            QA_CHAIN = _build_chain(QA_PROMPT, 'qa', PARSER)
+
+
+def warm_up(background=False):
+    """
+    Load the models and the vector store class ahead of the first question.
+    Called by the WSGI/ASGI entry points when CHATBOT_WARM_UP is on.
+    """
+    if background:
+        threading.Thread(target=warm_up, name="chatbot-warm-up", daemon=True).start()
+        return
+    started = time.monotonic()
+    try:
+        load_models()
+        FAISS.load()
+    except Exception as e:
+        print(f"[Warm-up] Failed: {e}")
+        return
+    print(f"[Warm-up] Chatbot models ready in {time.monotonic() - started:.2f}s.")
 
 
 # --- HELPERS ---
@@ -110,41 +254,15 @@ SUMMARY_HINT_PATTERN = re.compile(
     flags=re.IGNORECASE,
 )
 
-def _normalize_text(text):
-    if not text:
-        return ''
-    lowered = text.lower()
-    cleaned = re.sub(r'[^a-z0-9]+', ' ', lowered)
-    return cleaned.strip()
-
 DOCUMENT_MATCH_RATIO_THRESHOLD = 0.65
 
 
 def _match_pdf_title(workspace, doc_name):
     """
-    Return the best PDF and a normalized similarity ratio for the provided name.
+    Return the best PDF title entry (id, title) and a normalized similarity
+    ratio for the provided name.
     """
-    normalized_target = _normalize_text(doc_name)
-    if not normalized_target:
-        return None, 0.0
-
-    best_pdf = None
-    best_ratio = 0.0
-
-    for pdf in PDFFile.objects.filter(workspace=workspace):
-        normalized_title = _normalize_text(pdf.title)
-        if not normalized_title:
-            continue
-
-        if normalized_title == normalized_target or normalized_target in normalized_title or normalized_title in normalized_target:
-            return pdf, 1.0
-
-        ratio = SequenceMatcher(None, normalized_target, normalized_title).ratio()
-        if ratio > best_ratio:
-            best_ratio = ratio
-            best_pdf = pdf
-
-    return best_pdf, best_ratio
+    return get_title_index(workspace.id).match(doc_name)
 
 
 def _best_matching_pdf(workspace, doc_name):
@@ -157,9 +275,9 @@ def _validate_specific_pdf_request(workspace, doc_name):
     if not doc_name or doc_name in ('all', 'none'):
         return None
 
-    available_titles = list(workspace.pdf_files.values_list('title', flat=True))
-    matched_pdf, ratio = _match_pdf_title(workspace, doc_name)
-    print(f"[Guardrail] Requested '{doc_name}'. Available titles: {available_titles}")
+    title_index = get_title_index(workspace.id)
+    matched_pdf, ratio = title_index.match(doc_name)
+    print(f"[Guardrail] Requested '{doc_name}'. Available titles: {title_index.titles}")
 
     if not matched_pdf:
         print(f"[Guardrail] No matching title found for '{doc_name}'.")
@@ -174,32 +292,10 @@ def _validate_specific_pdf_request(workspace, doc_name):
 
 
 def _detect_pdf_from_query(workspace, query_text):
-    normalized_query = _normalize_text(query_text)
-    if not normalized_query:
-        return None
-
-    best_ratio = 0.0
-    best_pdf = None
-
-    for pdf in PDFFile.objects.filter(workspace=workspace):
-        normalized_title = _normalize_text(pdf.title)
-        if not normalized_title:
-            continue
-
-        if normalized_title in normalized_query or normalized_query in normalized_title:
-            print(f"[FuzzyMatch] Substring match: '{pdf.title}' for query '{query_text}'")
-            return pdf
-
-        ratio = SequenceMatcher(None, normalized_query, normalized_title).ratio()
-        if ratio > best_ratio:
-            best_ratio = ratio
-            best_pdf = pdf
-
-    if best_ratio >= 0.65:
-        print(f"[FuzzyMatch] SequenceMatcher match ({best_ratio:.2f}) for '{best_pdf.title}'")
-        return best_pdf
-
-    return None
+    matched_pdf, ratio = get_title_index(workspace.id).detect(query_text, DOCUMENT_MATCH_RATIO_THRESHOLD)
+    if matched_pdf:
+        print(f"[FuzzyMatch] Matched '{matched_pdf.title}' ({ratio:.2f}) for query '{query_text}'")
+    return matched_pdf
 
 
 def _extract_doc_name_from_query(query_text):
@@ -227,8 +323,27 @@ def _resolve_target_pdf(workspace, doc_name_hint, user_query):
     return fuzzy_match
 
 
+def _combine_sections(kind, section_texts):
+    """One LLM call that merges per-document summaries (or abstracts) into one."""
+    combined_text = "\n\n---\n\n".join(section_texts)
+    combine_prompt = ChatPromptTemplate.from_template(f"Please create a single, cohesive {kind} based on the following individual document sections:\n\n{{text}}")
+    combine_chain = combine_prompt | _chain_llm('combine') | PARSER
+    return combine_chain.invoke({"text": combined_text})
+
+
+def _extend_combined_text(kind, previous, section_texts):
+    """Update an existing combined summary (or abstract) with newly added documents."""
+    extend_prompt = ChatPromptTemplate.from_template(
+        f"Here is a cohesive {kind} of a set of documents:\n\n{{previous}}\n\n"
+        f"Rewrite it as a single, cohesive {kind} that also covers the following new document sections:\n\n{{text}}"
+    )
+    extend_chain = extend_prompt | _chain_llm('combine') | PARSER
+    return extend_chain.invoke({"previous": previous, "text": "\n\n---\n\n".join(section_texts)})
+
+
 def add_pdf_to_workspace_index(pdf_id):
-    
+    load_models()
+
     try:
         doc = PDFFile.objects.get(id=pdf_id) 
         workspace = doc.workspace
@@ -275,12 +390,12 @@ def add_pdf_to_workspace_index(pdf_id):
 
         print(f"[Task {doc.id}] Generating summary...")
         summary_prompt = ChatPromptTemplate.from_template("Provide a concise, 3-4 line summary of the following research paper text: {text}")
-        summary_chain = summary_prompt | LLM | PARSER
+        summary_chain = summary_prompt | _chain_llm('summary') | PARSER
         doc.summary = summary_chain.invoke({"text": full_text})
 
         print(f"[Task {doc.id}] Extracting abstract...")
         abstract_prompt = ChatPromptTemplate.from_template("Extract the 'abstract' section from this research paper text. Return only the abstract's text. If no abstract is found, just return 'N/A'.: {text}")
-        abstract_chain = abstract_prompt | LLM | PARSER
+        abstract_chain = abstract_prompt | _chain_llm('abstract') | PARSER
         doc.abstract = abstract_chain.invoke({"text": full_text})
 
         # --- Inject source info into each page for Q&A indexing ---
@@ -307,6 +422,9 @@ def add_pdf_to_workspace_index(pdf_id):
 
         if not chunks:
             raise ValueError("Failed to create chunks from documents.")
+        # A stable id per chunk, so traces can tell which chunks an answer used.
+        for position, chunk in enumerate(chunks):
+            chunk.metadata["chunk_id"] = f"{doc.id}:{position}"
 
        
         if not workspace.index_path:
@@ -317,7 +435,9 @@ def add_pdf_to_workspace_index(pdf_id):
         else:
             index_save_path = workspace.index_path
 
-        if os.path.exists(os.path.join(index_save_path, "index.faiss")):
+        had_existing_index = os.path.exists(os.path.join(index_save_path, "index.faiss"))
+        if had_existing_index:
+            ensure_index_model(index_save_path, EMBEDDING_MODEL_ID)
             print(f"[Task {doc.id}] Loading existing index from: {index_save_path}")
             vectorstore = FAISS.load_local(index_save_path, EMBEDDINGS, allow_dangerous_deserialization=True)
             print(f"[Task {doc.id}] Adding {len(chunks)} new chunks to index...")
@@ -327,6 +447,12 @@ def add_pdf_to_workspace_index(pdf_id):
             vectorstore = FAISS.from_documents(chunks, EMBEDDINGS)
 
         vectorstore.save_local(index_save_path)
+        write_index_manifest(index_save_path, EMBEDDING_MODEL_ID, getattr(getattr(vectorstore, "index", None), "d", None))
+
+        try:
+            update_lexical_index(index_save_path, chunks, had_existing_index, vectorstore)
+        except Exception as e:
+            print(f"[Task {doc.id}] [WARN] Keyword index not updated: {e}")
 
         
         doc.is_indexed = True
@@ -345,29 +471,369 @@ def add_pdf_to_workspace_index(pdf_id):
 
 
 
+def backfill_lexical_index(workspace):
+    """
+    Build the keyword index of a workspace from the chunks already stored in
+    its FAISS index, without re-reading or re-embedding any PDF. Returns the
+    number of chunks indexed.
+    """
+    load_models()
+    vectorstore = get_cached_vector_store(workspace.index_path)
+    return len(rebuild_lexical_index(workspace.index_path, stored_documents(vectorstore)))
+
+
+def _query_embeddings():
+    """
+    Embeddings used for answering questions. Query vectors are memoized per
+    worker so repeated questions skip the embedding round trip.
+    """
+    load_models()
+    if EMBEDDINGS is None:
+        return None
+    return CachedQueryEmbeddings(EMBEDDINGS, model_id=EMBEDDING_MODEL_ID, breaker=EMBEDDINGS_BREAKER)
+
+
+def _embed_query_for_cache(question):
+    """
+    Query embedding used for near-duplicate answer lookups. Goes through the
+    query embedding cache, so the later similarity search does not embed again.
+    """
+    embeddings = _query_embeddings()
+    if embeddings is None:
+        return None
+    try:
+        return embeddings.embed_query(question)
+    except Exception as e:
+        print(f"[AnswerCache] Could not embed question for near-duplicate lookup: {e}")
+        return None
+
+
+async def _aembed_query_for_cache(question):
+    embeddings = _query_embeddings()
+    if embeddings is None:
+        return None
+    try:
+        return await embeddings.aembed_query(question)
+    except Exception as e:
+        print(f"[AnswerCache] Could not embed question for near-duplicate lookup: {e}")
+        return None
+
+
+# Vector stores loaded once for a batch of questions or a comparison's per-document searches,
+# keyed by index path (see _preload_index).
+_BATCH_VECTOR_STORES = contextvars.ContextVar('chatbot_batch_vector_stores', default=None)
+
+
 def get_cached_vector_store(index_path):
     """ (Unchanged) """
+    batch_stores = _BATCH_VECTOR_STORES.get()
+    if batch_stores and index_path in batch_stores:
+        return batch_stores[index_path]
     if not os.path.exists(index_path):
         raise FileNotFoundError("Index path does not exist.")
+    ensure_index_model(index_path, EMBEDDING_MODEL_ID)
     print(f"Loading index from disk: {index_path}")
-    return FAISS.load_local(index_path, EMBEDDINGS, allow_dangerous_deserialization=True)
+    with current_trace().stage('index_load'):
+        return FAISS.load_local(index_path, _query_embeddings(), allow_dangerous_deserialization=True)
 
 
-def _get_query_classification(user_query):
+def _search_workspace_index(index_path, question, k=5, filter_kwargs=None):
     """
-    (Unchanged)
-    NEW internal helper function. Uses the JSON CLASSIFIER_CHAIN.
+    Similarity search against a workspace index. Uses the shared index server
+    when one is configured and reachable, otherwise searches in-process.
     """
+    client = get_index_server_client()
+    if client is not None:
+        try:
+            return client.search(index_path, question, k=k, filter=filter_kwargs)
+        except IndexServerUnavailable as e:
+            print(f"[IndexServer] {e} Falling back to in-process search.")
+
+    vectorstore = get_cached_vector_store(index_path)
+    return vectorstore.similarity_search(question, k=k, filter=filter_kwargs)
+
+
+async def _asearch_workspace_index(index_path, question, k=5, filter_kwargs=None):
+    """Async _search_workspace_index: the query embedding is awaited, not run on a worker thread."""
+    client = get_index_server_client()
+    if client is not None:
+        try:
+            return await sync_to_async(client.search, thread_sensitive=False)(
+                index_path, question, k=k, filter=filter_kwargs
+            )
+        except IndexServerUnavailable as e:
+            print(f"[IndexServer] {e} Falling back to in-process search.")
+
+    vectorstore = await sync_to_async(get_cached_vector_store, thread_sensitive=False)(index_path)
+    return await vectorstore.asimilarity_search(question, k=k, filter=filter_kwargs)
+
+
+def _lexical_candidates(index_path, question, k, filter_kwargs):
+    """BM25 results plus the decisive-match shortcut: (results, decisive docs or None)."""
+    lexical_results, coverage = [], 0
+    try:
+        lexical_index = load_lexical_index(index_path)
+        if lexical_index is not None:
+            lexical_results, coverage = lexical_index.search(question, k=k, filter=filter_kwargs)
+    except Exception as e:
+        print(f"[Hybrid] Keyword search failed, using vector search only: {e}")
+
+    if is_decisive(lexical_results, coverage):
+        print(f"[Hybrid] Decisive keyword match (score={lexical_results[0][1]:.2f}); skipping embedding.")
+        return lexical_results, [doc for doc, _ in lexical_results]
+    return lexical_results, None
+
+
+def _fuse_results(vector_results, lexical_results, k):
+    if not lexical_results:
+        return vector_results
+
+    print(f"[Hybrid] Fusing {len(vector_results)} vector and {len(lexical_results)} keyword results.")
+    return reciprocal_rank_fusion([vector_results, [doc for doc, _ in lexical_results]], k=k)
+
+
+def _lexical_only(lexical_results, error):
+    """Keyword results alone while the embedding provider's breaker is open; re-raises without any."""
+    if not lexical_results:
+        raise error
+    print(f"[Breaker] Embeddings unavailable; answering from {len(lexical_results)} keyword results only.")
+    return [doc for doc, _ in lexical_results]
+
+
+def _retrieve_chunks(index_path, question, k=5, filter_kwargs=None):
+    """
+    Hybrid retrieval: BM25 over the workspace keyword index fused with vector
+    search. A decisive keyword match is returned without embedding the question,
+    and keyword results alone are used while the embedding breaker is open.
+    """
+    with current_trace().stage('search'):
+        lexical_results, decisive_docs = _lexical_candidates(index_path, question, k, filter_kwargs)
+        if decisive_docs is not None:
+            return decisive_docs
+
+        try:
+            # Also covers the index server, which embeds out of process.
+            EMBEDDINGS_BREAKER.check()
+            vector_results = _search_workspace_index(index_path, question, k=k, filter_kwargs=filter_kwargs)
+        except CircuitOpen as e:
+            return _lexical_only(lexical_results, e)
+        return _fuse_results(vector_results, lexical_results, k)
+
+
+async def _aretrieve_chunks(index_path, question, k=5, filter_kwargs=None):
+    with current_trace().stage('search'):
+        # Loading the keyword index reads and parses a JSON file; keep it off the event loop.
+        lexical_results, decisive_docs = await sync_to_async(_lexical_candidates, thread_sensitive=False)(
+            index_path, question, k, filter_kwargs
+        )
+        if decisive_docs is not None:
+            return decisive_docs
+
+        try:
+            # Also covers the index server, which embeds out of process.
+            EMBEDDINGS_BREAKER.check()
+            vector_results = await _asearch_workspace_index(index_path, question, k=k, filter_kwargs=filter_kwargs)
+        except CircuitOpen as e:
+            return _lexical_only(lexical_results, e)
+        return _fuse_results(vector_results, lexical_results, k)
+
+
+class StreamedAnswer:
+    """
+    A QA answer generated token by token. Iterating yields text chunks as the
+    LLM produces them; `text` holds the whole answer once iteration finishes.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._callbacks = []
+        self._finalizers = []
+        self.text = ""
+        self.failed = False
+        self.error = None
+
+    def on_complete(self, callback):
+        self._callbacks.append(callback)
+
+    def on_close(self, callback):
+        """Run `callback` once iteration ends, including when the consumer stops early."""
+        self._finalizers.append(callback)
+
+    def __iter__(self):
+        parts = []
+        try:
+            try:
+                for chunk in self._chunks:
+                    if chunk:
+                        parts.append(chunk)
+                        yield chunk
+            except Exception as e:
+                print(f"[RAG] Error while streaming QA_CHAIN: {e}")
+                self.failed = True
+                self.error = e
+                error_text = f"Error generating answer: {str(e)}"
+                parts.append(error_text)
+                yield error_text
+            self.text = "".join(parts)
+            for callback in self._callbacks:
+                callback(self)
+        finally:
+            for finalizer in self._finalizers:
+                finalizer()
+
+
+def _breaker_tracked(answer):
+    """Report a streamed answer's outcome to LLM_BREAKER (the call was admitted by the caller)."""
+    answer.on_complete(lambda done: LLM_BREAKER.record_failure(done.error) if done.failed else LLM_BREAKER.record_success())
+    answer.on_close(LLM_BREAKER.release)
+    return answer
+
+
+def _stage_tracked(answer, stage):
+    """Add the time until a streamed answer closes to the current trace's `stage`."""
+    trace, started = current_trace(), time.monotonic()
+    answer.on_close(lambda: trace.add_stage(stage, time.monotonic() - started))
+    return answer
+
+
+_SPECULATIVE_EXECUTOR = None
+_SPECULATIVE_EXECUTOR_LOCK = threading.Lock()
+
+
+def _speculative_executor():
+    global _SPECULATIVE_EXECUTOR
+    with _SPECULATIVE_EXECUTOR_LOCK:
+        if _SPECULATIVE_EXECUTOR is None:
+            _SPECULATIVE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_SPECULATIVE_WORKERS', 4),
+                thread_name_prefix="chatbot-speculative",
+            )
+    return _SPECULATIVE_EXECUTOR
+
+
+class SpeculativeRetrieval:
+    """
+    Retrieval started while the intent is still being classified. The result
+    is only used if the RAG route ends up searching with the same filter.
+    """
+
+    def __init__(self, future, filter_kwargs):
+        self.future = future
+        self.filter_kwargs = filter_kwargs
+        self.consumed = False
+
+    def result_for(self, filter_kwargs, timeout=None):
+        """
+        Return the speculative chunks, or None if the caller must retrieve
+        itself. Raises DeadlineExceeded if they are not ready within `timeout`.
+        """
+        self.consumed = True
+        if filter_kwargs != self.filter_kwargs:
+            self.future.cancel()
+            print(f"[Speculative] Filter changed ({self.filter_kwargs} -> {filter_kwargs}); retrieving again.")
+            return None
+        try:
+            docs = self.future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            self.future.cancel()
+            raise DeadlineExceeded(f"speculative retrieval exceeded {timeout:.1f}s")
+        except Exception as e:
+            print(f"[Speculative] Retrieval failed ({e}); retrieving again.")
+            return None
+        print(f"[Speculative] Using {len(docs)} chunks retrieved during classification.")
+        return docs
+
+    def discard(self, reason):
+        if not self.consumed:
+            self.consumed = True
+            self.future.cancel()
+            print(f"[Speculative] Discarded retrieval ({reason}).")
+
+
+def _start_speculative_retrieval(workspace, question):
+    if not getattr(settings, 'CHATBOT_SPECULATIVE_RETRIEVAL', False) or not workspace.index_path:
+        return None
+    try:
+        target_pdf = _resolve_target_pdf(workspace, _extract_doc_name_from_query(question), question)
+        filter_kwargs = {"pdf_id": target_pdf.id} if target_pdf else None
+        future = _speculative_executor().submit(
+            contextvars.copy_context().run, _retrieve_chunks, workspace.index_path, question, 5, filter_kwargs
+        )
+    except Exception as e:
+        print(f"[Speculative] Could not start retrieval: {e}")
+        return None
+    return SpeculativeRetrieval(future, filter_kwargs)
+
+
+def _corpus_coverage(index_path, question):
+    if not index_path:
+        return 0.0
+    try:
+        lexical_index = load_lexical_index(index_path)
+        return lexical_index.term_coverage(question) if lexical_index is not None else 0.0
+    except Exception as e:
+        print(f"[Router] Keyword index unavailable for routing: {e}")
+        return 0.0
+
+
+def _classify_locally(user_query, index_path):
+    """The local router's classification, or None when the classifier LLM must decide."""
     print(f"Classifying query: {user_query}")
+    local = classify_locally(
+        user_query,
+        doc_hint=_extract_doc_name_from_query(user_query),
+        corpus_coverage=_corpus_coverage(index_path, user_query),
+    )
+    if local['confidence'] >= settings.CHATBOT_INTENT_CONFIDENCE_THRESHOLD:
+        ROUTER_STATS.record(used_llm=False)
+        print(f"[Router] Local classification {local}. {ROUTER_STATS.summary()}")
+        return {'intent': local['intent'], 'doc_name': local['doc_name']}
+
+    ROUTER_STATS.record(used_llm=True)
+    print(f"[Router] Ambiguous locally (confidence={local['confidence']}). {ROUTER_STATS.summary()}")
+    return None
+
+
+def _classifier_budget(deadline):
+    """
+    Seconds the classifier LLM may take, keeping enough of the request for
+    generation; None when unbounded. Returns 0 when it should be skipped.
+    """
+    budget = (deadline or Deadline()).budget(stage_budget('classify'), reserve=min_generation_seconds())
+    if budget is not None and budget < MIN_STAGE_SECONDS:
+        print(f"[Deadline] Skipping the classifier LLM ({deadline}); answering as a pdf_question.")
+        return 0
+    return budget
+
+
+def _get_query_classification(user_query, index_path=None, deadline=None):
+    """
+    Classify with the local rule-based router first; only ambiguous questions
+    go to the JSON CLASSIFIER_CHAIN, within the classifier's share of `deadline`.
+    """
+    local = _classify_locally(user_query, index_path)
+    if local is not None:
+        return local
+
+    load_models()
     if not CLASSIFIER_CHAIN or LLM is None:
         print("Classifier chain not loaded. Defaulting to 'pdf_question'.")
         return {'intent': 'pdf_question', 'doc_name': 'all'}
+
+    budget = _classifier_budget(deadline)
+    if budget == 0:
+        return {'intent': 'pdf_question', 'doc_name': 'all'}
     
     try:
         print(f"Invoking classifier chain...")
-        result = CLASSIFIER_CHAIN.invoke({"question": user_query})
+        result = call_with_timeout(
+            budget, LLM_BREAKER.call, HEDGERS['classifier'].call, CLASSIFIER_CHAIN.invoke, {"question": user_query}
+        )
         print(f"Classification result: {result}")
         return result
+    except CircuitOpen as e:
+        print(f"[Breaker] {e} Defaulting to pdf_question.")
+        return {'intent': 'pdf_question', 'doc_name': 'all'}
     except Exception as e:
         print(f"Error in classification: {e}. Defaulting to pdf_question.")
         import traceback
@@ -375,132 +841,916 @@ def _get_query_classification(user_query):
         return {'intent': 'pdf_question', 'doc_name': 'all'}
 
 
-def get_chatbot_response(question, workspace_id):
+async def _aget_query_classification(user_query, index_path=None, deadline=None):
+    local = await sync_to_async(_classify_locally, thread_sensitive=False)(user_query, index_path)
+    if local is not None:
+        return local
+
+    await _aload_models()
+    if not CLASSIFIER_CHAIN or LLM is None:
+        print("Classifier chain not loaded. Defaulting to 'pdf_question'.")
+        return {'intent': 'pdf_question', 'doc_name': 'all'}
+
+    try:
+        budget = _classifier_budget(deadline)
+        if budget == 0:
+            return {'intent': 'pdf_question', 'doc_name': 'all'}
+        result = await acall_with_timeout(
+            budget, LLM_BREAKER.acall(HEDGERS['classifier'].acall(CLASSIFIER_CHAIN.ainvoke, {"question": user_query}))
+        )
+        print(f"Classification result: {result}")
+        return result
+    except Exception as e:
+        print(f"Error in classification: {e}. Defaulting to pdf_question.")
+        return {'intent': 'pdf_question', 'doc_name': 'all'}
+
+
+def _fold_memory(summary, turns, deadline=None):
+    """The rolling conversation summary with `turns` folded in; '' to fall back to a local fold."""
+    budget = _classifier_budget(deadline)
+    if budget == 0:
+        return ''
+    try:
+        llm = _chain_llm('memory')
+        if llm is None:
+            return ''
+        chain = MEMORY_SUMMARY_PROMPT | llm | PARSER
+        return call_with_timeout(budget, LLM_BREAKER.call, chain.invoke, {
+            "summary": summary or "(none)", "turns": format_turns(turns), "max_chars": summary_chars(),
+        })
+    except Exception as e:
+        print(f"[Memory] Could not summarize earlier turns: {e}")
+        return ''
+
+
+def _condense_question(question, memory, deadline=None):
+    budget = _classifier_budget(deadline)
+    if budget == 0:
+        return question
+    try:
+        llm = _chain_llm('memory')
+        if llm is None:
+            return question
+        chain = CONDENSE_PROMPT | llm | PARSER
+        standalone = call_with_timeout(
+            budget, LLM_BREAKER.call, chain.invoke, {"history": memory.text(), "question": question}
+        )
+    except Exception as e:
+        print(f"[Memory] Could not rewrite follow-up; answering it as asked: {e}")
+        return question
+    standalone = (standalone or '').strip()
+    return standalone or question
+
+
+def _standalone_question(question, workspace, user_id, deadline=None):
+    """
+    `question` rewritten against the user's conversation memory when it reads
+    as a follow-up; otherwise unchanged, without touching the memory.
+    """
+    if not user_id or not getattr(settings, 'CHATBOT_MEMORY', True) or not looks_like_follow_up(question):
+        return question
+    with current_trace().stage('memory'):
+        memory = load_memory(
+            user_id, workspace.id, summarize=lambda summary, turns: _fold_memory(summary, turns, deadline)
+        )
+        # Only the last few turns can hold what a follow-up points back at.
+        if not memory.turns:
+            return question
+        standalone = _condense_question(question, memory, deadline)
+    if standalone != question:
+        print(f"[Memory] Follow-up {question[:100]!r} -> {standalone[:100]!r}")
+    return standalone
+
+
+def _answer_ready_workspace(question, workspace, route_info):
+    """
+    Route a question for a READY workspace. Sets route_info['cacheable'] when
+    the returned text is a real answer that may be served again from the
+    answer cache.
+    """
+    # Retrieval almost always follows, so start it alongside classification.
+    speculation = _start_speculative_retrieval(workspace, question)
+    try:
+        return _route_ready_question(question, workspace, route_info, speculation)
+    finally:
+        if speculation is not None:
+            speculation.discard(f"intent={route_info.get('intent')}")
+
+
+def _read_classification(question, classification, route_info):
+    """Return (intent, doc_name, specific_doc_name) for a classifier result."""
+    intent = classification.get('intent')
+    doc_name = classification.get('doc_name')
+    route_info['intent'] = intent
     
+    print(f"Router: Intent='{intent}', DocName='{doc_name}'")
+    doc_hint = _extract_doc_name_from_query(question)
+    specific_doc_name = None
+    if doc_hint:
+        specific_doc_name = doc_hint
+    elif isinstance(doc_name, str) and doc_name not in ('', 'all', 'none'):
+        specific_doc_name = doc_name
+    return intent, doc_name, specific_doc_name
+
+
+def _rag_target(workspace, requested_pdf, specific_doc_name, question, route_info):
+    """Return (target_pdf, filter_kwargs) restricting retrieval to one document, if any."""
+    target_pdf = requested_pdf or _resolve_target_pdf(workspace, specific_doc_name, question)
+    filter_kwargs = {"pdf_id": target_pdf.id} if target_pdf else None
+
+    if target_pdf:
+        print(f"[RAG] Filtering context for PDF '{target_pdf.title}' (ID {target_pdf.id}).")
+    route_info['target_pdf_id'] = target_pdf.id if target_pdf else None
+    return target_pdf, filter_kwargs
+
+
+def _similar_cached_answer(workspace, route_info, query_vector):
+    route_info['query_vector'] = query_vector
+    similar_answer = ANSWER_CACHE.get_similar(
+        workspace.id, route_info['index_version'], route_info['target_pdf_id'], query_vector
+    )
+    current_trace().cache('similar_answer', similar_answer is not None)
+    if similar_answer is not None:
+        print(f"[AnswerCache] Near-duplicate hit for workspace {workspace.id}. Stats: {ANSWER_CACHE.stats()}")
+    return similar_answer
+
+
+def _no_relevant_docs_message(target_pdf):
+    if target_pdf:
+        return f"I could not find relevant information within '{target_pdf.title}'. Please try another question."
+    return "I could not find any relevant information about that in the workspace documents."
+
+
+def _excerpt_answer(relevant_docs, route_info):
+    """Partial answer when there is no time left to generate: the top retrieved passages."""
+    route_info['partial'] = True
+    print("[Deadline] Out of time for generation; answering with retrieved excerpts.")
+    return (
+        "I ran out of time before I could write a full answer. "
+        "These are the most relevant passages I found:\n\n" + format_excerpts(relevant_docs)
+    )
+
+
+def _unavailable_answer(relevant_docs, route_info, error):
+    """Degraded answer while the LLM breaker is open: the top retrieved passages, without waiting on Gemini."""
+    route_info['partial'] = True
+    print(f"[Breaker] {error} Answering with retrieved excerpts.")
+    return (
+        "The AI service is temporarily unavailable, so I can't write a full answer right now. "
+        "These are the most relevant passages I found:\n\n" + format_excerpts(relevant_docs)
+    )
+
+
+def _partial_digest(intent, sections, route_info, reason=None):
+    """Partial answer when summaries could not be combined in time (or at all): the per-document texts."""
+    route_info['partial'] = True
+    reason = reason or f"I ran out of time combining the {intent}s."
+    print(f"[Digest] Answering with the individual {intent}s: {reason}")
+    return f"{reason} Here is each document's {intent}:\n\n" + "\n\n---\n\n".join(
+        text for _, text in sections
+    )
+
+
+def _search_unavailable_message(route_info, error):
+    route_info['partial'] = True
+    print(f"[Breaker] {error}")
+    return (
+        "Document search is temporarily unavailable. "
+        f"Please try again in about {error.retry_after} seconds."
+    )
+
+
+def _retrieval_timeout_message(route_info):
+    route_info['partial'] = True
+    return "Sorry, searching the workspace documents took too long. Please try again in a moment."
+
+
+def _coalesced_timeout_message():
+    return "Sorry, the same question is still being answered and it did not finish in time. Please try again in a moment."
+
+
+def _generation_budget(deadline):
+    """Seconds left for the QA call, 0 when too little remains to start it, None when unbounded."""
+    budget = deadline.budget()
+    if budget is not None and budget < min_generation_seconds():
+        return 0
+    return budget
+
+
+def _rag_context(relevant_docs, route_info):
+    context, context_stats = build_context(
+        relevant_docs,
+        token_budget=getattr(settings, 'CHATBOT_CONTEXT_TOKEN_BUDGET', 1500),
+    )
+    route_info['context_stats'] = context_stats
+    print(
+        f"[RAG] Found {len(relevant_docs)} relevant chunks -> {context_stats['blocks']} context blocks, "
+        f"~{context_stats['tokens_after']} tokens (saved ~{context_stats['tokens_saved']})"
+    )
+    return context
+
+
+def _comparison_documents(workspace, question, doc_names=None):
+    """
+    The title entries of the PDFs to compare: those named in the question or
+    by the classifier, else every PDF of a workspace with at most
+    CHATBOT_COMPARE_MAX_DOCUMENTS. Empty when there are fewer than two.
+    """
+    limit = getattr(settings, 'CHATBOT_COMPARE_MAX_DOCUMENTS', 4)
+    title_index = get_title_index(workspace.id)
+    documents = title_index.mentioned(question)
+    if isinstance(doc_names, str):
+        doc_names = [doc_names]
+    for name in doc_names or []:
+        if not isinstance(name, str):
+            continue
+        entry = _validate_specific_pdf_request(workspace, name)
+        if entry and entry not in documents:
+            documents.append(entry)
+
+    if len(documents) < 2 and 2 <= len(title_index.entries) <= limit:
+        documents = list(title_index.entries)
+    if len(documents) < 2:
+        return []
+    print(f"[Compare] Comparing {[entry.title for entry in documents[:limit]]}")
+    return documents[:limit]
+
+
+_COMPARE_EXECUTOR = None
+_COMPARE_EXECUTOR_LOCK = threading.Lock()
+
+
+def _compare_executor():
+    global _COMPARE_EXECUTOR
+    with _COMPARE_EXECUTOR_LOCK:
+        if _COMPARE_EXECUTOR is None:
+            _COMPARE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_COMPARE_WORKERS', 8),
+                thread_name_prefix="chatbot-compare",
+            )
+    return _COMPARE_EXECUTOR
+
+
+def _retrieve_per_document(index_path, question, documents, deadline):
+    """
+    Search each document separately, in parallel, for its top
+    CHATBOT_COMPARE_K_PER_DOCUMENT chunks. Returns {pdf_id: chunks}; a
+    document whose search failed or ran out of time has no entry.
+    """
+    k = getattr(settings, 'CHATBOT_COMPARE_K_PER_DOCUMENT', 3)
+    # Load the index and embed the question once; each document then only runs a filtered search.
+    stores = _preload_index(index_path, [question], "Compare")
+    futures = {}
+    for entry in documents:
+        context = contextvars.copy_context()
+        context.run(_BATCH_VECTOR_STORES.set, stores)
+        future = _compare_executor().submit(
+            context.run, _retrieve_chunks, index_path, question, k, {"pdf_id": entry.id}
+        )
+        futures[future] = entry.id
+    done, pending = concurrent.futures.wait(futures, timeout=deadline.budget(stage_budget('retrieve')))
+    for future in pending:
+        future.cancel()
+    if not done:
+        raise DeadlineExceeded("per-document retrieval")
+
+    chunks_by_pdf = {}
+    for future in done:
+        try:
+            chunks_by_pdf[futures[future]] = future.result()
+        except EmbeddingModelMismatch:
+            raise
+        except Exception as e:
+            print(f"[Compare] Retrieval for PDF {futures[future]} failed: {e}")
+    return chunks_by_pdf
+
+
+def _comparison_context(documents, chunks_by_pdf, route_info):
+    """
+    One section per document, each packed into an equal share of
+    CHATBOT_CONTEXT_TOKEN_BUDGET, so no single paper crowds out the others.
+    """
+    token_budget = getattr(settings, 'CHATBOT_CONTEXT_TOKEN_BUDGET', 1500)
+    share = token_budget // max(1, sum(1 for entry in documents if chunks_by_pdf.get(entry.id)))
+    sections = []
+    totals = {'chunks': 0, 'blocks': 0, 'tokens_before': 0, 'tokens_after': 0, 'tokens_saved': 0}
+    for entry in documents:
+        docs = chunks_by_pdf.get(entry.id)
+        if not docs:
+            sections.append(f"Document: {entry.title}\n(No relevant passages found.)")
+            continue
+        context, stats = build_context(docs, token_budget=share)
+        sections.append(f"Document: {entry.title}\n{context}")
+        for key in totals:
+            totals[key] += stats[key]
+    route_info['context_stats'] = totals
+    print(
+        f"[Compare] {totals['chunks']} chunks from {len(chunks_by_pdf)} documents -> "
+        f"~{totals['tokens_after']} tokens ({share} per document)"
+    )
+    return "\n\n---\n\n".join(sections)
+
+
+def _answer_comparison(question, workspace, documents, route_info, deadline):
+    """Retrieve from each document in parallel, then answer in a single generation call."""
+    if not workspace.index_path:
+        return "Error: This workspace is ready but its index path is missing."
     try:
-        workspace = Workspace.objects.get(id=workspace_id)
-    except Workspace.DoesNotExist:
-        return "Error: This workspace does not exist."
+        chunks_by_pdf = _retrieve_per_document(workspace.index_path, question, documents, deadline)
+    except DeadlineExceeded as e:
+        print(f"[Deadline] Retrieval: {e}")
+        return _retrieval_timeout_message(route_info)
+    except EmbeddingModelMismatch as e:
+        print(f"[RAG] {e}")
+        return "This workspace was indexed with a different embedding model. Please re-index its documents."
+
+    relevant_docs = [doc for entry in documents for doc in chunks_by_pdf.get(entry.id) or []]
+    current_trace().set_chunks(relevant_docs)
+    if not relevant_docs:
+        return _no_relevant_docs_message(None)
+
+    context = _comparison_context(documents, chunks_by_pdf, route_info)
+    titles = ", ".join(f"'{entry.title}'" for entry in documents)
+    comparison_question = (
+        f"{question}\n\nCompare the documents {titles} point by point, using each document's "
+        "section of the context, and say where a document has nothing on the point."
+    )
+    return _generate_answer(comparison_question, context, relevant_docs, route_info, deadline)
+
+
+def _generate_answer(question, context, relevant_docs, route_info, deadline):
+    """
+    One QA_CHAIN call over `context`, within what is left of `deadline`;
+    streamed when route_info['stream'] is set. Falls back to the retrieved
+    excerpts when out of time or while the LLM breaker is open.
+    """
+    if not QA_CHAIN or LLM is None:
+        return "Error: The chatbot LLM is not initialized."
 
-    # --- 1. Handle Workspace Status (Unchanged) ---
+    generation_budget = _generation_budget(deadline)
+    if generation_budget == 0:
+        return _excerpt_answer(relevant_docs, route_info)
+    
+    if route_info.get('stream'):
+        try:
+            LLM_BREAKER.before_call()
+        except CircuitOpen as e:
+            return _unavailable_answer(relevant_docs, route_info, e)
+        print(f"[RAG] Streaming QA_CHAIN answer for question: {question[:100]}...")
+        route_info['cacheable'] = True
+        answer = _breaker_tracked(StreamedAnswer(QA_CHAIN.stream({"context": context, "question": question})))
+        return _stage_tracked(answer, 'generate')
+
+    print(f"[RAG] Invoking QA_CHAIN with question: {question[:100]}...")
+    try:
+        with current_trace().stage('generate'):
+            answer = call_with_timeout(
+                generation_budget, LLM_BREAKER.call,
+                HEDGERS['qa'].call, QA_CHAIN.invoke, {"context": context, "question": question},
+            )
+        print(f"[RAG] QA_CHAIN completed, answer length: {len(answer) if answer else 0} chars")
+        route_info['cacheable'] = bool(answer)
+        return answer
+    except DeadlineExceeded as e:
+        print(f"[Deadline] Generation: {e}")
+        return _excerpt_answer(relevant_docs, route_info)
+    except CircuitOpen as e:
+        return _unavailable_answer(relevant_docs, route_info, e)
+    except Exception as e:
+        print(f"[RAG] Error in QA_CHAIN.invoke: {e}")
+        import traceback
+        traceback.print_exc()
+        return f"Error generating answer: {str(e)}"
+
+
+def _route_ready_question(question, workspace, route_info, speculation=None, classification=None):
+    deadline = route_info.get('deadline') or Deadline()
+
+    # Step 1: Classify the user's intent
+    if classification is None:
+        with current_trace().stage('classify'):
+            classification = _get_query_classification(question, index_path=workspace.index_path, deadline=deadline)
+    intent, doc_name, specific_doc_name = _read_classification(question, classification, route_info)
+
+    # --- Route 1: Off-Topic ---
+    if intent == 'off_topic':
+        return "I cannot find that information in the provided documents."
+
+    # --- Route 2: Summary or Abstract ---
+    if intent == 'summary' or intent == 'abstract':
+        if specific_doc_name:
+            try:
+                requested_pdf = _validate_specific_pdf_request(workspace, specific_doc_name)
+                if not requested_pdf:
+                    return "PDF not available"
+
+                print(f"Best match for '{specific_doc_name}' is PDF: {requested_pdf.title}")
+
+                # Only the requested text column; the title index never loads PDF rows.
+                content = PDFFile.objects.filter(id=requested_pdf.id).values_list(intent, flat=True).first()
+                if not content or content == 'N/A' or content == SUMMARY_PLACEHOLDER:
+                    return f"A {intent} is not yet available for '{requested_pdf.title}'. Please try again shortly."
+
+                route_info['cacheable'] = True
+                route_info['target_pdf_id'] = requested_pdf.id
+                return content
+
+            except Exception as e:
+                print(f"Error finding specific doc: {e}")
+                return "I had trouble finding that specific document."
+
+        if doc_name == 'all':
+            if not PDFFile.objects.filter(workspace=workspace).exists():
+                return "There are no documents in this workspace."
+            
+            sections = digest_sections(workspace.id, intent)
+            if not sections:
+                return f"No {intent}s have been generated for the documents in this workspace."
+            
+            combined = get_fresh_digest(workspace.id, intent, sections)
+            current_trace().cache('digest', combined is not None)
+            if combined is not None:
+                print(f"[Digest] Serving stored combined {intent} for workspace {workspace.id}.")
+            else:
+                print(f"[Digest] Combined {intent} for workspace {workspace.id} is stale; combining live.")
+                try:
+                    with current_trace().stage('combine'):
+                        combined = call_with_timeout(
+                            deadline.budget(), LLM_BREAKER.call, _combine_sections, intent, [text for _, text in sections]
+                        )
+                except DeadlineExceeded:
+                    return _partial_digest(intent, sections, route_info)
+                except CircuitOpen:
+                    return _partial_digest(
+                        intent, sections, route_info,
+                        reason=f"The AI service is temporarily unavailable, so I can't combine the {intent}s right now.",
+                    )
+                if isinstance(combined, str) and combined:
+                    save_digest(workspace.id, intent, sections, combined)
+            route_info['cacheable'] = True
+            return combined
+
+        return "Please clarify which document you want summarized."
+            
+            
+    # --- Route 3: Comparison across documents ---
+    if intent == 'comparison':
+        documents = _comparison_documents(workspace, question, doc_name)
+        if documents:
+            return _answer_comparison(question, workspace, documents, route_info, deadline)
+        print("[Compare] Fewer than two documents to compare; answering as a pdf_question.")
+        intent = route_info['intent'] = 'pdf_question'
+        specific_doc_name = None
+
+    # --- Route 4: PDF Question (RAG) ---
+    doc_requested = bool(specific_doc_name)
+    requested_pdf = _validate_specific_pdf_request(workspace, specific_doc_name) if doc_requested else None
+
+    if doc_requested and not requested_pdf:
+        return "PDF not available"
+
+    if intent == 'pdf_question':
+        
+        if not workspace.index_path:
+            return "Error: This workspace is ready but its index path is missing."
+        try:
+            target_pdf, filter_kwargs = _rag_target(workspace, requested_pdf, specific_doc_name, question, route_info)
+
+            if ANSWER_CACHE.similarity_threshold:
+                similar_answer = _similar_cached_answer(workspace, route_info, _embed_query_for_cache(question))
+                if similar_answer is not None:
+                    return similar_answer
+
+            try:
+                relevant_docs = None
+                if speculation is not None:
+                    relevant_docs = speculation.result_for(filter_kwargs, timeout=deadline.budget(stage_budget('retrieve')))
+                if relevant_docs is None:
+                    relevant_docs = call_with_timeout(
+                        deadline.budget(stage_budget('retrieve')),
+                        _retrieve_chunks, workspace.index_path, question, k=5, filter_kwargs=filter_kwargs,
+                    )
+            except DeadlineExceeded as e:
+                print(f"[Deadline] Retrieval: {e}")
+                return _retrieval_timeout_message(route_info)
+            except CircuitOpen as e:
+                return _search_unavailable_message(route_info, e)
+            current_trace().set_chunks(relevant_docs)
+            
+            if not relevant_docs:
+                return _no_relevant_docs_message(target_pdf)
+
+            context = _rag_context(relevant_docs, route_info)
+            return _generate_answer(question, context, relevant_docs, route_info, deadline)
+        except EmbeddingModelMismatch as e:
+            print(f"[RAG] {e}")
+            return "This workspace was indexed with a different embedding model. Please re-index its documents."
+        except Exception as e:
+            print(f"Error in RAG part: {e}")
+            return "An internal error occurred."
+
+    return "Error: Workspace is in an unknown state."
+
+
+async def _astart_speculative_retrieval(workspace, question):
+    """Async speculative retrieval: returns (task, filter_kwargs) or None."""
+    if not getattr(settings, 'CHATBOT_SPECULATIVE_RETRIEVAL', False) or not workspace.index_path:
+        return None
+    try:
+        target_pdf = await sync_to_async(_resolve_target_pdf)(
+            workspace, _extract_doc_name_from_query(question), question
+        )
+    except Exception as e:
+        print(f"[Speculative] Could not start retrieval: {e}")
+        return None
+    filter_kwargs = {"pdf_id": target_pdf.id} if target_pdf else None
+    task = asyncio.ensure_future(_aretrieve_chunks(workspace.index_path, question, 5, filter_kwargs))
+    return task, filter_kwargs
+
+
+async def _aanswer_ready_workspace(question, workspace, route_info):
+    """
+    Async counterpart of _answer_ready_workspace. Classification, embedding and
+    generation are awaited; summary and off-topic routes, which mostly read
+    stored text, and comparisons, which fan out over the retrieval pool,
+    reuse the sync router on a thread.
+    """
+    deadline = route_info.get('deadline') or Deadline()
+    speculation = await _astart_speculative_retrieval(workspace, question)
+    try:
+        with current_trace().stage('classify'):
+            classification = await _aget_query_classification(
+                question, index_path=workspace.index_path, deadline=deadline
+            )
+        if classification.get('intent') != 'pdf_question':
+            return await sync_to_async(_route_ready_question)(
+                question, workspace, route_info, classification=classification
+            )
+
+        intent, doc_name, specific_doc_name = _read_classification(question, classification, route_info)
+        requested_pdf = None
+        if specific_doc_name:
+            requested_pdf = await sync_to_async(_validate_specific_pdf_request)(workspace, specific_doc_name)
+            if not requested_pdf:
+                return "PDF not available"
+
+        if not workspace.index_path:
+            return "Error: This workspace is ready but its index path is missing."
+        try:
+            target_pdf, filter_kwargs = await sync_to_async(_rag_target)(
+                workspace, requested_pdf, specific_doc_name, question, route_info
+            )
+
+            if ANSWER_CACHE.similarity_threshold:
+                similar_answer = _similar_cached_answer(workspace, route_info, await _aembed_query_for_cache(question))
+                if similar_answer is not None:
+                    return similar_answer
+
+            relevant_docs = None
+            try:
+                if speculation is not None and speculation[1] == filter_kwargs:
+                    task, speculation = speculation[0], None
+                    try:
+                        relevant_docs = await acall_with_timeout(deadline.budget(stage_budget('retrieve')), task)
+                        print(f"[Speculative] Using {len(relevant_docs)} chunks retrieved during classification.")
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        print(f"[Speculative] Retrieval failed ({e}); retrieving again.")
+                if relevant_docs is None:
+                    relevant_docs = await acall_with_timeout(
+                        deadline.budget(stage_budget('retrieve')),
+                        _aretrieve_chunks(workspace.index_path, question, k=5, filter_kwargs=filter_kwargs),
+                    )
+            except DeadlineExceeded as e:
+                print(f"[Deadline] Retrieval: {e}")
+                return _retrieval_timeout_message(route_info)
+            except CircuitOpen as e:
+                return _search_unavailable_message(route_info, e)
+            current_trace().set_chunks(relevant_docs)
+
+            if not relevant_docs:
+                return _no_relevant_docs_message(target_pdf)
+
+            context = _rag_context(relevant_docs, route_info)
+
+            if not QA_CHAIN or LLM is None:
+                return "Error: The chatbot LLM is not initialized."
+
+            generation_budget = _generation_budget(deadline)
+            if generation_budget == 0:
+                return _excerpt_answer(relevant_docs, route_info)
+
+            print(f"[RAG] Awaiting QA_CHAIN for question: {question[:100]}...")
+            try:
+                with current_trace().stage('generate'):
+                    answer = await acall_with_timeout(
+                        generation_budget,
+                        LLM_BREAKER.acall(HEDGERS['qa'].acall(QA_CHAIN.ainvoke, {"context": context, "question": question})),
+                    )
+                route_info['cacheable'] = bool(answer)
+                return answer
+            except DeadlineExceeded as e:
+                print(f"[Deadline] Generation: {e}")
+                return _excerpt_answer(relevant_docs, route_info)
+            except CircuitOpen as e:
+                return _unavailable_answer(relevant_docs, route_info, e)
+            except Exception as e:
+                print(f"[RAG] Error in QA_CHAIN.ainvoke: {e}")
+                return f"Error generating answer: {str(e)}"
+        except EmbeddingModelMismatch as e:
+            print(f"[RAG] {e}")
+            return "This workspace was indexed with a different embedding model. Please re-index its documents."
+        except Exception as e:
+            print(f"Error in RAG part: {e}")
+            return "An internal error occurred."
+    finally:
+        if speculation is not None:
+            speculation[0].cancel()
+            print(f"[Speculative] Discarded retrieval (intent={route_info.get('intent')}).")
+
+
+def _workspace_status_message(workspace):
+    """The reply for a workspace that is not READY, else None."""
     if workspace.processing_status == Workspace.ProcessingStatus.NONE:
         return "No documents have been processed..."
     if workspace.processing_status == Workspace.ProcessingStatus.PROCESSING:
         return "The chatbot is currently processing new documents..."
     if workspace.processing_status == Workspace.ProcessingStatus.FAILED:
         return "Processing failed for one or more documents..."
+    return None
+
+
+def _cache_answer(workspace, index_version, question, answer, route_info, started):
+    ANSWER_CACHE.set(
+        workspace.id,
+        index_version,
+        question,
+        answer,
+        target_pdf_id=route_info.get('target_pdf_id'),
+        vector=route_info.get('query_vector'),
+        elapsed=time.monotonic() - started,
+    )
+
+
+def _flight_key(workspace, index_version, question):
+    return (workspace.id, index_version, normalize_question(question))
+
+
+def _answer_and_cache(question, workspace, index_version, stream=False, user_id=None, deadline=None):
+    """
+    Run the READY-workspace pipeline once, inside a scheduler slot, and cache
+    a cacheable answer. A streamed answer holds its slot until the stream ends.
+    """
+    deadline = deadline or Deadline()
+    slot = SCHEDULER.acquire(workspace.id, user_id, timeout=deadline.budget(SCHEDULER.queue_timeout))
+    trace = current_trace()
+    trace.add_stage('queue', slot.waited)
+    try:
+        load_models()
+        started = time.monotonic()
+        route_info = {'index_version': index_version, 'cacheable': False, 'stream': stream, 'deadline': deadline}
+        answer = _answer_ready_workspace(question, workspace, route_info)
+    except BaseException:
+        slot.release()
+        raise
+    trace.note(route_info.get('intent'), route_info.get('partial'))
+    if isinstance(answer, StreamedAnswer):
+        answer.on_close(slot.release)
+    else:
+        slot.release()
+
+    if route_info['cacheable']:
+        if isinstance(answer, StreamedAnswer):
+            answer.on_complete(
+                lambda streamed: None if streamed.failed else _cache_answer(
+                    workspace, index_version, question, streamed.text, route_info, started
+                )
+            )
+        else:
+            _cache_answer(workspace, index_version, question, answer, route_info, started)
+    return answer
+
+
+async def _aanswer_and_cache(question, workspace, index_version, user_id=None, deadline=None):
+    deadline = deadline or Deadline()
+    with await SCHEDULER.aacquire(workspace.id, user_id, timeout=deadline.budget(SCHEDULER.queue_timeout)) as slot:
+        current_trace().add_stage('queue', slot.waited)
+        await _aload_models()
+        started = time.monotonic()
+        route_info = {'index_version': index_version, 'cacheable': False, 'deadline': deadline}
+        answer = await _aanswer_ready_workspace(question, workspace, route_info)
+    current_trace().note(route_info.get('intent'), route_info.get('partial'))
+    if route_info['cacheable']:
+        _cache_answer(workspace, index_version, question, answer, route_info, started)
+    return answer
+
+
+def get_chatbot_response(question, workspace_id, stream=False, user_id=None, timeout=None, memory=True):
+    """
+    Answer a question about a workspace's documents. With stream=True a RAG
+    answer is returned as a StreamedAnswer instead of a string.
+    With a `timeout` (seconds), every stage works within what is left of it
+    and a partial answer is returned when generation cannot finish in time.
+    With memory=False a follow-up is not rewritten against the chat history.
+    Raises SchedulerBusy when the pipeline cannot start within the queue deadline.
+    """
+    deadline = Deadline(timeout)
+
+    try:
+        workspace = Workspace.objects.get(id=workspace_id)
+    except Workspace.DoesNotExist:
+        return "Error: This workspace does not exist."
+
+    # --- 1. Handle Workspace Status (Unchanged) ---
+    status_message = _workspace_status_message(workspace)
+    if status_message:
+        return status_message
 
     # --- 2. Handle READY status (NEW ROUTER LOGIC) ---
     if workspace.processing_status == Workspace.ProcessingStatus.READY:
-        
-        # Step 1: Classify the user's intent
-        classification = _get_query_classification(question)
-        intent = classification.get('intent')
-        doc_name = classification.get('doc_name')
-        
-        print(f"Router: Intent='{intent}', DocName='{doc_name}'")
-        doc_hint = _extract_doc_name_from_query(question)
-        specific_doc_name = None
-        if doc_hint:
-            specific_doc_name = doc_hint
-        elif doc_name and doc_name not in ('all', 'none'):
-            specific_doc_name = doc_name
-
-        # --- Route 1: Off-Topic ---
-        if intent == 'off_topic':
-            return "I cannot find that information in the provided documents."
-
-        # --- Route 2: Summary or Abstract ---
-        if intent == 'summary' or intent == 'abstract':
-            if specific_doc_name:
-                try:
-                    requested_pdf = _validate_specific_pdf_request(workspace, specific_doc_name)
-                    if not requested_pdf:
-                        return "PDF not available"
-
-                    print(f"Best match for '{specific_doc_name}' is PDF: {requested_pdf.title}")
-
-                    content = requested_pdf.summary if intent == 'summary' else requested_pdf.abstract
-                    if not content or content == 'N/A' or content == SUMMARY_PLACEHOLDER:
-                        return f"A {intent} is not yet available for '{requested_pdf.title}'. Please try again shortly."
-
-                    return content
-
-                except Exception as e:
-                    print(f"Error finding specific doc: {e}")
-                    return "I had trouble finding that specific document."
-
-            if doc_name == 'all':
-                all_pdfs = PDFFile.objects.filter(workspace=workspace)
-                if not all_pdfs.exists():
-                    return "There are no documents in this workspace."
-                
-                all_content = []
-                for pdf in all_pdfs:
-                    content = pdf.summary if intent == 'summary' else pdf.abstract
-                    if content and content != 'N/A':
-                        all_content.append(f"Document: {pdf.title}\n\n{content}")
-                
-                if not all_content:
-                    return f"No {intent}s have been generated for the documents in this workspace."
-                
-                combined_text = "\n\n---\n\n".join(all_content)
-                combine_prompt = ChatPromptTemplate.from_template(f"Please create a single, cohesive {intent} based on the following individual document sections:\n\n{{text}}")
-                combine_chain = combine_prompt | LLM | PARSER
-                return combine_chain.invoke({"text": combined_text})
-
-            return "Please clarify which document you want summarized."
-                
-                
-        # --- Route 3: PDF Question (RAG) ---
-        doc_requested = bool(specific_doc_name)
-        requested_pdf = _validate_specific_pdf_request(workspace, specific_doc_name) if doc_requested else None
-
-        if doc_requested and not requested_pdf:
-            return "PDF not available"
-
-        if intent == 'pdf_question':
-            
-            if not workspace.index_path:
-                return "Error: This workspace is ready but its index path is missing."
-            try:
-                vectorstore = get_cached_vector_store(workspace.index_path)
-                target_pdf = requested_pdf or _resolve_target_pdf(workspace, specific_doc_name, question)
-                filter_kwargs = {"pdf_id": target_pdf.id} if target_pdf else None
-
-                if target_pdf:
-                    print(f"[RAG] Filtering context for PDF '{target_pdf.title}' (ID {target_pdf.id}).")
-
-                relevant_docs = vectorstore.similarity_search(question, k=5, filter=filter_kwargs)
-                
-                if not relevant_docs:
-                    if target_pdf:
-                        return f"I could not find relevant information within '{target_pdf.title}'. Please try another question."
-                    return "I could not find any relevant information about that in the workspace documents."
-
-                context_chunks = []
-                for chunk in relevant_docs:
-                    metadata = getattr(chunk, "metadata", {}) or {}
-                    source_label = metadata.get("pdf_title") or metadata.get("pdf_filename") or metadata.get("source") or "Unknown Document"
-                    context_chunks.append(f"[{source_label}] {chunk.page_content}")
-                context = "\n\n".join(context_chunks)
-                print(f"[RAG] Found {len(relevant_docs)} relevant chunks, context length: {len(context)} chars")
-
-                if not QA_CHAIN or LLM is None:
-                    return "Error: The chatbot LLM is not initialized."
-                
-                print(f"[RAG] Invoking QA_CHAIN with question: {question[:100]}...")
-                try:
-                    answer = QA_CHAIN.invoke({"context": context, "question": question})
-                    print(f"[RAG] QA_CHAIN completed, answer length: {len(answer) if answer else 0} chars")
-                    return answer
-                except Exception as e:
-                    print(f"[RAG] Error in QA_CHAIN.invoke: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return f"Error generating answer: {str(e)}"
-            except Exception as e:
-                print(f"Error in RAG part: {e}")
-                return "An internal error occurred."
-    
+        if memory:
+            question = _standalone_question(question, workspace, user_id, deadline)
+        index_version = workspace_index_version(workspace)
+        cached_answer = ANSWER_CACHE.get(workspace.id, index_version, question)
+        current_trace().cache('answer', cached_answer is not None)
+        if cached_answer is not None:
+            print(f"[AnswerCache] Hit for workspace {workspace.id}. Stats: {ANSWER_CACHE.stats()}")
+            return cached_answer
+
+        # A streamed answer belongs to one client, so only whole answers are shared.
+        if stream or not getattr(settings, 'CHATBOT_COALESCE_QUESTIONS', False):
+            return _answer_and_cache(question, workspace, index_version, stream, user_id, deadline)
+        ran = []
+
+        def answer():
+            ran.append(True)
+            return _answer_and_cache(question, workspace, index_version, stream, user_id, deadline)
+
+        try:
+            return QUESTION_FLIGHTS.do(_flight_key(workspace, index_version, question), answer, deadline.budget())
+        except DeadlineExceeded as e:
+            print(f"[SingleFlight] {e}")
+            current_trace().note(partial=True)
+            return _coalesced_timeout_message()
+        finally:
+            current_trace().cache('coalesced', not ran)
+
+    return "Error: Workspace is in an unknown state."
+
+
+def _preload_index(index_path, questions, label):
+    """
+    Load the index at `index_path` once and embed every question in one
+    provider call, so each search that follows finds its query vector in the
+    cache. Returns {index_path: vector store} for the searching threads to share.
+    """
+    load_models()
+    if not index_path or get_index_server_client() is not None:
+        # The index server keeps its own stores and embeds out of process.
+        return {}
+
+    embeddings = _query_embeddings()
+    if embeddings is not None:
+        try:
+            EMBEDDINGS_BREAKER.check()
+            embeddings.embed_queries(questions)
+            print(f"[{label}] Embedded {len(questions)} questions in one call.")
+        except Exception as e:
+            print(f"[{label}] Could not embed the questions up front: {e}")
+
+    try:
+        return {index_path: get_cached_vector_store(index_path)}
+    except Exception as e:
+        print(f"[{label}] Could not load the index up front: {e}")
+        return {}
+
+
+def _prepare_batch(workspace, questions):
+    """Load the workspace index and embed the batch's questions once (see _preload_index)."""
+    return _preload_index(workspace.index_path, questions, "Batch")
+
+
+def _answer_batch_question(question, workspace_id, user_id, timeout, trace):
+    try:
+        with activate(trace):
+            return get_chatbot_response(question, workspace_id, user_id=user_id, timeout=timeout, memory=False)
+    except SchedulerBusy as busy:
+        return str(busy)
+    except Exception as e:
+        print(f"[Batch] Error answering {question[:100]!r}: {e}")
+        return f"Error generating response: {str(e)}"
+
+
+_BATCH_EXECUTOR = None
+_BATCH_EXECUTOR_LOCK = threading.Lock()
+
+
+def _batch_executor():
+    global _BATCH_EXECUTOR
+    with _BATCH_EXECUTOR_LOCK:
+        if _BATCH_EXECUTOR is None:
+            _BATCH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_BATCH_POOL_WORKERS', 16),
+                thread_name_prefix="chatbot-batch",
+            )
+    return _BATCH_EXECUTOR
+
+
+def iter_batch_responses(questions, workspace_id, user_id=None, timeout=None, traces=None):
+    """
+    Answer several questions about one workspace, yielding (position, answer)
+    as each one completes. The index is loaded and the questions embedded
+    once; up to CHATBOT_BATCH_WORKERS answers are generated at a time, on a
+    pool of CHATBOT_BATCH_POOL_WORKERS threads shared by all batches, each
+    in its own scheduler slot and within its own `timeout`. Questions are
+    treated as standalone, without the chat memory.
+    """
+    workspace = Workspace.objects.filter(id=workspace_id).first()
+    status_message = "Error: This workspace does not exist." if workspace is None else _workspace_status_message(workspace)
+    if status_message:
+        for position in range(len(questions)):
+            yield position, status_message
+        return
+
+    stores = _prepare_batch(workspace, questions)
+    traces = traces or [None] * len(questions)
+    workers = max(1, min(len(questions), getattr(settings, 'CHATBOT_BATCH_WORKERS', 4)))
+    pending = enumerate(zip(questions, traces))
+    futures = {}
+
+    def submit_next():
+        for position, (question, trace) in pending:
+            context = contextvars.copy_context()
+            context.run(_BATCH_VECTOR_STORES.set, stores)
+            future = _batch_executor().submit(
+                context.run, _answer_batch_question, question, workspace.id, user_id, timeout, trace
+            )
+            futures[future] = position
+            return
+
+    for _ in range(workers):
+        submit_next()
+    try:
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                position = futures.pop(future)
+                submit_next()
+                yield position, future.result()
+    finally:
+        # A client that stops reading a streamed batch cancels the questions not yet started.
+        for future in futures:
+            future.cancel()
+
+
+def stream_chatbot_response(question, workspace_id, user_id=None, timeout=None):
+    """
+    Yield the answer to a question in pieces. RAG answers are forwarded token
+    by token; every other route (cached answers, summaries, errors) yields
+    its full text at once.
+    """
+    answer = get_chatbot_response(question, workspace_id, stream=True, user_id=user_id, timeout=timeout)
+    if isinstance(answer, StreamedAnswer):
+        yield from answer
+    else:
+        yield answer
+
+
+async def aget_chatbot_response(question, workspace_id, user_id=None, timeout=None):
+    """
+    Async counterpart of get_chatbot_response for the async view: LLM and
+    embedding calls are awaited, so one worker can serve many questions.
+    """
+    deadline = Deadline(timeout)
+    workspace = await Workspace.objects.filter(id=workspace_id).afirst()
+    if workspace is None:
+        return "Error: This workspace does not exist."
+
+    status_message = _workspace_status_message(workspace)
+    if status_message:
+        return status_message
+
+    if workspace.processing_status == Workspace.ProcessingStatus.READY:
+        question = await sync_to_async(_standalone_question)(question, workspace, user_id, deadline)
+        index_version = await sync_to_async(workspace_index_version)(workspace)
+        cached_answer = ANSWER_CACHE.get(workspace.id, index_version, question)
+        current_trace().cache('answer', cached_answer is not None)
+        if cached_answer is not None:
+            print(f"[AnswerCache] Hit for workspace {workspace.id}. Stats: {ANSWER_CACHE.stats()}")
+            return cached_answer
+
+        if not getattr(settings, 'CHATBOT_COALESCE_QUESTIONS', False):
+            return await _aanswer_and_cache(question, workspace, index_version, user_id, deadline)
+        ran = []
+
+        def answer():
+            ran.append(True)
+            return _aanswer_and_cache(question, workspace, index_version, user_id, deadline)
+
+        try:
+            return await QUESTION_FLIGHTS.ado(_flight_key(workspace, index_version, question), answer)
+        finally:
+            current_trace().cache('coalesced', not ran)
+
     return "Error: Workspace is in an unknown state."
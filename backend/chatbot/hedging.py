@@ -0,0 +1,204 @@
+"""
+Hedged LLM calls.
+
+Most Gemini calls finish quickly, but a few take many times longer and
+dominate the tail of chatbot latency. A Hedger watches the latency of one
+chain; when a call has not answered by the chain's CHATBOT_HEDGE_PERCENTILE
+latency it sends a duplicate and takes whichever finishes first. Each chain
+may hedge at most its budget (a fraction of its calls, from
+CHATBOT_HEDGE_BUDGETS) so an overloaded provider is not sent twice the load.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+# Chain names used in CHATBOT_HEDGE_BUDGETS ("qa:0.1,classifier:0.05").
+HEDGED_CHAINS = ('qa', 'classifier')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (pct in 0-100); None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Hedger:
+    """Hedging policy and latency/win metrics for one chain."""
+
+    def __init__(self, name, budget=0.0, pct=95.0, min_delay=0.5, min_samples=20, window=200):
+        self.name = name
+        self.budget = budget
+        self.pct = pct
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    # --- bookkeeping ---
+
+    def _record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or latencies are unknown."""
+        with self._lock:
+            if self.budget <= 0 or len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, percentile(self._latencies, self.pct))
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.calls:
+                self.over_budget += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def _record_winner(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+            print(f"[Hedge] {self.name}: the hedged request answered first.")
+
+    def _timed(self, fn, args, kwargs):
+        started = time.monotonic()
+        result = fn(*args, **kwargs)
+        self._record_latency(time.monotonic() - started)
+        return result
+
+    # --- public API ---
+
+    def call(self, fn, *args, **kwargs):
+        """Call `fn`, hedging with a second identical call if it is slower than the hedge delay."""
+        self._start_call()
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed(fn, args, kwargs)
+
+        primary = _executor().submit(contextvars.copy_context().run, self._timed, fn, args, kwargs)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._take_budget():
+            return primary.result()
+
+        print(f"[Hedge] {self.name}: no answer after {delay:.2f}s; sending a hedged request.")
+        hedge = _executor().submit(contextvars.copy_context().run, self._timed, fn, args, kwargs)
+        error = None
+        for future in concurrent.futures.as_completed([primary, hedge]):
+            if future.exception() is None:
+                # A running sync call cannot be interrupted; the loser's result is dropped.
+                (hedge if future is primary else primary).cancel()
+                self._record_winner(future is hedge)
+                return future.result()
+            error = future.exception()
+        raise error
+
+    async def acall(self, coroutine_fn, *args, **kwargs):
+        """Async call; the losing request is cancelled."""
+        self._start_call()
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._atimed(coroutine_fn, args, kwargs)
+
+        primary = asyncio.ensure_future(self._atimed(coroutine_fn, args, kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            if not self._take_budget():
+                return await primary
+
+            print(f"[Hedge] {self.name}: no answer after {delay:.2f}s; sending a hedged request.")
+            pending.add(asyncio.ensure_future(self._atimed(coroutine_fn, args, kwargs)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_winner(task is not primary)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _atimed(self, coroutine_fn, args, kwargs):
+        started = time.monotonic()
+        result = await coroutine_fn(*args, **kwargs)
+        self._record_latency(time.monotonic() - started)
+        return result
+
+    def stats(self):
+        hedge_after = self.hedge_delay()
+        with self._lock:
+            hedged = self.hedged
+            return {
+                'budget': self.budget,
+                'calls': self.calls,
+                'hedged': hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_win_rate': round(self.hedge_wins / hedged, 3) if hedged else None,
+                'over_budget': self.over_budget,
+                'p50_seconds': percentile(self._latencies, 50),
+                'hedge_after_seconds': hedge_after,
+            }
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHATBOT_HEDGE_WORKERS', 8),
+                thread_name_prefix="chatbot-hedge",
+            )
+    return _EXECUTOR
+
+
+def _hedgers():
+    budgets = {}
+    for item in (getattr(settings, 'CHATBOT_HEDGE_BUDGETS', '') or '').split(','):
+        name, _, budget = item.strip().partition(':')
+        try:
+            budgets[name] = min(1.0, max(0.0, float(budget)))
+        except ValueError:
+            continue
+    return {
+        name: Hedger(
+            name,
+            budget=budgets.get(name, 0.0),
+            pct=getattr(settings, 'CHATBOT_HEDGE_PERCENTILE', 95.0),
+            min_delay=getattr(settings, 'CHATBOT_HEDGE_MIN_DELAY', 0.5),
+        )
+        for name in HEDGED_CHAINS
+    }
+
+
+HEDGERS = _hedgers()
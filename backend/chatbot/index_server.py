@@ -0,0 +1,259 @@
+"""
+Optional standalone vector-search service.
+
+Every web worker normally loads its own copy of each workspace FAISS index.
+When CHATBOT_INDEX_SERVER_ADDRESS is set, workers send searches to a single
+`manage.py run_index_server` process instead. That process owns the indexes,
+batches the query embeddings of concurrent requests into one provider call,
+and answers over a Unix socket ("unix:/path/to.sock") or localhost TCP
+("127.0.0.1:8765"). Requests are newline-delimited JSON.
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+
+class IndexServerUnavailable(Exception):
+    """The index server could not answer; callers should search in-process."""
+
+
+def parse_address(address):
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _serialize_document(doc):
+    return {"page_content": doc.page_content, "metadata": dict(doc.metadata or {})}
+
+
+def _deserialize_document(data):
+    return Document(page_content=data["page_content"], metadata=data.get("metadata") or {})
+
+
+# --- Server side ---
+
+class IndexStore:
+    """Loads workspace indexes once and reloads them when index.faiss changes on disk."""
+
+    def __init__(self, loader=None, allowed_root=None):
+        self.loader = loader or _load_vectorstore
+        self.allowed_root = os.path.realpath(allowed_root or os.path.join(settings.MEDIA_ROOT, 'vector_indexes'))
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self, index_path):
+        real_path = os.path.realpath(index_path)
+        if os.path.commonpath([real_path, self.allowed_root]) != self.allowed_root:
+            raise ValueError(f"Index path outside of {self.allowed_root}: {index_path}")
+
+        try:
+            mtime = os.stat(os.path.join(real_path, "index.faiss")).st_mtime_ns
+        except OSError:
+            raise FileNotFoundError("Index path does not exist.")
+
+        with self._lock:
+            cached = self._stores.get(real_path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        vectorstore = self.loader(real_path)
+        with self._lock:
+            self._stores[real_path] = (mtime, vectorstore)
+        print(f"[IndexServer] Loaded index {real_path}")
+        return vectorstore
+
+
+def _load_vectorstore(index_path):
+    from .engine import get_cached_vector_store
+    return get_cached_vector_store(index_path)
+
+
+def _default_embeddings():
+    from .engine import _query_embeddings
+    return _query_embeddings()
+
+
+class SearchBatcher:
+    """
+    Collects searches arriving within `window` seconds of each other and
+    embeds all of their questions with one provider call before searching.
+    """
+
+    def __init__(self, store, embeddings_factory=None, window=0.005, max_batch=32):
+        self.store = store
+        self.embeddings_factory = embeddings_factory or _default_embeddings
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="index-search-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, index_path, query, k=5, filter=None):
+        future = Future()
+        self._queue.put((index_path, query, k, filter, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            embeddings = self.embeddings_factory()
+            if embeddings is None:
+                raise RuntimeError("Embedding model is not loaded.")
+            vectors = embeddings.embed_queries([item[1] for item in batch])
+        except Exception as e:
+            for item in batch:
+                item[4].set_exception(e)
+            return
+
+        if len(batch) > 1:
+            print(f"[IndexServer] Embedded {len(batch)} queries in one batch.")
+
+        for (index_path, _, k, filter_kwargs, future), vector in zip(batch, vectors):
+            try:
+                vectorstore = self.store.get(index_path)
+                future.set_result(vectorstore.similarity_search_by_vector(vector, k=k, filter=filter_kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get("op") == "ping":
+                    response = {"ok": True}
+                else:
+                    future = self.server.batcher.submit(
+                        request["index_path"],
+                        request["query"],
+                        k=int(request.get("k", 5)),
+                        filter=request.get("filter"),
+                    )
+                    docs = future.result(timeout=self.server.search_timeout)
+                    response = {"results": [_serialize_document(doc) for doc in docs]}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def create_server(address, batcher, search_timeout=30):
+    family, bind_address = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind_address):
+            os.remove(bind_address)
+        server = _ThreadingUnixServer(bind_address, _RequestHandler)
+    else:
+        server = _ThreadingTCPServer(bind_address, _RequestHandler)
+    server.batcher = batcher
+    server.search_timeout = search_timeout
+    return server
+
+
+# --- Client side ---
+
+class IndexServerClient:
+    """
+    Talks to the index server. After a connection failure the server is
+    skipped for `retry_after` seconds so workers do not pay a connect
+    attempt on every question while it is down.
+    """
+
+    def __init__(self, address, timeout=10, connect_timeout=0.25, retry_after=30):
+        self.address = address
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    def _request(self, payload):
+        if time.monotonic() < self._down_until:
+            raise IndexServerUnavailable("Index server marked down.")
+
+        family, target = parse_address(self.address)
+        try:
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.connect_timeout)
+                sock.connect(target)
+                sock.settimeout(self.timeout)
+                sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+                with sock.makefile("rb") as reader:
+                    line = reader.readline()
+        except OSError as e:
+            self._down_until = time.monotonic() + self.retry_after
+            raise IndexServerUnavailable(f"Index server at {self.address} unreachable: {e}")
+
+        if not line:
+            raise IndexServerUnavailable("Index server closed the connection.")
+        response = json.loads(line)
+        if "error" in response:
+            raise IndexServerUnavailable(f"Index server error: {response['error']}")
+        return response
+
+    def ping(self):
+        return self._request({"op": "ping"}).get("ok", False)
+
+    def search(self, index_path, query, k=5, filter=None):
+        response = self._request({
+            "op": "search",
+            "index_path": index_path,
+            "query": query,
+            "k": k,
+            "filter": filter,
+        })
+        return [_deserialize_document(item) for item in response["results"]]
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_index_server_client():
+    """Shared client, or None when no index server is configured."""
+    global _CLIENT
+    address = getattr(settings, 'CHATBOT_INDEX_SERVER_ADDRESS', '')
+    if not address:
+        return None
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT.address != address:
+            _CLIENT = IndexServerClient(
+                address,
+                timeout=getattr(settings, 'CHATBOT_INDEX_SERVER_TIMEOUT', 10),
+            )
+        return _CLIENT
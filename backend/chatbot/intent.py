@@ -0,0 +1,136 @@
+"""
+Local fast-path intent router.
+
+Most chatbot questions are plain Q&A or obvious summary requests, so a full
+Gemini round trip just to pick between summary, abstract, pdf_question,
+comparison and off_topic is usually wasted. `classify_locally` scores keyword and regex
+features and returns a confidence; the engine only consults the classifier
+LLM when that confidence is below CHATBOT_INTENT_CONFIDENCE_THRESHOLD.
+"""
+import re
+import threading
+
+SUMMARY_TERMS = re.compile(r"\b(?:summary|summaries|summari[sz]e|summari[sz]ing|overview|tl;?dr|gist|recap)\b", re.IGNORECASE)
+ABSTRACT_TERMS = re.compile(r"\babstracts?\b", re.IGNORECASE)
+BRIEF_TERMS = re.compile(r"\b(?:in short|briefly|short version|key points|main points)\b", re.IGNORECASE)
+QUESTION_TERMS = re.compile(
+    r"^\s*(?:what|how|why|which|who|whom|whose|when|where|is|are|does|do|did|can|could|should|would|explain|describe|define|list|compare|give me the|tell me about)\b",
+    re.IGNORECASE,
+)
+DOCUMENT_REFERENCE = re.compile(
+    r"\b(?:pdfs?|papers?|documents?|docs?|files?|articles?|study|studies|authors?|sections?|figures?|tables?|equations?|experiments?|results?|methods?|methodology|dataset|this work)\b",
+    re.IGNORECASE,
+)
+ALL_DOCUMENTS = re.compile(r"\b(?:all|both|every|each|these|those)\b(?:\s+\w+){0,2}\s+(?:pdfs?|papers?|documents?|docs?|files?)\b", re.IGNORECASE)
+EXPLICIT_DOCUMENT = re.compile(r'\b(?:pdf|paper|document|doc|file)\s*#?\d+\b|["“].+?["”]', re.IGNORECASE)
+COMPARE_TERMS = re.compile(
+    r"\b(?:compare|compared|comparing|comparison|contrast|differ|differs|difference|differences|similarities|versus|vs\.?)\b",
+    re.IGNORECASE,
+)
+OFF_TOPIC_TERMS = re.compile(
+    r"\b(?:weather|capital of|joke|recipe|stock price|football|cricket score|movie|song|lyrics|horoscope|president of|translate|write (?:me )?a (?:poem|story|song))\b",
+    re.IGNORECASE,
+)
+
+
+def _score_summary(question, doc_hint, refers_to_documents, word_count):
+    score = 0.0
+    if SUMMARY_TERMS.search(question) or BRIEF_TERMS.search(question):
+        score = 0.6
+        if doc_hint or refers_to_documents:
+            score += 0.25
+        if word_count <= 12:
+            score += 0.1
+    return score
+
+
+def classify_locally(question, doc_hint=None, corpus_coverage=0.0):
+    """
+    Return {'intent', 'doc_name', 'confidence'} from local features only.
+
+    `doc_hint` is the document name extracted by SUMMARY_HINT_PATTERN, and
+    `corpus_coverage` the fraction of question terms found in the workspace's
+    keyword index (strong evidence the question is about the documents).
+    """
+    text = question or ""
+    word_count = len(text.split())
+    refers_to_documents = bool(DOCUMENT_REFERENCE.search(text))
+    all_documents = bool(ALL_DOCUMENTS.search(text))
+
+    summary_score = _score_summary(text, doc_hint, refers_to_documents or all_documents, word_count)
+    abstract_score = 0.0
+    if ABSTRACT_TERMS.search(text):
+        abstract_score = 0.7 + (0.2 if (doc_hint or refers_to_documents) else 0.0)
+        if summary_score:
+            # Asking for both a summary and an abstract is for the LLM to untangle.
+            summary_score = abstract_score = 0.5
+
+    question_score = 0.0
+    if QUESTION_TERMS.search(text) or text.rstrip().endswith("?"):
+        question_score = 0.5
+    if refers_to_documents:
+        question_score += 0.2
+    question_score += 0.4 * corpus_coverage
+    if summary_score or abstract_score:
+        question_score -= 0.3
+
+    off_topic = bool(OFF_TOPIC_TERMS.search(text))
+    if off_topic:
+        question_score -= 0.5
+        summary_score -= 0.5
+        abstract_score -= 0.5
+
+    # Comparing documents: the engine resolves which ones from the question itself.
+    named_documents = len(EXPLICIT_DOCUMENT.findall(text))
+    comparison_score = 0.0
+    if COMPARE_TERMS.search(text) and (named_documents >= 2 or all_documents):
+        comparison_score = 0.9
+    elif COMPARE_TERMS.search(text) and refers_to_documents:
+        comparison_score = 0.6
+
+    scores = {
+        'summary': summary_score,
+        'abstract': abstract_score,
+        'pdf_question': question_score,
+        'comparison': comparison_score,
+    }
+    intent = max(scores, key=scores.get)
+    confidence = max(0.0, min(scores[intent], 0.99))
+
+    # A specific document named without a recognizable hint needs the LLM to extract it.
+    if EXPLICIT_DOCUMENT.search(text) and not doc_hint and intent != 'comparison':
+        confidence = min(confidence, 0.6)
+
+    return {'intent': intent, 'doc_name': doc_hint or 'all', 'confidence': round(confidence, 3)}
+
+
+class RouterStats:
+    """Counts how many classifications were decided locally versus by the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.llm = 0
+
+    def record(self, used_llm):
+        with self._lock:
+            if used_llm:
+                self.llm += 1
+            else:
+                self.local += 1
+
+    def summary(self):
+        total = self.local + self.llm
+        ratio = (self.local / total) if total else 0.0
+        return f"Classifier LLM calls avoided: {self.local}/{total} ({ratio:.0%})"
+
+    def as_dict(self):
+        total = self.local + self.llm
+        return {
+            'local': self.local,
+            'llm': self.llm,
+            'avoided_ratio': (self.local / total) if total else 0.0,
+        }
+
+
+ROUTER_STATS = RouterStats()
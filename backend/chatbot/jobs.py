@@ -0,0 +1,101 @@
+"""
+Background answering for chatbot questions.
+
+`POST /api/chatbot/ask/` with `"mode": "job"` saves the question, creates a
+ChatJob and returns its id right away, so a long answer does not hold an
+HTTP connection open past proxy timeouts. The `process_tasks` worker runs
+the engine (run_job) and pushes the finished job to the user's
+ChatbotJobConsumer group (`ws/chatbot/jobs/`) as a "chatbot_answer" event.
+Clients that miss the push poll `GET /api/chatbot/jobs/<id>/`.
+"""
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from .consumer import job_group
+from .engine import get_chatbot_response
+from .models import AIChatMessage, ChatJob
+from .scheduler import SchedulerBusy
+from .telemetry import activate, save_trace, start_trace
+
+
+def job_payload(job):
+    """What the push event and the polling endpoint report for a job."""
+    payload = {
+        'type': 'chatbot_answer',
+        'job_id': str(job.id),
+        'workspace_id': job.workspace_id,
+        'status': job.status,
+        'user_question': job.question_message.message if job.question_message else job.prompt,
+    }
+    if job.answer_message:
+        payload['ai_answer'] = job.answer_message.message
+    if job.error:
+        payload['error'] = job.error
+    return payload
+
+
+def push_job(job):
+    """Send a finished job to the user's open chatbot job sockets."""
+    try:
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            job_group(job.user_id),
+            {
+                "type": "chatbot_job",
+                "data": job_payload(job),
+            },
+        )
+    except Exception as e:
+        # Delivery is best effort; the client can still poll for the answer.
+        print(f"[ChatJob] Could not push job {job.id}: {e}")
+
+
+def run_job(job_id):
+    """
+    Answer a queued job. Returns the seconds after which to retry when the
+    chatbot scheduler is busy, otherwise None.
+    """
+    job = ChatJob.objects.select_related('workspace', 'user', 'question_message').filter(id=job_id).first()
+    if job is None or job.status not in (ChatJob.Status.QUEUED, ChatJob.Status.RUNNING):
+        print(f"[ChatJob] Job {job_id} not found or already finished")
+        return None
+
+    job.status = ChatJob.Status.RUNNING
+    job.save(update_fields=['status'])
+    trace = start_trace('job')
+    try:
+        with activate(trace):
+            answer = get_chatbot_response(
+                job.prompt, job.workspace_id, user_id=job.user_id, timeout=settings.CHATBOT_JOB_TIMEOUT
+            )
+        job.status = ChatJob.Status.DONE
+    except SchedulerBusy as busy:
+        print(f"[ChatJob] Scheduler busy; retrying job {job.id} in {busy.retry_after}s")
+        job.status = ChatJob.Status.QUEUED
+        job.save(update_fields=['status'])
+        return busy.retry_after
+    except Exception as e:
+        answer = f"Error generating response: {str(e)}"
+        print(f"[ChatJob] Error answering job {job.id}: {e}")
+        traceback.print_exc()
+        job.status = ChatJob.Status.FAILED
+        job.error = str(e)
+
+    job.answer_message = AIChatMessage.objects.create(
+        user=job.user,
+        workspace=job.workspace,
+        message=answer,
+        is_from_bot=True
+    )
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'answer_message', 'finished_at'])
+    save_trace(trace, job.workspace, job.user, job.question_message, job.answer_message)
+    push_job(job)
+    return None
@@ -0,0 +1,218 @@
+"""
+Per-workspace BM25 keyword index, stored next to the FAISS index.
+
+Keyword-heavy questions (author names, equation labels, acronyms) are often
+answered better by exact term matches than by embeddings. The index is built
+during ingestion; workspaces indexed before it existed get theirs on their
+next upload or from the backfill_lexical_indexes command. At question time
+the engine fuses BM25 and vector results and skips the embedding call
+entirely when the keyword match is decisive.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+from .caching import TTLCache
+
+LEXICAL_INDEX_FILENAME = "lexical_index.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be by can does for from give how i in is it its me of on or paper
+pdf please tell that the their there these this to was what when where which who why with you
+""".split())
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """An inverted index with BM25 scoring over workspace chunks."""
+
+    def __init__(self):
+        self.documents = []
+        self.doc_lengths = []
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_documents(self, documents):
+        for doc in documents:
+            doc_id = len(self.documents)
+            terms = Counter(tokenize(doc.page_content))
+            self.documents.append({"page_content": doc.page_content, "metadata": dict(doc.metadata or {})})
+            self.doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+
+    def term_coverage(self, text):
+        """Fraction of the distinct terms in `text` that occur anywhere in the index."""
+        terms = set(tokenize(text))
+        if not terms:
+            return 0.0
+        return sum(1 for term in terms if term in self.postings) / len(terms)
+
+    def search(self, query, k=5, filter=None):
+        """Return up to k (Document, score) pairs, best first, plus the number of query terms matched by the top hit."""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or not self.documents:
+            return [], 0
+
+        total_docs = len(self.documents)
+        avg_length = (sum(self.doc_lengths) / total_docs) or 1.0
+        scores = Counter()
+        matched_terms = {}
+
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                if filter and not self._matches(doc_id, filter):
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length
+                scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                matched_terms[doc_id] = matched_terms.get(doc_id, 0) + 1
+
+        ranked = scores.most_common(k)
+        results = [(self._document(doc_id), score) for doc_id, score in ranked]
+        top_coverage = (matched_terms[ranked[0][0]] / len(query_terms)) if ranked else 0
+        return results, top_coverage
+
+    def _matches(self, doc_id, filter):
+        metadata = self.documents[doc_id]["metadata"]
+        return all(metadata.get(key) == value for key, value in filter.items())
+
+    def _document(self, doc_id):
+        data = self.documents[doc_id]
+        return Document(page_content=data["page_content"], metadata=dict(data["metadata"]))
+
+    def save(self, index_path):
+        payload = {
+            "documents": self.documents,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        target = os.path.join(index_path, LEXICAL_INDEX_FILENAME)
+        temp_target = f"{target}.tmp"
+        with open(temp_target, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, default=str)
+        os.replace(temp_target, target)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(os.path.join(index_path, LEXICAL_INDEX_FILENAME), encoding="utf-8") as handle:
+            payload = json.load(handle)
+        index = cls()
+        index.documents = payload["documents"]
+        index.doc_lengths = payload["doc_lengths"]
+        index.postings = {term: [tuple(entry) for entry in entries] for term, entries in payload["postings"].items()}
+        return index
+
+
+_LOADED_INDEXES = TTLCache(maxsize=64, ttl=3600)
+
+
+def load_lexical_index(index_path):
+    """Worker-level cached load; returns None when the workspace has no lexical index."""
+    path = os.path.join(index_path, LEXICAL_INDEX_FILENAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    key = (index_path, mtime)
+    index = _LOADED_INDEXES.get(key)
+    if index is None:
+        index = LexicalIndex.load(index_path)
+        _LOADED_INDEXES.set(key, index)
+    return index
+
+
+def stored_documents(vectorstore):
+    """
+    Every chunk held by a FAISS vector store, in index order. Chunks indexed
+    without a chunk_id get their docstore id, which vector search reports too.
+    """
+    documents = []
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(doc_id)
+        if "chunk_id" not in (doc.metadata or {}):
+            doc = Document(page_content=doc.page_content, metadata={**(doc.metadata or {}), "chunk_id": doc_id})
+        documents.append(doc)
+    return documents
+
+
+def rebuild_lexical_index(index_path, documents):
+    """Replace the workspace's lexical index with one built from `documents`."""
+    index = LexicalIndex()
+    index.add_documents(documents)
+    index.save(index_path)
+    return index
+
+
+def update_lexical_index(index_path, chunks, had_existing_index, vectorstore=None):
+    """
+    Add freshly ingested chunks to the workspace's lexical index. An index
+    that predates lexical indexing gets a full keyword index built from the
+    chunks stored in `vectorstore` (which already holds the new ones); without
+    the store it is left without one rather than getting a partial keyword
+    index that would skew BM25 statistics.
+    """
+    existing = os.path.exists(os.path.join(index_path, LEXICAL_INDEX_FILENAME))
+    if had_existing_index and not existing:
+        if vectorstore is None:
+            print(f"[Lexical] {index_path} has no keyword index yet; run backfill_lexical_indexes to build it.")
+            return None
+        print(f"[Lexical] {index_path} has no keyword index yet; building it from the vector store.")
+        return rebuild_lexical_index(index_path, stored_documents(vectorstore))
+
+    index = LexicalIndex.load(index_path) if existing else LexicalIndex()
+    index.add_documents(chunks)
+    index.save(index_path)
+    return index
+
+
+def is_decisive(results, coverage):
+    """
+    True when the keyword match alone is trustworthy: the best chunk matches
+    every query term, scores high, and clearly beats the runner-up.
+    """
+    if not results or coverage < 1.0:
+        return False
+    top_score = results[0][1]
+    if top_score < getattr(settings, 'CHATBOT_LEXICAL_DECISIVE_SCORE', 8.0):
+        return False
+    if len(results) > 1 and top_score < getattr(settings, 'CHATBOT_LEXICAL_DECISIVE_MARGIN', 1.5) * results[1][1]:
+        return False
+    return True
+
+
+def _document_key(doc):
+    metadata = doc.metadata or {}
+    return (metadata.get("pdf_id"), metadata.get("page"), doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists, k=5, rank_constant=60):
+    """Merge ranked document lists; documents found by several retrievers rise to the top."""
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = _document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rank_constant + rank + 1)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
@@ -0,0 +1,200 @@
+"""
+Chat models per chain, and per-chain latency and token usage.
+
+Each chain (classifier, qa, summary, abstract, combine, memory) reads its model,
+temperature and client timeout from CHATBOT_CHAIN_LLMS, so routing and
+abstract extraction can run on a cheaper, faster model than answers.
+Chains with the same configuration share one client. Every model call is
+timed and its token usage recorded in CHAIN_METRICS.
+"""
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+from django.conf import settings
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .deadlines import call_time_left
+from .hedging import percentile
+from .telemetry import current_trace
+
+CHAINS = ('classifier', 'qa', 'summary', 'abstract', 'combine', 'memory')
+
+
+def default_config():
+    return {
+        'model': getattr(settings, 'CHATBOT_LLM_MODEL', 'gemini-flash-latest'),
+        'temperature': getattr(settings, 'CHATBOT_LLM_TEMPERATURE', 0.2),
+        'timeout': getattr(settings, 'CHATBOT_LLM_TIMEOUT', 30.0),
+    }
+
+
+def chain_config(chain):
+    """The model settings for `chain`, falling back to the defaults."""
+    config = default_config()
+    config.update(getattr(settings, 'CHATBOT_CHAIN_LLMS', {}).get(chain) or {})
+    return config
+
+
+def config_key(config):
+    return (config['model'], config['temperature'], config['timeout'])
+
+
+def _with_call_timeout(kwargs):
+    """Request kwargs bounded by what is left of the caller's deadline."""
+    time_left = call_time_left()
+    if time_left is None or 'timeout' in kwargs:
+        return kwargs
+    # Never below a tenth of a second: the client treats 0 as "no timeout".
+    return {**kwargs, 'timeout': max(0.1, time_left)}
+
+
+_CHAT_MODEL_CLASS = None
+
+
+def _chat_model_class():
+    """
+    ChatGoogleGenerativeAI whose requests time out when the deadlines
+    call_with_timeout call they run under does, so an abandoned call stops
+    instead of holding its thread until the client's own timeout.
+    """
+    global _CHAT_MODEL_CLASS
+    if _CHAT_MODEL_CLASS is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        class DeadlineBoundChatModel(ChatGoogleGenerativeAI):
+            def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+                return super()._generate(messages, stop=stop, run_manager=run_manager, **_with_call_timeout(kwargs))
+
+            def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+                return super()._stream(messages, stop=stop, run_manager=run_manager, **_with_call_timeout(kwargs))
+
+        _CHAT_MODEL_CLASS = DeadlineBoundChatModel
+    return _CHAT_MODEL_CLASS
+
+
+def build_chat_model(config):
+    """A Gemini chat client for `config`, or None if it cannot be built."""
+    try:
+        print(f"Loading Chat LLM ({config['model']}, temperature={config['temperature']})...")
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not google_api_key:
+            print("[ERROR] GOOGLE_API_KEY environment variable is not set!")
+            return None
+        llm = _chat_model_class()(
+            model=config['model'],
+            google_api_key=google_api_key,
+            temperature=config['temperature'],
+            timeout=config['timeout'],
+        )
+        print("[OK] Google Chat LLM Loaded.")
+        return llm
+    except Exception as e:
+        print(f"[ERROR] Error loading Google Chat LLM: {e}")
+        traceback.print_exc()
+        return None
+
+
+class ChainMetrics:
+    """Latency, error and token totals per chain, with a window of recent latencies."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, chain):
+        entry = self._chains.get(chain)
+        if entry is None:
+            entry = self._chains[chain] = {
+                'calls': 0,
+                'errors': 0,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'latencies': deque(maxlen=self.window),
+            }
+        return entry
+
+    def record(self, chain, seconds, input_tokens=0, output_tokens=0, error=False):
+        with self._lock:
+            entry = self._entry(chain)
+            entry['calls'] += 1
+            entry['latencies'].append(seconds)
+            if error:
+                entry['errors'] += 1
+            entry['input_tokens'] += input_tokens
+            entry['output_tokens'] += output_tokens
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                chain: {
+                    'model': chain_config(chain)['model'],
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'p50_seconds': percentile(entry['latencies'], 50),
+                    'p95_seconds': percentile(entry['latencies'], 95),
+                    'input_tokens': entry['input_tokens'],
+                    'output_tokens': entry['output_tokens'],
+                    'avg_output_tokens': round(entry['output_tokens'] / entry['calls'], 1) if entry['calls'] else 0,
+                }
+                for chain, entry in self._chains.items()
+            }
+
+
+CHAIN_METRICS = ChainMetrics()
+
+
+def token_usage(response):
+    """(input_tokens, output_tokens) reported for an LLMResult."""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+            input_tokens += usage.get('input_tokens', 0)
+            output_tokens += usage.get('output_tokens', 0)
+    if not input_tokens and not output_tokens:
+        usage = (response.llm_output or {}).get('usage_metadata') or {}
+        input_tokens = usage.get('prompt_token_count', 0)
+        output_tokens = usage.get('candidates_token_count', 0)
+    return input_tokens, output_tokens
+
+
+class ChainMetricsHandler(BaseCallbackHandler):
+    """LangChain callback that reports each model call of one chain to CHAIN_METRICS and the request trace."""
+
+    def __init__(self, chain, metrics=None):
+        self.chain = chain
+        self.metrics = metrics or CHAIN_METRICS
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.monotonic()
+
+    def _elapsed(self, run_id):
+        started = self._started.pop(run_id, None)
+        return 0.0 if started is None else time.monotonic() - started
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens, output_tokens = token_usage(response)
+        self.metrics.record(self.chain, self._elapsed(run_id), input_tokens, output_tokens)
+        current_trace().add_tokens(self.chain, input_tokens, output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.metrics.record(self.chain, self._elapsed(run_id), error=True)
+
+
+def metered(llm, chain):
+    """`llm` reporting its calls under `chain`; None stays None."""
+    if llm is None:
+        return None
+    return llm.with_config(callbacks=[ChainMetricsHandler(chain)], tags=[f"chain:{chain}"])
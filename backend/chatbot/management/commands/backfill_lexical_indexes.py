@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from chatbot.engine import backfill_lexical_index
+from chatbot.lexical import LEXICAL_INDEX_FILENAME
+from workspaces.models import Workspace
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the BM25 keyword index for workspaces whose FAISS index predates "
+        "lexical indexing, from the chunks already stored in the FAISS index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workspace', type=int, action='append', help='Only this workspace id (repeatable).')
+        parser.add_argument('--force', action='store_true', help='Rebuild keyword indexes that already exist.')
+
+    def handle(self, *args, **options):
+        workspaces = Workspace.objects.filter(processing_status=Workspace.ProcessingStatus.READY).exclude(index_path='')
+        if options['workspace']:
+            workspaces = workspaces.filter(id__in=options['workspace'])
+
+        built = 0
+        for workspace in workspaces.exclude(index_path__isnull=True).order_by('id'):
+            if not os.path.exists(os.path.join(workspace.index_path, "index.faiss")):
+                continue
+            if not options['force'] and os.path.exists(os.path.join(workspace.index_path, LEXICAL_INDEX_FILENAME)):
+                continue
+            try:
+                chunks = backfill_lexical_index(workspace)
+            except Exception as e:
+                self.stderr.write(f"Workspace {workspace.id}: keyword index not built: {e}")
+                continue
+            built += 1
+            self.stdout.write(f"Workspace {workspace.id}: indexed {chunks} chunks.")
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} keyword index(es)."))
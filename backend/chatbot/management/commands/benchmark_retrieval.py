@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.benchmark import INDEX_CONFIGS, compare_to_baseline, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark workspace retrieval (build/load time, query p50/p95/p99, recall@k) "
+        "on synthetic workspaces with deterministic offline embeddings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000',
+            help='Comma-separated chunk counts, e.g. 1000,10000,100000,1000000.',
+        )
+        parser.add_argument(
+            '--configs',
+            default=','.join(INDEX_CONFIGS),
+            help=f"Comma-separated index configurations. Available: {', '.join(INDEX_CONFIGS)}.",
+        )
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--dimension', type=int, default=384)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--baseline', help='Previous JSON report; exit with an error on regressions.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers.')
+        configs = [config.strip() for config in options['configs'].split(',') if config.strip()]
+        unknown = set(configs) - set(INDEX_CONFIGS)
+        if unknown:
+            raise CommandError(f"Unknown configurations: {', '.join(sorted(unknown))}")
+
+        report = run_benchmark(
+            sizes,
+            configs=configs,
+            k=options['k'],
+            num_queries=options['queries'],
+            dimension=options['dimension'],
+            seed=options['seed'],
+        )
+        payload = json.dumps(report, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+            regressions = compare_to_baseline(report, baseline)
+            if regressions:
+                raise CommandError("Retrieval regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
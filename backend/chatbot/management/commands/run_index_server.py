@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.index_server import IndexStore, SearchBatcher, create_server
+
+
+class Command(BaseCommand):
+    help = "Run the shared vector-search server used by the chatbot web workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            default=getattr(settings, 'CHATBOT_INDEX_SERVER_ADDRESS', '') or 'unix:/tmp/genscholar-index.sock',
+            help='"unix:/path/to.sock" or "host:port". Defaults to CHATBOT_INDEX_SERVER_ADDRESS.',
+        )
+        parser.add_argument(
+            '--batch-window-ms',
+            type=float,
+            default=5.0,
+            help='How long to wait for concurrent queries to batch together.',
+        )
+        parser.add_argument('--max-batch', type=int, default=32)
+
+    def handle(self, *args, **options):
+        address = options['address']
+        batcher = SearchBatcher(
+            IndexStore(),
+            window=options['batch_window_ms'] / 1000.0,
+            max_batch=options['max_batch'],
+        )
+        try:
+            server = create_server(address, batcher)
+        except OSError as e:
+            raise CommandError(f"Could not bind index server to {address}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Index server listening on {address}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Shutting down index server.")
+        finally:
+            server.server_close()
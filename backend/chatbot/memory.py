@@ -0,0 +1,177 @@
+"""
+Bounded conversational memory for the private AI chat.
+
+A follow-up such as "and in the second paper?" only makes sense next to the
+previous turns. For each (user, workspace) a ConversationMemory holds the
+last CHATBOT_MEMORY_RECENT_TURNS question/answer pairs (clipped) and a
+rolling summary of everything older (at most CHATBOT_MEMORY_SUMMARY_CHARS).
+It is brought up to date from every AIChatMessage row newer than the last
+one it has seen, read a page at a time; when the recent turns overflow, the older half is folded
+into the summary in one call. So the memory, and the prompt it goes into,
+stays the same size however long the chat runs.
+
+The engine uses it to rewrite follow-ups into standalone questions before
+routing, so classification, retrieval and the answer cache all work on a
+self-contained question.
+"""
+import re
+
+from django.conf import settings
+
+from .caching import TTLCache
+from .models import AIChatMessage
+
+# Elliptical openers that continue the previous turn ("and in pdf2?", "what about the baseline?").
+FOLLOW_UP_OPENERS = re.compile(
+    r"^\s*(?:and|but|also|or|so|then|what about|how about|what else|why not|how come)\b",
+    re.IGNORECASE,
+)
+# Question words that make a very short question elliptical ("why?", "which one?").
+SHORT_FOLLOW_UP_OPENERS = re.compile(r"^\s*(?:why|how|which|what|where|when|who)\b", re.IGNORECASE)
+SHORT_FOLLOW_UP_WORDS = 4
+# Pronouns and phrases that point back at something named earlier.
+ANAPHORS = re.compile(
+    r"\b(?:it|its|they|them|their|theirs|he|she|his|her|former|latter|"
+    r"(?:first|second|third|last|other|same|previous|above) ones?|"
+    r"(?:the )?(?:same|previous|above) (?:paper|pdf|document|doc|study|method|model|result)s?)\b",
+    re.IGNORECASE,
+)
+# A demonstrative standing alone ("explain that", "what does this mean?")
+# rather than pointing at a noun in the question ("this paper").
+BARE_DEMONSTRATIVE = re.compile(
+    r"\b(?:this|that|these|those)\b(?=\s*(?:[?.!,;]|$|(?:is|was|are|were|does|do|did|mean|means|one|ones)\b))",
+    re.IGNORECASE,
+)
+# A noun phrase or document name before a pronoun it can refer to ("the model ... it").
+REFERENT = re.compile(
+    r"\b(?:the|a|an|this|that|these|those|each|every|both|all|its|their)\s+\w+|\bpdf\s*\d+\b",
+    re.IGNORECASE,
+)
+TURN_CHARS = 600
+
+
+def looks_like_follow_up(question):
+    """
+    Whether `question` probably depends on the conversation so far: it opens
+    elliptically, is a bare short question, or uses a pronoun or demonstrative
+    with nothing in the question itself to refer to.
+    """
+    text = question or ''
+    if FOLLOW_UP_OPENERS.search(text):
+        return True
+    if len(text.split()) <= SHORT_FOLLOW_UP_WORDS and SHORT_FOLLOW_UP_OPENERS.search(text):
+        return True
+    if BARE_DEMONSTRATIVE.search(text):
+        return True
+    anaphor = ANAPHORS.search(text)
+    return bool(anaphor) and not REFERENT.search(text, 0, anaphor.start())
+
+
+def _clip(text, limit):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+
+def recent_turns_limit():
+    return max(1, getattr(settings, 'CHATBOT_MEMORY_RECENT_TURNS', 4))
+
+
+def summary_chars():
+    return getattr(settings, 'CHATBOT_MEMORY_SUMMARY_CHARS', 1200)
+
+
+def format_turns(turns):
+    return '\n'.join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+class ConversationMemory:
+    """A rolling summary plus the most recent (question, answer) turns. Treated as immutable."""
+
+    def __init__(self, summary='', turns=(), last_message_id=0):
+        self.summary = summary
+        self.turns = tuple(turns)
+        self.last_message_id = last_message_id
+
+    def is_empty(self):
+        return not self.summary and not self.turns
+
+    def text(self):
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}")
+        if self.turns:
+            parts.append(format_turns(self.turns))
+        return '\n\n'.join(parts)
+
+
+MEMORY_CACHE = TTLCache(
+    maxsize=getattr(settings, 'CHATBOT_MEMORY_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'CHATBOT_MEMORY_CACHE_TTL', 3600),
+)
+
+
+def _new_turns(user_id, workspace_id, after_id, page_size):
+    """
+    Every completed turn after message `after_id`, oldest first, read
+    `page_size` messages at a time. Yields (id of the answer, turn); the turn
+    is None for an answer without a question. A question still waiting for
+    its answer (usually the one being asked) is left for next time.
+    """
+    question = None
+    while True:
+        rows = list(
+            AIChatMessage.objects.filter(user_id=user_id, workspace_id=workspace_id, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'message', 'is_from_bot')[:page_size]
+        )
+        for message_id, message, is_from_bot in rows:
+            after_id = message_id
+            if not is_from_bot:
+                question = message
+                continue
+            turn = None
+            if question is not None:
+                turn = (_clip(question, TURN_CHARS), _clip(message, TURN_CHARS))
+                question = None
+            yield message_id, turn
+        if len(rows) < page_size:
+            return
+
+
+def fold_locally(summary, turns):
+    """Fallback fold without the LLM: keep the earlier questions only."""
+    asked = '; '.join(question for question, _ in turns)
+    return f"{summary} Earlier questions: {asked}".strip()
+
+
+def load_memory(user_id, workspace_id, summarize=fold_locally):
+    """
+    The up-to-date memory for a user's chat in a workspace. `summarize(summary,
+    turns)` returns the summary with `turns` folded in; it is only called when
+    the recent turns overflow.
+    """
+    key = (user_id, workspace_id)
+    memory = MEMORY_CACHE.get(key) or ConversationMemory()
+    limit = recent_turns_limit()
+    keep = max(1, limit // 2)
+    summary, turns, last_id = memory.summary, list(memory.turns), memory.last_message_id
+
+    def fold(summary, turns):
+        folded, turns = turns[:-keep], turns[-keep:]
+        return _clip(summarize(summary, folded) or fold_locally(summary, folded), summary_chars()), turns
+
+    for last_id, turn in _new_turns(user_id, workspace_id, last_id, limit * 4):
+        if turn is None:
+            continue
+        turns.append(turn)
+        # However many turns arrived since the last load, each fold covers at most 2 * limit of them.
+        if len(turns) > limit * 2:
+            summary, turns = fold(summary, turns)
+    if last_id == memory.last_message_id:
+        return memory
+
+    if len(turns) > limit:
+        summary, turns = fold(summary, turns)
+    memory = ConversationMemory(summary, turns, last_id)
+    MEMORY_CACHE.set(key, memory)
+    return memory
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from workspaces.models import Workspace
@@ -17,4 +19,96 @@ class AIChatMessage(models.Model):
 
     def __str__(self):
         actor = "AI_Bot" if self.is_from_bot else self.user.username
-        return f"{actor}: {self.message[:50]}"
\ No newline at end of file
+        return f"{actor}: {self.message[:50]}"
+
+class WorkspaceDigest(models.Model):
+    """
+    A combined summary or abstract of every document in a workspace,
+    precomputed in the background. `sources` maps each PDF id to a hash of
+    the section it contributed, so staleness can be checked without an LLM call.
+    """
+
+    class Kind(models.TextChoices):
+        SUMMARY = 'summary', 'Summary'
+        ABSTRACT = 'abstract', 'Abstract'
+
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name='digests')
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    content = models.TextField()
+    sources = models.JSONField(default=dict)
+    source_fingerprint = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['workspace', 'kind']
+
+    def __str__(self):
+        return f"{self.workspace.name} ({self.kind})"
+
+
+class ChatTrace(models.Model):
+    """
+    Telemetry for one chatbot answer: stage durations (ms), token usage,
+    retrieved chunk ids ("<pdf_id>:<page>") and which caches hit.
+    """
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name='chat_traces')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='chat_traces')
+    question_message = models.OneToOneField(
+        AIChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='question_trace'
+    )
+    answer_message = models.OneToOneField(
+        AIChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='answer_trace'
+    )
+    endpoint = models.CharField(max_length=16)
+    intent = models.CharField(max_length=32, blank=True)
+    partial = models.BooleanField(default=False)
+    total_ms = models.PositiveIntegerField()
+    stages = models.JSONField(default=dict)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    tokens_by_chain = models.JSONField(default=dict)
+    chunk_ids = models.JSONField(default=list)
+    cache_hits = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['workspace', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.workspace.name} {self.endpoint} {self.intent or '-'} ({self.total_ms} ms)"
+
+
+class ChatJob(models.Model):
+    """
+    A question answered in the background instead of within the HTTP request.
+    The answer is pushed to the user's notification socket when ready and
+    can also be polled.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name='chat_jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_jobs')
+    question_message = models.OneToOneField(
+        AIChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='question_job'
+    )
+    answer_message = models.OneToOneField(
+        AIChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='answer_job'
+    )
+    prompt = models.TextField()
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user.username} {self.status}: {self.prompt[:50]}"
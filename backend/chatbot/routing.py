@@ -0,0 +1,6 @@
+from django.urls import re_path
+from . import consumer
+
+websocket_urlpatterns = [
+    re_path(r'ws/chatbot/jobs/$', consumer.ChatbotJobConsumer.as_asgi()),
+]
@@ -0,0 +1,330 @@
+"""
+Admission control for chatbot pipelines.
+
+Every question that needs the LLM takes a slot from its process's
+scheduler. At most CHATBOT_MAX_CONCURRENT_PIPELINES run at once in each
+process, so the deployment-wide budget (CHATBOT_GLOBAL_MAX_PIPELINES) is
+split evenly across CHATBOT_WORKER_PROCESSES in settings. The rest queue
+and are released by weighted fair queuing, first across workspaces
+and then across the users of a workspace, so one busy workspace (or one
+busy user) cannot starve everyone else. A request that could not start
+within CHATBOT_QUEUE_TIMEOUT is rejected immediately with SchedulerBusy
+instead of waiting for a deadline it will miss.
+"""
+import asyncio
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request cannot be started within the queue deadline."""
+
+    def __init__(self, queue_position, retry_after):
+        self.queue_position = queue_position
+        self.retry_after = retry_after
+        super().__init__(
+            f"The AI assistant is busy ({queue_position} request(s) ahead). "
+            f"Please try again in about {retry_after} seconds."
+        )
+
+
+def parse_weights(value):
+    """Parse "12:2,15:0.5" into {12: 2.0, 15: 0.5}; malformed entries are ignored."""
+    weights = {}
+    for item in (value or '').split(','):
+        key, _, weight = item.partition(':')
+        try:
+            weights[int(key)] = float(weight)
+        except ValueError:
+            continue
+    return {key: weight for key, weight in weights.items() if weight > 0}
+
+
+class _Waiter:
+    def __init__(self, seq, workspace_id, user_id):
+        self.seq = seq
+        self.workspace_id = workspace_id
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event = threading.Event()
+        self.loop = None
+        self.future = None
+
+    def grant(self):
+        self.granted = True
+        self.event.set()
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Slot:
+    """A running pipeline's share of the scheduler. Release it exactly once."""
+
+    def __init__(self, scheduler, owner=None, waited=0.0):
+        self._scheduler = scheduler
+        self._owner = owner
+        self.waited = waited
+        self.started = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._scheduler._release(time.monotonic() - self.started, self._owner)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FairScheduler:
+    """
+    A counting semaphore with a fair queue. Workspace and user shares are
+    tracked with start-time fair queuing: each workspace (and each user
+    inside it) carries a virtual time that advances by 1/weight whenever
+    one of its requests starts, and the next request released is the
+    oldest one of the user with the lowest virtual time in the workspace
+    with the lowest virtual time.
+    """
+
+    def __init__(self, max_concurrent=8, queue_timeout=30.0, workspace_weights=None,
+                 user_weights=None, initial_service_time=5.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.queue_timeout = queue_timeout
+        self.workspace_weights = workspace_weights or {}
+        self.user_weights = user_weights or {}
+        self.avg_service_time = initial_service_time
+        self.active = 0
+        self.started = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._queues = {}
+        self._workspace_vtime = {}
+        self._user_vtime = {}
+        self._user_floor = {}
+        self._running_workspaces = {}
+        self._running_users = {}
+        self._virtual_now = 0.0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # --- queue bookkeeping (callers hold self._lock) ---
+
+    def _queued(self):
+        return sum(len(waiters) for users in self._queues.values() for waiters in users.values())
+
+    def _enqueue(self, workspace_id, user_id):
+        waiter = _Waiter(next(self._seq), workspace_id, user_id)
+        users = self._queues.get(workspace_id)
+        if users is None:
+            users = self._queues[workspace_id] = {}
+            # An idle workspace rejoins at the current virtual time; it does not bank credit.
+            self._workspace_vtime[workspace_id] = max(self._workspace_vtime.get(workspace_id, 0.0), self._virtual_now)
+        if user_id not in users:
+            users[user_id] = deque()
+            floor = self._user_floor.get(workspace_id, 0.0)
+            self._user_vtime[(workspace_id, user_id)] = max(self._user_vtime.get((workspace_id, user_id), 0.0), floor)
+        users[user_id].append(waiter)
+        return waiter
+
+    def _remove(self, waiter):
+        users = self._queues.get(waiter.workspace_id, {})
+        waiters = users.get(waiter.user_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._prune(waiter.workspace_id, waiter.user_id)
+
+    def _prune(self, workspace_id, user_id):
+        users = self._queues[workspace_id]
+        if not users[user_id]:
+            del users[user_id]
+        if not users:
+            del self._queues[workspace_id]
+
+    def _start(self, workspace_id, user_id):
+        self.active += 1
+        self.started += 1
+        self._running_workspaces[workspace_id] = self._running_workspaces.get(workspace_id, 0) + 1
+        self._running_users[(workspace_id, user_id)] = self._running_users.get((workspace_id, user_id), 0) + 1
+
+    def _forget_idle(self, workspace_id, user_id):
+        """Drop the fair-share state of a user and workspace with nothing queued or running."""
+        users = self._queues.get(workspace_id, {})
+        if user_id not in users and not self._running_users.get((workspace_id, user_id)):
+            self._running_users.pop((workspace_id, user_id), None)
+            self._user_vtime.pop((workspace_id, user_id), None)
+        if not users and not self._running_workspaces.get(workspace_id):
+            self._running_workspaces.pop(workspace_id, None)
+            self._workspace_vtime.pop(workspace_id, None)
+            self._user_floor.pop(workspace_id, None)
+
+    def _order(self):
+        """Waiters in the order they would be released if nothing else arrived."""
+        queues = {ws: {user: list(waiters) for user, waiters in users.items()} for ws, users in self._queues.items()}
+        ws_vtime = dict(self._workspace_vtime)
+        user_vtime = dict(self._user_vtime)
+        order = []
+        while queues:
+            waiter = self._pick(queues, ws_vtime, user_vtime)
+            queues[waiter.workspace_id][waiter.user_id].pop(0)
+            if not queues[waiter.workspace_id][waiter.user_id]:
+                del queues[waiter.workspace_id][waiter.user_id]
+            if not queues[waiter.workspace_id]:
+                del queues[waiter.workspace_id]
+            self._charge(waiter, ws_vtime, user_vtime)
+            order.append(waiter)
+        return order
+
+    def _pick(self, queues, ws_vtime, user_vtime):
+        def first_seq(users):
+            return min(waiters[0].seq for waiters in users.values())
+
+        workspace_id = min(queues, key=lambda ws: (ws_vtime[ws], first_seq(queues[ws])))
+        users = queues[workspace_id]
+        user_id = min(users, key=lambda user: (user_vtime[(workspace_id, user)], users[user][0].seq))
+        return users[user_id][0]
+
+    def _charge(self, waiter, ws_vtime, user_vtime):
+        ws_vtime[waiter.workspace_id] += 1.0 / self.workspace_weights.get(waiter.workspace_id, 1.0)
+        user_vtime[(waiter.workspace_id, waiter.user_id)] += 1.0 / self.user_weights.get(waiter.user_id, 1.0)
+
+    def _dispatch(self):
+        while self.active < self.max_concurrent and self._queues:
+            waiter = self._pick(self._queues, self._workspace_vtime, self._user_vtime)
+            self._queues[waiter.workspace_id][waiter.user_id].popleft()
+            self._prune(waiter.workspace_id, waiter.user_id)
+            self._virtual_now = self._workspace_vtime[waiter.workspace_id]
+            self._user_floor[waiter.workspace_id] = self._user_vtime[(waiter.workspace_id, waiter.user_id)]
+            self._charge(waiter, self._workspace_vtime, self._user_vtime)
+            self._start(waiter.workspace_id, waiter.user_id)
+            waiter.grant()
+
+    def _estimated_wait(self, ahead):
+        return math.ceil((ahead + 1) / self.max_concurrent) * self.avg_service_time
+
+    def _admit(self, workspace_id, user_id):
+        """Start immediately (returns None), queue (returns the waiter) or raise SchedulerBusy."""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._queues:
+                self._start(workspace_id, user_id)
+                return None
+            ahead = self._queued()
+            estimate = self._estimated_wait(ahead)
+            if estimate > self.queue_timeout:
+                self.rejected += 1
+                print(f"[Scheduler] Busy: {ahead} queued, ~{estimate:.1f}s wait exceeds {self.queue_timeout}s.")
+                raise SchedulerBusy(ahead + 1, math.ceil(estimate))
+            waiter = self._enqueue(workspace_id, user_id)
+            print(f"[Scheduler] Queued workspace {workspace_id} user {user_id} behind {ahead} request(s).")
+            return waiter
+
+    def _abandon(self, waiter):
+        """Give up on a queued request. Returns True if it was granted in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            position = self._position(waiter)
+            self._remove(waiter)
+            self._forget_idle(waiter.workspace_id, waiter.user_id)
+            self.timed_out += 1
+        raise SchedulerBusy(position, math.ceil(self.avg_service_time))
+
+    def _position(self, waiter):
+        for position, queued in enumerate(self._order(), start=1):
+            if queued is waiter:
+                return position
+        return 0
+
+    def _release(self, duration, owner=None):
+        with self._lock:
+            self.active -= 1
+            if owner is not None:
+                self._running_workspaces[owner[0]] -= 1
+                self._running_users[owner] -= 1
+                self._forget_idle(*owner)
+            # Exponentially weighted average of slot hold times, used for busy estimates.
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * duration
+            self._dispatch()
+
+    # --- public API ---
+
+    def acquire(self, workspace_id, user_id=None, timeout=None):
+        """Block until a slot is free. Raises SchedulerBusy past the queue deadline."""
+        waiter = self._admit(workspace_id, user_id)
+        if waiter is None:
+            return Slot(self, (workspace_id, user_id))
+        timeout = self.queue_timeout if timeout is None else timeout
+        if not waiter.event.wait(timeout):
+            self._abandon(waiter)
+        return Slot(self, (workspace_id, user_id), waited=time.monotonic() - waiter.enqueued_at)
+
+    async def aacquire(self, workspace_id, user_id=None, timeout=None):
+        """Async acquire; a cancelled waiter leaves the queue (or frees its slot)."""
+        waiter = self._admit(workspace_id, user_id)
+        if waiter is None:
+            return Slot(self, (workspace_id, user_id))
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not waiter.granted:
+                waiter.loop = loop
+                waiter.future = loop.create_future()
+        if waiter.future is not None:
+            timeout = self.queue_timeout if timeout is None else timeout
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._remove(waiter)
+                        self._forget_idle(workspace_id, user_id)
+                if granted:
+                    Slot(self, (workspace_id, user_id)).release()
+                raise
+        return Slot(self, (workspace_id, user_id), waited=time.monotonic() - waiter.enqueued_at)
+
+    def queue_positions(self, user_id):
+        """1-based queue positions of a user's waiting requests, with their workspace."""
+        with self._lock:
+            return [
+                {'workspace_id': waiter.workspace_id, 'position': position}
+                for position, waiter in enumerate(self._order(), start=1)
+                if waiter.user_id == user_id
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'max_concurrent': self.max_concurrent,
+                'queued': self._queued(),
+                'started': self.started,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_service_time': round(self.avg_service_time, 3),
+            }
+
+
+SCHEDULER = FairScheduler(
+    max_concurrent=getattr(settings, 'CHATBOT_MAX_CONCURRENT_PIPELINES', 8),
+    queue_timeout=getattr(settings, 'CHATBOT_QUEUE_TIMEOUT', 30.0),
+    workspace_weights=parse_weights(getattr(settings, 'CHATBOT_WORKSPACE_WEIGHTS', '')),
+    user_weights=parse_weights(getattr(settings, 'CHATBOT_USER_WEIGHTS', '')),
+)
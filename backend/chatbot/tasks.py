@@ -0,0 +1,28 @@
+from background_task import background
+from .digests import refresh_workspace_digests
+
+
+@background(schedule=10)  # short delay so a burst of PDF saves settles first
+def refresh_workspace_digests_task(workspace_id):
+    """
+    Rebuild the stored combined summary and abstract of a workspace after
+    one of its documents changed. A no-op when they are already current.
+    """
+    print(f"Background task received for workspace digests: {workspace_id}")
+    refresh_workspace_digests(workspace_id)
+
+
+@background(schedule=0)
+def answer_chat_job_task(job_id):
+    """
+    Answer a chatbot question submitted in job mode, and push the answer to
+    the user. Re-queued after the scheduler's retry delay while it is busy.
+    """
+    # Imported here: the engine pulls in LangChain, and pdfs.signals imports
+    # this module during django.setup().
+    from .jobs import run_job
+
+    print(f"Background task received for chatbot job: {job_id}")
+    retry_after = run_job(job_id)
+    if retry_after:
+        answer_chat_job_task(job_id, schedule=retry_after)
@@ -0,0 +1,192 @@
+"""
+Per-request chatbot telemetry.
+
+The ask views activate a Trace for each question, and the engine records
+into whichever trace is current: stage durations, prompt/completion tokens,
+retrieved chunk ids and which caches hit. The view then stores it as a
+ChatTrace linked to the question/answer AIChatMessage pair.
+
+The current trace is a context variable, so it follows the request into
+asyncio tasks and into the chatbot's thread pools, which submit work with
+contextvars.copy_context().run.
+
+Stages (ms): memory (rewriting a follow-up), queue, classify, search
+(which includes index_load), generate, combine, and first_token for
+streamed answers. Retrieval may be speculative, so search can overlap
+classify.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .hedging import percentile
+
+STAGES = ('memory', 'queue', 'classify', 'index_load', 'search', 'generate', 'combine', 'first_token')
+
+
+class Trace:
+    def __init__(self, endpoint='ask'):
+        self.endpoint = endpoint
+        self.started = time.monotonic()
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tokens_by_chain = {}
+        self.chunk_ids = []
+        self.caches = {}
+        self.intent = ''
+        self.partial = False
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = round(self.stages.get(name, 0.0) + seconds * 1000, 1)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.monotonic() - started)
+
+    def add_tokens(self, chain, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            used = self.tokens_by_chain.setdefault(chain, [0, 0])
+            used[0] += prompt_tokens
+            used[1] += completion_tokens
+
+    def cache(self, name, hit):
+        """Record a cache lookup; a hit is kept if the same cache is consulted again."""
+        with self._lock:
+            self.caches[name] = self.caches.get(name, False) or bool(hit)
+
+    def note(self, intent=None, partial=False):
+        """Record the route the question took."""
+        with self._lock:
+            self.intent = intent or self.intent
+            self.partial = self.partial or bool(partial)
+
+    def set_chunks(self, docs):
+        """Record the chunks an answer used, by chunk_id or, for older indexes, vector store id."""
+        chunk_ids = []
+        for doc in docs or []:
+            metadata = getattr(doc, 'metadata', None) or {}
+            chunk_ids.append(metadata.get('chunk_id') or getattr(doc, 'id', None))
+        with self._lock:
+            self.chunk_ids = chunk_ids
+
+    def total_ms(self):
+        return round((time.monotonic() - self.started) * 1000)
+
+    def fields(self):
+        return {
+            'endpoint': self.endpoint,
+            'intent': self.intent or '',
+            'partial': self.partial,
+            'total_ms': self.total_ms(),
+            'stages': dict(self.stages),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'tokens_by_chain': dict(self.tokens_by_chain),
+            'chunk_ids': list(self.chunk_ids),
+            'cache_hits': dict(self.caches),
+        }
+
+
+class _NullTrace(Trace):
+    """Stands in when no request is being traced; records nothing."""
+
+    def add_stage(self, name, seconds):
+        pass
+
+    def add_tokens(self, chain, prompt_tokens, completion_tokens):
+        pass
+
+    def cache(self, name, hit):
+        pass
+
+    def set_chunks(self, docs):
+        pass
+
+    def note(self, intent=None, partial=False):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+_CURRENT_TRACE = contextvars.ContextVar('chatbot_trace', default=NULL_TRACE)
+
+
+def current_trace():
+    return _CURRENT_TRACE.get()
+
+
+@contextmanager
+def activate(trace):
+    """Make `trace` current for the engine calls made inside the block."""
+    token = _CURRENT_TRACE.set(trace or NULL_TRACE)
+    try:
+        yield trace
+    finally:
+        _CURRENT_TRACE.reset(token)
+
+
+def start_trace(endpoint):
+    """A new Trace, or None when CHATBOT_TELEMETRY is off."""
+    if not getattr(settings, 'CHATBOT_TELEMETRY', True):
+        return None
+    return Trace(endpoint)
+
+
+def save_trace(trace, workspace, user, question_message, answer_message):
+    """Store a finished trace; telemetry never fails the request."""
+    if trace is None:
+        return None
+    from .models import ChatTrace
+
+    try:
+        return ChatTrace.objects.create(
+            workspace=workspace,
+            user=user,
+            question_message=question_message,
+            answer_message=answer_message,
+            **trace.fields(),
+        )
+    except Exception as e:
+        print(f"[Telemetry] Could not save trace: {e}")
+        return None
+
+
+def summarize_traces(traces):
+    """p50/p95 of total and per-stage latency, average tokens and cache hit rates."""
+    traces = list(traces)
+
+    def spread(values):
+        return {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+
+    stage_names = [name for name in STAGES if any(name in trace.stages for trace in traces)]
+    cache_names = sorted({name for trace in traces for name in trace.cache_hits})
+    count = len(traces)
+    return {
+        'count': count,
+        'total_ms': spread([trace.total_ms for trace in traces]),
+        'stages_ms': {
+            name: spread([trace.stages[name] for trace in traces if name in trace.stages])
+            for name in stage_names
+        },
+        'avg_prompt_tokens': round(sum(trace.prompt_tokens for trace in traces) / count, 1) if count else 0,
+        'avg_completion_tokens': round(sum(trace.completion_tokens for trace in traces) / count, 1) if count else 0,
+        'cache_hit_rates': {
+            name: round(
+                sum(1 for trace in traces if trace.cache_hits.get(name))
+                / sum(1 for trace in traces if name in trace.cache_hits), 3
+            )
+            for name in cache_names
+        },
+        'partial_rate': round(sum(1 for trace in traces if trace.partial) / count, 3) if count else 0,
+    }
@@ -0,0 +1,185 @@
+"""
+Tests for answering batches of chatbot questions.
+"""
+import json
+import tempfile
+import threading
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from langchain_core.documents import Document
+from unittest.mock import patch, MagicMock
+
+from workspaces.models import Workspace, WorkspaceMember
+from .caching import ANSWER_CACHE
+from .models import AIChatMessage, ChatTrace
+from .scheduler import SchedulerBusy
+
+
+async def _read(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+@override_settings(CHATBOT_SPECULATIVE_RETRIEVAL=False, CHATBOT_BATCH_WORKERS=3)
+class BatchEngineTestCase(TransactionTestCase):
+    """
+    Test the shared work and parallel answers of a batch. The answers are
+    generated in worker threads, which need committed rows.
+    """
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='batchengine', password='testpass123')
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.workspace = Workspace.objects.create(
+            name='Batch',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path=index_dir.name,
+        )
+        for target in ('chatbot.engine.load_models', 'chatbot.engine.ensure_index_model'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch('chatbot.engine._lexical_candidates', return_value=([], None))
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine.get_index_server_client', return_value=None)
+    @patch('chatbot.engine._query_embeddings')
+    @patch('chatbot.engine.FAISS')
+    def test_index_loaded_and_questions_embedded_once(
+        self, mock_faiss, mock_embeddings, mock_index_server, mock_classify, mock_lexical
+    ):
+        from chatbot.engine import iter_batch_responses
+
+        store = mock_faiss.load_local.return_value
+        store.similarity_search.return_value = [Document(page_content="Adam.", metadata={'pdf_id': 1, 'page': 1})]
+        mock_qa = MagicMock()
+        mock_qa.invoke.side_effect = lambda inputs: f"answer to {inputs['question']}"
+        questions = ["Which optimizer?", "Which dataset?", "Which baseline?"]
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answers = dict(iter_batch_responses(questions, self.workspace.id, user_id=self.user.id, timeout=30))
+
+        self.assertEqual(answers, {position: f"answer to {question}" for position, question in enumerate(questions)})
+        mock_faiss.load_local.assert_called_once()
+        self.assertEqual(store.similarity_search.call_count, 3)
+        mock_embeddings.return_value.embed_queries.assert_called_once_with(questions)
+
+    @patch('chatbot.engine.get_chatbot_response')
+    @patch('chatbot.engine._prepare_batch', return_value={})
+    def test_busy_and_failed_questions_do_not_fail_the_batch(self, mock_prepare, mock_get_response):
+        from chatbot.engine import iter_batch_responses
+
+        def answer(question, *args, **kwargs):
+            if question == 'busy':
+                raise SchedulerBusy(2, 5)
+            if question == 'broken':
+                raise RuntimeError("LLM down")
+            return "fine"
+
+        mock_get_response.side_effect = answer
+        answers = dict(iter_batch_responses(['ok', 'busy', 'broken'], self.workspace.id))
+
+        self.assertEqual(answers[0], "fine")
+        self.assertIn("busy", answers[1])
+        self.assertEqual(answers[2], "Error generating response: LLM down")
+        self.assertFalse(mock_get_response.call_args.kwargs['memory'])
+
+    @patch('chatbot.engine.get_chatbot_response')
+    @patch('chatbot.engine._prepare_batch', return_value={})
+    def test_batches_share_one_bounded_pool(self, mock_prepare, mock_get_response):
+        from chatbot.engine import _batch_executor, iter_batch_responses
+
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def answer(question, *args, **kwargs):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+            return question
+
+        mock_get_response.side_effect = answer
+        questions = [f"q{i}" for i in range(7)]
+
+        first = dict(iter_batch_responses(questions, self.workspace.id))
+        executor = _batch_executor()
+        second = dict(iter_batch_responses(questions, self.workspace.id))
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, dict(enumerate(questions)))
+        self.assertLessEqual(peak[0], 3)
+        self.assertIs(_batch_executor(), executor)
+
+    def test_workspace_not_ready(self):
+        from chatbot.engine import iter_batch_responses
+
+        self.workspace.processing_status = Workspace.ProcessingStatus.PROCESSING
+        self.workspace.save()
+
+        answers = list(iter_batch_responses(['a', 'b'], self.workspace.id))
+
+        self.assertEqual([position for position, _ in answers], [0, 1])
+        self.assertIn("processing", answers[0][1])
+
+
+class BatchViewsTestCase(TestCase):
+    """Test the batch endpoint."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='batchuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Batch Workspace', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        self.client.login(username='batchuser', password='testpass123')
+
+    def _post(self, questions, **extra):
+        return self.client.post('/api/chatbot/ask/batch/', json.dumps({
+            'questions': questions,
+            'workspace_id': self.workspace.id,
+            **extra,
+        }), content_type='application/json')
+
+    @patch('chatbot.views.iter_batch_responses')
+    def test_answers_returned_in_question_order(self, mock_batch):
+        mock_batch.return_value = iter([(1, "Second answer"), (0, "First answer")])
+
+        response = self._post(['/ai First?', 'Second?'])
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([answer['ai_answer'] for answer in data['answers']], ["First answer", "Second answer"])
+        self.assertEqual(data['answers'][0]['user_question'], '/ai First?')
+        self.assertEqual(mock_batch.call_args[0][0], ['First?', 'Second?'])
+        self.assertEqual(AIChatMessage.objects.filter(workspace=self.workspace, is_from_bot=True).count(), 2)
+        self.assertEqual(ChatTrace.objects.filter(endpoint='batch').count(), 2)
+
+    @patch('chatbot.views.iter_batch_responses')
+    def test_streamed_as_answers_complete(self, mock_batch):
+        mock_batch.return_value = iter([(1, "Second answer"), (0, "First answer")])
+
+        response = self._post(['First?', 'Second?'], stream=True)
+
+        self.assertTrue(response.is_async)
+        events = [json.loads(line) for line in async_to_sync(_read)(response).decode().splitlines()]
+        self.assertEqual([event['type'] for event in events], ['answer', 'answer', 'done'])
+        self.assertEqual([event['index'] for event in events[:2]], [1, 0])
+        self.assertEqual(events[-1]['count'], 2)
+
+    @override_settings(CHATBOT_BATCH_MAX_QUESTIONS=2)
+    def test_invalid_batches(self):
+        self.assertEqual(self._post([]).status_code, 400)
+        self.assertEqual(self._post(['ok', '  ']).status_code, 400)
+        self.assertEqual(self._post(['a', 'b', 'c']).status_code, 400)
+
+    def test_reviewers_cannot_ask(self):
+        reviewer = User.objects.create_user(username='batchreviewer', password='testpass123')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=reviewer, role=WorkspaceMember.Role.REVIEWER)
+        self.client.login(username='batchreviewer', password='testpass123')
+
+        self.assertEqual(self._post(['What is this?']).status_code, 403)
@@ -0,0 +1,55 @@
+"""
+Tests for the offline retrieval benchmark.
+"""
+import importlib.util
+from unittest import skipUnless
+from django.test import SimpleTestCase
+
+from .benchmark import DeterministicEmbeddings, SyntheticWorkspace, compare_to_baseline, run_benchmark
+
+HAS_FAISS = importlib.util.find_spec("faiss") is not None
+
+
+class DeterministicEmbeddingsTestCase(SimpleTestCase):
+    """Test the offline embedding stand-in."""
+
+    def test_same_text_same_vector(self):
+        embeddings = DeterministicEmbeddings(dimension=16)
+        self.assertEqual(embeddings.embed_query("alpha beta"), DeterministicEmbeddings(dimension=16).embed_query("alpha beta"))
+
+    def test_shared_words_are_closer(self):
+        embeddings = DeterministicEmbeddings(dimension=64)
+        base, near, far = embeddings.embed_documents(["alpha beta gamma", "alpha beta delta", "omega sigma tau"])
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        self.assertGreater(dot(base, near), dot(base, far))
+
+    def test_synthetic_workspace_is_reproducible(self):
+        embeddings = DeterministicEmbeddings(dimension=16)
+        first = SyntheticWorkspace(50, embeddings, num_queries=5, vocabulary_size=200)
+        second = SyntheticWorkspace(50, embeddings, num_queries=5, vocabulary_size=200)
+        self.assertEqual(first.texts, second.texts)
+        self.assertEqual(first.queries, second.queries)
+
+
+class RunBenchmarkTestCase(SimpleTestCase):
+    """Test benchmark reports."""
+
+    def test_bm25_report(self):
+        report = run_benchmark([200], configs=("bm25",), num_queries=20, dimension=16)
+        result = report["results"][0]
+        self.assertEqual(result["config"], "bm25")
+        self.assertEqual(result["num_chunks"], 200)
+        for key in ("build_seconds", "load_seconds", "p50_ms", "p95_ms", "p99_ms", "recall_at_k", "index_bytes"):
+            self.assertIn(key, result)
+        self.assertGreater(result["recall_at_k"], 0.5)
+
+    @skipUnless(HAS_FAISS, "faiss is not installed")
+    def test_vector_report_includes_exact_overlap(self):
+        report = run_benchmark([200], configs=("faiss_flat",), num_queries=20, dimension=16)
+        self.assertEqual(report["results"][0]["exact_overlap_at_k"], 1.0)
+
+    def test_compare_to_baseline_flags_regressions(self):
+        baseline = {"results": [{"config": "bm25", "num_chunks": 200, "p95_ms": 1.0, "recall_at_k": 0.9}]}
+        report = {"results": [{"config": "bm25", "num_chunks": 200, "p95_ms": 2.0, "recall_at_k": 0.8}]}
+        self.assertEqual(len(compare_to_baseline(report, baseline)), 2)
+        self.assertEqual(compare_to_baseline(baseline, baseline), [])
@@ -0,0 +1,214 @@
+"""
+Tests for the provider circuit breakers and the engine's degraded answers.
+"""
+import asyncio
+import time
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from unittest.mock import patch, MagicMock
+
+from workspaces.models import Workspace
+from .breaker import CircuitBreaker, CircuitOpen
+from .caching import ANSWER_CACHE, TTLCache
+from .embeddings import CachedQueryEmbeddings
+
+
+def _failing(*args, **kwargs):
+    raise ConnectionError("provider down")
+
+
+def _tripped(name='llm'):
+    breaker = CircuitBreaker(name, minimum_calls=1, open_seconds=60)
+    try:
+        breaker.call(_failing)
+    except ConnectionError:
+        pass
+    return breaker
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    """Test tripping, fast failure and half-open recovery."""
+
+    def test_trips_on_failure_rate(self):
+        breaker = CircuitBreaker('llm', failure_rate=0.5, minimum_calls=4)
+        breaker.call(lambda: 'ok')
+        breaker.call(lambda: 'ok')
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                breaker.call(_failing)
+
+        self.assertEqual(breaker.status()['state'], 'open')
+        with self.assertRaises(CircuitOpen):
+            breaker.call(lambda: 'ok')
+        self.assertEqual(breaker.status()['rejected'], 1)
+
+    def test_needs_minimum_calls(self):
+        breaker = CircuitBreaker('llm', minimum_calls=5)
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                breaker.call(_failing)
+        self.assertEqual(breaker.status()['state'], 'closed')
+
+    def test_excluded_errors_do_not_count(self):
+        breaker = CircuitBreaker('llm', minimum_calls=1, excluded=(ValueError,))
+
+        def unparseable():
+            raise ValueError("not JSON")
+
+        with self.assertRaises(ValueError):
+            breaker.call(unparseable)
+        self.assertEqual(breaker.status()['state'], 'closed')
+
+    def test_old_outcomes_leave_the_window(self):
+        breaker = CircuitBreaker('llm', minimum_calls=2, window=0.05)
+        with self.assertRaises(ConnectionError):
+            breaker.call(_failing)
+        time.sleep(0.1)
+        with self.assertRaises(ConnectionError):
+            breaker.call(_failing)
+        self.assertEqual(breaker.status()['state'], 'closed')
+
+    def test_half_open_probe_closes_on_success(self):
+        breaker = _tripped()
+        breaker.open_seconds = 0
+
+        breaker.before_call()
+        # Only one probe at a time.
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+
+        self.assertEqual(breaker.status()['state'], 'closed')
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    def test_half_open_probe_reopens_on_failure(self):
+        breaker = _tripped()
+        breaker.open_seconds = 0
+        with self.assertRaises(ConnectionError):
+            breaker.call(_failing)
+
+        self.assertEqual(breaker.status()['state'], 'open')
+        self.assertEqual(breaker.status()['trips'], 2)
+
+    def test_check_does_not_take_the_probe(self):
+        breaker = _tripped()
+        with self.assertRaises(CircuitOpen):
+            breaker.check()
+        breaker.open_seconds = 0
+        breaker.check()
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    def test_acall(self):
+        breaker = CircuitBreaker('llm', minimum_calls=1)
+
+        async def answer():
+            return 'ok'
+
+        async def fail():
+            raise ConnectionError("provider down")
+
+        async def run():
+            result = await breaker.acall(answer())
+            with self.assertRaises(ConnectionError):
+                await breaker.acall(fail())
+            with self.assertRaises(CircuitOpen):
+                await breaker.acall(answer())
+            return result
+
+        self.assertEqual(asyncio.run(run()), 'ok')
+
+    def test_cached_query_embeddings_use_breaker(self):
+        provider = MagicMock()
+        embeddings = CachedQueryEmbeddings(provider, cache=TTLCache(10, 60), model_id='m', breaker=_tripped('embeddings'))
+
+        with self.assertRaises(CircuitOpen):
+            embeddings.embed_query("what is attention?")
+        provider.embed_query.assert_not_called()
+
+
+class EngineBreakerTestCase(TestCase):
+    """Test the engine's degraded answers while a breaker is open."""
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='breakeruser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Breakers',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+        self.chunks = [MagicMock(page_content="Adam optimizer with a learning rate of 0.001.", metadata={'pdf_title': 'Paper'})]
+        patcher = patch('chatbot.engine.load_models')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_open_llm_breaker_answers_with_excerpts(self, mock_retrieve, mock_classify):
+        from chatbot.engine import get_chatbot_response
+
+        mock_retrieve.return_value = self.chunks
+        mock_qa = MagicMock()
+        with patch('chatbot.engine.LLM_BREAKER', _tripped()), \
+                patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = get_chatbot_response("which optimizer?", self.workspace.id)
+            get_chatbot_response("which optimizer?", self.workspace.id)
+
+        self.assertIn("temporarily unavailable", answer)
+        self.assertIn("[Paper] Adam optimizer", answer)
+        mock_qa.invoke.assert_not_called()
+        # Degraded answers are not cached.
+        self.assertEqual(mock_retrieve.call_count, 2)
+
+    @patch('chatbot.engine._classify_locally', return_value=None)
+    def test_open_llm_breaker_skips_classifier(self, mock_local):
+        from chatbot.engine import _get_query_classification
+
+        mock_chain = MagicMock()
+        with patch('chatbot.engine.LLM_BREAKER', _tripped()), \
+                patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("which optimizer?")
+
+        self.assertEqual(result['intent'], 'pdf_question')
+        mock_chain.invoke.assert_not_called()
+
+    @patch('chatbot.engine._search_workspace_index')
+    @patch('chatbot.engine._lexical_candidates')
+    def test_open_embeddings_breaker_uses_keyword_results(self, mock_lexical, mock_search):
+        from chatbot.engine import _retrieve_chunks
+
+        mock_lexical.return_value = ([(self.chunks[0], 3.0)], None)
+        with patch('chatbot.engine.EMBEDDINGS_BREAKER', _tripped('embeddings')):
+            docs = _retrieve_chunks('/test/path', "which optimizer?")
+
+        self.assertEqual(docs, self.chunks)
+        mock_search.assert_not_called()
+
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._lexical_candidates', return_value=([], None))
+    def test_open_embeddings_breaker_without_keyword_results(self, mock_lexical, mock_classify):
+        from chatbot.engine import get_chatbot_response
+
+        with patch('chatbot.engine.EMBEDDINGS_BREAKER', _tripped('embeddings')), \
+                patch('chatbot.engine.QA_CHAIN', MagicMock()), patch('chatbot.engine.LLM', MagicMock()):
+            answer = get_chatbot_response("which optimizer?", self.workspace.id)
+
+        self.assertIn("Document search is temporarily unavailable", answer)
+
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_streamed_answer_reports_to_breaker(self, mock_retrieve, mock_classify):
+        from chatbot.engine import stream_chatbot_response
+
+        mock_retrieve.return_value = self.chunks
+        mock_qa = MagicMock()
+        mock_qa.stream.side_effect = lambda inputs: iter(["Adam", "."])
+        breaker = CircuitBreaker('llm')
+        with patch('chatbot.engine.LLM_BREAKER', breaker), \
+                patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = stream_chatbot_response("which optimizer?", self.workspace.id)
+            self.assertEqual("".join(answer), "Adam.")
+
+        self.assertEqual(breaker.status()['successes'], 1)
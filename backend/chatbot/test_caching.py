@@ -0,0 +1,357 @@
+"""
+Tests for chatbot caching helpers.
+"""
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth.models import User
+from unittest.mock import patch, MagicMock
+import time
+from workspaces.models import Workspace
+from pdfs.models import PDFFile
+
+from .caching import (
+    ANSWER_CACHE,
+    AnswerCache,
+    SingleFlight,
+    TTLCache,
+    normalize_question,
+    workspace_index_version,
+)
+from .deadlines import DeadlineExceeded
+from .embeddings import CachedQueryEmbeddings
+
+
+class TTLCacheTestCase(SimpleTestCase):
+    """Test the in-process LRU/TTL cache."""
+
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    @patch('chatbot.caching.time.monotonic')
+    def test_ttl_expiry(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set('a', 1)
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class CachedQueryEmbeddingsTestCase(SimpleTestCase):
+    """Test query embedding memoization."""
+
+    def setUp(self):
+        self.inner = MagicMock()
+        self.inner.model = 'embed-english-v3.0'
+        self.inner.embed_query.return_value = [0.1, 0.2]
+        self.cache = TTLCache(maxsize=8, ttl=60)
+        self.embeddings = CachedQueryEmbeddings(self.inner, cache=self.cache)
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question('  What IS   this? '), 'what is this?')
+
+    def test_repeated_question_embeds_once(self):
+        first = self.embeddings.embed_query('What is this?')
+        second = self.embeddings.embed_query('what is   this?')
+        self.assertEqual(first, [0.1, 0.2])
+        self.assertEqual(second, [0.1, 0.2])
+        self.inner.embed_query.assert_called_once()
+
+    def test_cache_is_keyed_by_model(self):
+        self.embeddings.embed_query('What is this?')
+        other_inner = MagicMock()
+        other_inner.model = 'another-model'
+        other_inner.embed_query.return_value = [0.3]
+        other = CachedQueryEmbeddings(other_inner, cache=self.cache)
+        self.assertEqual(other.embed_query('What is this?'), [0.3])
+
+    def test_embed_queries_batches_only_misses(self):
+        self.embeddings.embed_query('cached question')
+        self.inner.embed.return_value = [[0.5], [0.6]]
+        vectors = self.embeddings.embed_queries(['cached question', 'new one', 'another'])
+        self.assertEqual(vectors, [[0.1, 0.2], [0.5], [0.6]])
+        self.inner.embed.assert_called_once_with(['new one', 'another'], input_type='search_query')
+
+    def test_documents_are_not_cached(self):
+        self.inner.embed_documents.return_value = [[1.0], [2.0]]
+        self.embeddings.embed_documents(['a', 'b'])
+        self.embeddings.embed_documents(['a', 'b'])
+        self.assertEqual(self.inner.embed_documents.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+
+class AnswerCacheTestCase(SimpleTestCase):
+    """Test exact and near-duplicate answer caching."""
+
+    def test_exact_hit_reports_saved_latency(self):
+        cache = AnswerCache(maxsize=8, ttl=60)
+        self.assertIsNone(cache.get(1, 'v1', 'What is this?'))
+        cache.set(1, 'v1', 'What is this?', 'An answer', elapsed=2.5)
+        self.assertEqual(cache.get(1, 'v1', 'what is  this?'), 'An answer')
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+        self.assertEqual(stats['saved_seconds'], 2.5)
+
+    def test_new_index_version_misses(self):
+        cache = AnswerCache(maxsize=8, ttl=60)
+        cache.set(1, 'v1', 'What is this?', 'An answer')
+        self.assertIsNone(cache.get(1, 'v2', 'What is this?'))
+        self.assertIsNone(cache.get(2, 'v1', 'What is this?'))
+
+    def test_near_duplicate_requires_same_target_pdf(self):
+        cache = AnswerCache(maxsize=8, ttl=60, similarity_threshold=0.95)
+        cache.set(1, 'v1', 'What is the method?', 'Method answer', target_pdf_id=7, vector=[1.0, 0.0])
+        self.assertEqual(cache.get_similar(1, 'v1', 7, [0.99, 0.05]), 'Method answer')
+        self.assertIsNone(cache.get_similar(1, 'v1', 8, [0.99, 0.05]))
+        self.assertIsNone(cache.get_similar(1, 'v1', 7, [0.0, 1.0]))
+        self.assertEqual(cache.stats()['similar_hits'], 1)
+
+    def test_near_duplicate_disabled_without_threshold(self):
+        cache = AnswerCache(maxsize=8, ttl=60)
+        cache.set(1, 'v1', 'q', 'a', vector=[1.0, 0.0])
+        self.assertIsNone(cache.get_similar(1, 'v1', None, [1.0, 0.0]))
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    """Test coalescing of concurrent identical calls."""
+
+    def _run_concurrently(self, flight, fn, callers=4):
+        import threading
+
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do('key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_followers_share_leader_result(self):
+        import threading
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        threads, results, errors = self._run_concurrently(flight, work)
+        while flight.leaders + flight.followers < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['answer'] * 4)
+        self.assertEqual(flight.stats()['followers'], 3)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_followers_share_leader_error(self):
+        import threading
+
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def work():
+            release.wait(5)
+            raise RuntimeError('boom')
+
+        threads, results, errors = self._run_concurrently(flight, work, callers=3)
+        while flight.leaders + flight.followers < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ['boom'] * 3)
+        # Every caller raises its own exception, so their tracebacks do not mix.
+        self.assertEqual(len({id(e) for e in errors}), 3)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        leader_error = next(e for e in errors if e.__cause__ is None)
+        self.assertTrue(all(e.__cause__ is leader_error for e in errors if e is not leader_error))
+
+    def test_follower_gives_up_at_its_deadline(self):
+        import threading
+
+        flight = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+        leader.start()
+        while not flight.in_flight():
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            flight.do('key', lambda: 'unused', timeout=0.05)
+        self.assertLess(time.monotonic() - started, 1)
+
+        release.set()
+        leader.join(5)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+        self.assertEqual(flight.do('key', lambda: 2), 2)
+        self.assertEqual(flight.followers, 0)
+
+    def test_async_waiters_share_one_task(self):
+        import asyncio
+
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            return await asyncio.gather(*(flight.ado('key', work) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ['answer'] * 3)
+        self.assertEqual(calls, [1])
+
+    def test_async_task_survives_until_last_waiter_leaves(self):
+        import asyncio
+
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            first = asyncio.ensure_future(flight.ado('key', work))
+            second = asyncio.ensure_future(flight.ado('key', work))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(main()), 'answer')
+
+    def test_async_waiters_raise_their_own_errors(self):
+        import asyncio
+        from .scheduler import SchedulerBusy
+
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            raise SchedulerBusy(2, 5)
+
+        async def main():
+            return await asyncio.gather(*(flight.ado('key', work) for _ in range(2)), return_exceptions=True)
+
+        first, second = asyncio.run(main())
+        self.assertIsNot(first, second)
+        self.assertIs(first.__cause__, second.__cause__)
+        self.assertEqual((first.queue_position, first.retry_after, str(first)), (2, 5, str(first.__cause__)))
+
+
+class EngineAnswerCacheTestCase(TestCase):
+    """Test answer caching inside get_chatbot_response."""
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='cacheuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Cache Workspace', created_by=self.user)
+        self.pdf = PDFFile.objects.create(
+            workspace=self.workspace,
+            uploaded_by=self.user,
+            title='Cache PDF',
+            file=b'%PDF-1.4 fake pdf content'
+        )
+        self.workspace.processing_status = Workspace.ProcessingStatus.READY
+        self.workspace.index_path = '/test/path'
+        self.workspace.save()
+
+    def tearDown(self):
+        ANSWER_CACHE.clear()
+
+    def _ask(self):
+        from chatbot.engine import get_chatbot_response
+        return get_chatbot_response('what is this about?', self.workspace.id)
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine.get_cached_vector_store')
+    def test_repeated_question_served_from_cache(self, mock_get_store, mock_classify):
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_doc = MagicMock()
+        mock_doc.page_content = 'Test content'
+        mock_get_store.return_value.similarity_search.return_value = [mock_doc]
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = 'Cached answer'
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            first = self._ask()
+            second = self._ask()
+
+        self.assertEqual(first, 'Cached answer')
+        self.assertEqual(second, 'Cached answer')
+        mock_qa.invoke.assert_called_once()
+        mock_classify.assert_called_once()
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine.get_cached_vector_store')
+    def test_errors_are_not_cached(self, mock_get_store, mock_classify):
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_get_store.return_value.similarity_search.return_value = []
+
+        self._ask()
+        self._ask()
+
+        self.assertEqual(mock_classify.call_count, 2)
+
+    def test_pdf_rename_changes_index_version(self):
+        before = workspace_index_version(self.workspace)
+        self.pdf.title = 'Renamed PDF'
+        self.pdf.save()
+        self.assertNotEqual(before, workspace_index_version(self.workspace))
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine.get_cached_vector_store')
+    def test_change_made_by_another_process_misses(self, mock_get_store, mock_classify):
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_doc = MagicMock()
+        mock_doc.page_content = 'Test content'
+        mock_get_store.return_value.similarity_search.return_value = [mock_doc]
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = 'Answer'
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            self._ask()
+            # Another worker handles the upload: only the database changes,
+            # none of this process's caches are touched.
+            with patch('pdfs.signals.ANSWER_CACHE'), patch('pdfs.signals.invalidate_title_index'):
+                PDFFile.objects.create(
+                    workspace=self.workspace, uploaded_by=self.user, title='Second PDF', file=b'%PDF-1.4'
+                )
+            self._ask()
+
+        self.assertEqual(mock_qa.invoke.call_count, 2)
@@ -0,0 +1,141 @@
+"""
+Tests for cross-document comparison questions.
+"""
+import tempfile
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from langchain_core.documents import Document
+from unittest.mock import patch, MagicMock
+
+from pdfs.models import PDFFile
+from workspaces.models import Workspace
+from .caching import ANSWER_CACHE
+from .titles import get_title_index
+
+
+@override_settings(
+    CHATBOT_SPECULATIVE_RETRIEVAL=False,
+    CHATBOT_MEMORY=False,
+    CHATBOT_COMPARE_MAX_DOCUMENTS=3,
+    CHATBOT_COMPARE_K_PER_DOCUMENT=2,
+    CHATBOT_CONTEXT_TOKEN_BUDGET=200,
+)
+class ComparisonTestCase(TestCase):
+    """Test per-document retrieval and the balanced comparison context."""
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='compareuser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Compare',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+        self.pdfs = [
+            PDFFile.objects.create(workspace=self.workspace, uploaded_by=self.user, title=title, file=b'%PDF-1.4')
+            for title in ('pdf1', 'pdf2', 'pdf3')
+        ]
+        patcher = patch('chatbot.engine.load_models')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _chunks(self, index_path, question, k=5, filter_kwargs=None):
+        pdf_id = filter_kwargs['pdf_id']
+        # pdf1 has far more (and longer) matches, which would fill a global top-k on its own.
+        count = 10 if pdf_id == self.pdfs[0].id else 1
+        return [
+            Document(page_content=f"Method text of document {pdf_id}, passage {i}. " * 20, metadata={'pdf_id': pdf_id, 'page': i})
+            for i in range(count)
+        ][:k]
+
+    def _ask(self, question, mock_qa):
+        from chatbot.engine import get_chatbot_response
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            return get_chatbot_response(question, self.workspace.id, timeout=30)
+
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_named_documents_are_searched_separately(self, mock_retrieve):
+        from chatbot.engine import _comparison_context
+
+        mock_retrieve.side_effect = self._chunks
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = "pdf1 uses Adam; pdf2 uses SGD."
+
+        answer = self._ask("compare the methods in pdf1 and pdf2", mock_qa)
+
+        self.assertEqual(answer, "pdf1 uses Adam; pdf2 uses SGD.")
+        filters = sorted(call.args[3]['pdf_id'] for call in mock_retrieve.call_args_list)
+        self.assertEqual(filters, [self.pdfs[0].id, self.pdfs[1].id])
+        self.assertTrue(all(call.args[2] == 2 for call in mock_retrieve.call_args_list))
+        mock_qa.invoke.assert_called_once()
+        inputs = mock_qa.invoke.call_args[0][0]
+        self.assertIn("Document: pdf1", inputs['context'])
+        self.assertIn("Document: pdf2", inputs['context'])
+        self.assertIn("'pdf1', 'pdf2'", inputs['question'])
+
+        # Each document gets the same share of the context budget.
+        route_info = {}
+        _comparison_context(
+            get_title_index(self.workspace.id).entries[:2],
+            {pdf.id: self._chunks(None, None, 2, {'pdf_id': pdf.id}) for pdf in self.pdfs[:2]},
+            route_info,
+        )
+        self.assertLessEqual(route_info['context_stats']['tokens_after'], 200)
+
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_all_documents_of_a_small_workspace(self, mock_retrieve):
+        mock_retrieve.side_effect = self._chunks
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = "They differ."
+
+        self._ask("how do all the papers differ?", mock_qa)
+
+        self.assertEqual(mock_retrieve.call_count, 3)
+        self.assertEqual(mock_qa.invoke.call_args[0][0]['context'].count("Document: "), 3)
+
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_single_document_falls_back_to_rag(self, mock_retrieve):
+        for pdf in self.pdfs[1:]:
+            pdf.delete()
+        mock_retrieve.side_effect = lambda index_path, question, k=5, filter_kwargs=None: [
+            Document(page_content="Adam.", metadata={'pdf_id': self.pdfs[0].id, 'page': 1})
+        ]
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = "Adam."
+
+        with patch('chatbot.engine._get_query_classification', return_value={'intent': 'comparison', 'doc_name': 'all'}):
+            self.assertEqual(self._ask("compare its methods", mock_qa), "Adam.")
+
+        self.assertEqual(mock_retrieve.call_args.kwargs['k'], 5)
+        self.assertNotIn("Document: ", mock_qa.invoke.call_args[0][0]['context'])
+
+    @patch('chatbot.engine._lexical_candidates', return_value=([], None))
+    @patch('chatbot.engine.get_index_server_client', return_value=None)
+    @patch('chatbot.engine._query_embeddings')
+    @patch('chatbot.engine.FAISS')
+    def test_index_loaded_and_question_embedded_once(self, mock_faiss, mock_embeddings, mock_index_server, mock_lexical):
+        from chatbot.deadlines import Deadline
+        from chatbot.engine import _retrieve_per_document
+
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        threads = set()
+
+        def search(question, k=5, filter=None):
+            threads.add(threading.current_thread().name)
+            return [Document(page_content="Adam.", metadata={'pdf_id': filter['pdf_id'], 'page': 1})]
+
+        mock_faiss.load_local.return_value.similarity_search.side_effect = search
+        documents = get_title_index(self.workspace.id).entries
+
+        with patch('chatbot.engine.ensure_index_model'):
+            chunks_by_pdf = _retrieve_per_document(index_dir.name, "compare the methods", documents, Deadline(30))
+
+        self.assertEqual(set(chunks_by_pdf), {pdf.id for pdf in self.pdfs})
+        mock_faiss.load_local.assert_called_once()
+        mock_embeddings.return_value.embed_queries.assert_called_once_with(["compare the methods"])
+        self.assertTrue(all(name.startswith('chatbot-compare') for name in threads))
@@ -0,0 +1,68 @@
+"""
+Tests for deduplicated, token-budgeted context assembly.
+"""
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from .context import build_context, estimate_tokens, merge_texts
+
+
+def _doc(text, pdf_id=1, page=0, title='Paper A'):
+    return Document(page_content=text, metadata={'pdf_id': pdf_id, 'page': page, 'pdf_title': title})
+
+
+SENTENCES = [
+    f"Sentence number {i} describes a distinct finding of the research paper in detail."
+    for i in range(12)
+]
+
+
+class MergeTextsTestCase(SimpleTestCase):
+    """Test chunk overlap merging."""
+
+    def test_overlapping_chunks_are_joined(self):
+        first = " ".join(SENTENCES[:4])
+        second = " ".join(SENTENCES[2:6])
+        self.assertEqual(merge_texts(first, second), " ".join(SENTENCES[:6]))
+        self.assertEqual(merge_texts(second, first), " ".join(SENTENCES[:6]))
+
+    def test_contained_chunk_is_dropped(self):
+        self.assertEqual(merge_texts(" ".join(SENTENCES[:4]), SENTENCES[1]), " ".join(SENTENCES[:4]))
+
+    def test_unrelated_chunks_are_not_merged(self):
+        self.assertIsNone(merge_texts(SENTENCES[0], SENTENCES[5]))
+
+
+class BuildContextTestCase(SimpleTestCase):
+    """Test context building."""
+
+    def test_overlapping_neighbours_become_one_block(self):
+        docs = [_doc(" ".join(SENTENCES[:4])), _doc(" ".join(SENTENCES[2:6]))]
+        context, stats = build_context(docs, token_budget=10000)
+        self.assertEqual(context, "[Paper A] " + " ".join(SENTENCES[:6]))
+        self.assertEqual(stats['blocks'], 1)
+        self.assertGreater(stats['tokens_saved'], 0)
+
+    def test_source_prefix_is_stripped(self):
+        text = "Source Document: Paper A (filename: Paper A.pdf)\n\nContent follows:\nReal content."
+        context, _ = build_context([_doc(text)], token_budget=1000)
+        self.assertEqual(context, "[Paper A] Real content.")
+
+    def test_repeated_sentences_across_pages_are_removed(self):
+        docs = [_doc(SENTENCES[0] + " " + SENTENCES[1], page=0), _doc(SENTENCES[1] + " " + SENTENCES[7], page=3)]
+        context, stats = build_context(docs, token_budget=10000)
+        self.assertEqual(context.count(SENTENCES[1]), 1)
+        self.assertIn(SENTENCES[7], context)
+        self.assertEqual(stats['blocks'], 2)
+
+    def test_context_respects_token_budget(self):
+        docs = [_doc(" ".join(SENTENCES), page=page, pdf_id=page) for page in range(5)]
+        context, stats = build_context(docs, token_budget=300)
+        self.assertLessEqual(estimate_tokens(context), 300)
+        self.assertEqual(stats['tokens_after'], estimate_tokens(context))
+        self.assertEqual(stats['chunks'], 5)
+
+    def test_blocks_keep_rank_order(self):
+        docs = [_doc(SENTENCES[0], title='Best'), _doc(SENTENCES[5], pdf_id=2, title='Second')]
+        context, _ = build_context(docs, token_budget=1000)
+        self.assertLess(context.index('[Best]'), context.index('[Second]'))
@@ -0,0 +1,179 @@
+"""
+Tests for request deadlines and partial answers.
+"""
+import asyncio
+import time
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest.mock import patch, MagicMock
+
+from pdfs.models import PDFFile
+from workspaces.models import Workspace
+from .caching import ANSWER_CACHE
+from .deadlines import Deadline, DeadlineExceeded, acall_with_timeout, call_with_timeout
+
+
+def _slow(seconds, result="late"):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+    return call
+
+
+class DeadlineTestCase(SimpleTestCase):
+    """Test budgets and bounded calls."""
+
+    def test_unbounded(self):
+        deadline = Deadline()
+        self.assertIsNone(deadline.budget(5))
+        self.assertFalse(deadline.expired())
+        self.assertTrue(deadline.allows(10 ** 6))
+
+    def test_budget_is_capped_and_keeps_reserve(self):
+        deadline = Deadline(10)
+        self.assertEqual(deadline.budget(3), 3)
+        self.assertAlmostEqual(deadline.budget(None, reserve=4), 6, delta=0.1)
+        self.assertEqual(deadline.budget(3, reserve=20), 0)
+
+    def test_call_with_timeout(self):
+        self.assertEqual(call_with_timeout(None, lambda: 1), 1)
+        self.assertEqual(call_with_timeout(1, lambda x: x * 2, 2), 4)
+        with self.assertRaises(DeadlineExceeded):
+            call_with_timeout(0.05, _slow(0.5))
+        with self.assertRaises(DeadlineExceeded):
+            call_with_timeout(0, lambda: 1)
+
+    def test_acall_with_timeout(self):
+        async def main():
+            self.assertEqual(await acall_with_timeout(1, asyncio.sleep(0, result=3)), 3)
+            with self.assertRaises(DeadlineExceeded):
+                await acall_with_timeout(0.05, asyncio.sleep(1))
+
+        asyncio.run(main())
+
+
+@override_settings(CHATBOT_SPECULATIVE_RETRIEVAL=False, CHATBOT_MIN_GENERATION_SECONDS=0.2)
+class EngineDeadlineTestCase(TestCase):
+    """Test that the engine plans its stages within the request deadline."""
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='deadlineuser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Deadlines',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+        self.chunks = [MagicMock(page_content="Adam optimizer with a learning rate of 0.001.", metadata={'pdf_title': 'Paper'})]
+        # Building real clients would eat into these short deadlines.
+        for target in ('chatbot.engine.load_models', 'chatbot.engine._aload_models'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _ask(self, timeout):
+        from chatbot.engine import get_chatbot_response
+        return get_chatbot_response("which optimizer?", self.workspace.id, timeout=timeout)
+
+    @override_settings(CHATBOT_CLASSIFY_TIMEOUT=0.05)
+    @patch('chatbot.engine._classify_locally', return_value=None)
+    def test_slow_classifier_falls_back_to_rag(self, mock_local):
+        from chatbot.engine import _get_query_classification
+
+        mock_chain = MagicMock()
+        mock_chain.invoke.side_effect = _slow(0.5, {'intent': 'summary', 'doc_name': 'all'})
+        with patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("which optimizer?", deadline=Deadline(10))
+
+        self.assertEqual(result['intent'], 'pdf_question')
+
+    @override_settings(CHATBOT_MIN_GENERATION_SECONDS=5)
+    @patch('chatbot.engine._classify_locally', return_value=None)
+    def test_classifier_skipped_when_time_is_short(self, mock_local):
+        from chatbot.engine import _get_query_classification
+
+        mock_chain = MagicMock()
+        with patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("which optimizer?", deadline=Deadline(3))
+
+        self.assertEqual(result['intent'], 'pdf_question')
+        mock_chain.invoke.assert_not_called()
+
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_slow_generation_returns_excerpts(self, mock_retrieve, mock_classify):
+        mock_retrieve.return_value = self.chunks
+        mock_qa = MagicMock()
+        mock_qa.invoke.side_effect = _slow(2)
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            started = time.monotonic()
+            answer = self._ask(timeout=0.5)
+            elapsed = time.monotonic() - started
+            self._ask(timeout=0.5)
+
+        self.assertIn("ran out of time", answer)
+        self.assertIn("[Paper] Adam optimizer", answer)
+        self.assertLess(elapsed, 1.5)
+        # Partial answers are not cached.
+        self.assertEqual(mock_qa.invoke.call_count, 2)
+
+    @override_settings(CHATBOT_MIN_GENERATION_SECONDS=5)
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_generation_not_started_without_budget(self, mock_retrieve, mock_classify):
+        mock_retrieve.return_value = self.chunks
+        mock_qa = MagicMock()
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = self._ask(timeout=2)
+
+        self.assertIn("Adam optimizer", answer)
+        mock_qa.invoke.assert_not_called()
+
+    @override_settings(CHATBOT_RETRIEVAL_TIMEOUT=0.05)
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_slow_retrieval(self, mock_retrieve, mock_classify):
+        mock_retrieve.side_effect = _slow(0.5, self.chunks)
+        mock_qa = MagicMock()
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = self._ask(timeout=10)
+
+        self.assertIn("took too long", answer)
+        mock_qa.invoke.assert_not_called()
+
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'summary', 'doc_name': 'all'})
+    @patch('chatbot.engine._combine_sections')
+    def test_slow_combined_summary_returns_sections(self, mock_combine, mock_classify):
+        PDFFile.objects.create(
+            workspace=self.workspace, uploaded_by=self.user, title='Paper One', summary='First.', file=b'%PDF-1.4'
+        )
+        mock_combine.side_effect = _slow(2, "Combined.")
+
+        answer = self._ask(timeout=0.5)
+
+        self.assertIn("Document: Paper One\n\nFirst.", answer)
+
+    @patch('chatbot.engine._aget_query_classification')
+    @patch('chatbot.engine._aretrieve_chunks')
+    async def test_async_slow_generation_returns_excerpts(self, mock_retrieve, mock_classify):
+        from unittest.mock import AsyncMock
+        from chatbot.engine import aget_chatbot_response
+
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_retrieve.return_value = self.chunks
+        mock_qa = MagicMock()
+
+        async def slow_answer(*args):
+            await asyncio.sleep(2)
+            return "late"
+        mock_qa.ainvoke = AsyncMock(side_effect=slow_answer)
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = await aget_chatbot_response("which optimizer?", self.workspace.id, timeout=0.5)
+
+        self.assertIn("ran out of time", answer)
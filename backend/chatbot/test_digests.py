@@ -0,0 +1,116 @@
+"""
+Tests for stored workspace-level combined summaries and abstracts.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from unittest.mock import patch, MagicMock
+
+from pdfs.models import PDFFile
+from workspaces.models import Workspace
+from .digests import digest_sections, get_fresh_digest, refresh_workspace_digest, save_digest
+from .models import WorkspaceDigest
+
+
+class WorkspaceDigestTestCase(TestCase):
+    """Test staleness checks and incremental refresh."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='digestuser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Digests', created_by=self.user, processing_status=Workspace.ProcessingStatus.READY
+        )
+        self.pdf1 = self._pdf('Paper One', summary='First summary.')
+        self.pdf2 = self._pdf('Paper Two', summary='Second summary.', abstract='N/A')
+
+    def _pdf(self, title, **fields):
+        return PDFFile.objects.create(
+            workspace=self.workspace, uploaded_by=self.user, title=title, file=b'%PDF-1.4', **fields
+        )
+
+    def test_sections_skip_missing_content(self):
+        self.assertEqual(len(digest_sections(self.workspace.id, 'summary')), 2)
+        self.assertEqual(digest_sections(self.workspace.id, 'abstract'), [])
+
+    def test_fresh_until_a_summary_changes(self):
+        sections = digest_sections(self.workspace.id, 'summary')
+        self.assertIsNone(get_fresh_digest(self.workspace.id, 'summary', sections))
+
+        save_digest(self.workspace.id, 'summary', sections, 'Combined.')
+        self.assertEqual(get_fresh_digest(self.workspace.id, 'summary', sections), 'Combined.')
+
+        self.pdf2.summary = 'Revised summary.'
+        self.pdf2.save()
+        sections = digest_sections(self.workspace.id, 'summary')
+        self.assertIsNone(get_fresh_digest(self.workspace.id, 'summary', sections))
+
+    @patch('chatbot.engine.LLM', MagicMock())
+    @patch('chatbot.engine._extend_combined_text')
+    @patch('chatbot.engine._combine_sections')
+    def test_refresh_extends_when_documents_are_added(self, mock_combine, mock_extend):
+        mock_combine.return_value = 'Combined one and two.'
+        mock_extend.return_value = 'Combined one, two and three.'
+
+        self.assertEqual(refresh_workspace_digest(self.workspace.id, 'summary'), 'Combined one and two.')
+        self._pdf('Paper Three', summary='Third summary.')
+
+        self.assertEqual(refresh_workspace_digest(self.workspace.id, 'summary'), 'Combined one, two and three.')
+        previous, new_sections = mock_extend.call_args[0][1:]
+        self.assertEqual(previous, 'Combined one and two.')
+        self.assertEqual(new_sections, ["Document: Paper Three\n\nThird summary."])
+        self.assertEqual(mock_combine.call_count, 1)
+
+        # Already current: no LLM call at all.
+        refresh_workspace_digest(self.workspace.id, 'summary')
+        self.assertEqual(mock_combine.call_count + mock_extend.call_count, 2)
+
+    @patch('chatbot.engine.LLM', MagicMock())
+    @patch('chatbot.engine._combine_sections')
+    def test_refresh_rebuilds_after_delete(self, mock_combine):
+        mock_combine.return_value = 'Combined.'
+        refresh_workspace_digest(self.workspace.id, 'summary')
+        self.pdf1.delete()
+
+        mock_combine.return_value = 'Only two.'
+        self.assertEqual(refresh_workspace_digest(self.workspace.id, 'summary'), 'Only two.')
+        self.assertEqual(mock_combine.call_args[0][1], ["Document: Paper Two\n\nSecond summary."])
+
+    def test_refresh_without_sections_removes_digest(self):
+        WorkspaceDigest.objects.create(
+            workspace=self.workspace, kind='abstract', content='Old.', sources={}, source_fingerprint='x'
+        )
+        self.assertIsNone(refresh_workspace_digest(self.workspace.id, 'abstract'))
+        self.assertFalse(WorkspaceDigest.objects.filter(workspace=self.workspace, kind='abstract').exists())
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine._combine_sections')
+    def test_engine_serves_stored_digest(self, mock_combine, mock_classify):
+        from chatbot.engine import get_chatbot_response
+
+        mock_classify.return_value = {'intent': 'summary', 'doc_name': 'all'}
+        save_digest(self.workspace.id, 'summary', digest_sections(self.workspace.id, 'summary'), 'Stored.')
+
+        self.assertEqual(get_chatbot_response("summarize everything", self.workspace.id), 'Stored.')
+        mock_combine.assert_not_called()
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine._combine_sections')
+    def test_engine_combines_live_when_stale(self, mock_combine, mock_classify):
+        from chatbot.engine import get_chatbot_response
+
+        mock_classify.return_value = {'intent': 'summary', 'doc_name': 'all'}
+        mock_combine.return_value = 'Live.'
+
+        self.assertEqual(get_chatbot_response("summarize everything", self.workspace.id), 'Live.')
+        sections = digest_sections(self.workspace.id, 'summary')
+        self.assertEqual(get_fresh_digest(self.workspace.id, 'summary', sections), 'Live.')
+
+    @patch('pdfs.signals.refresh_workspace_digests_task')
+    def test_document_changes_schedule_refresh(self, mock_task):
+        self._pdf('Paper Three')
+        mock_task.assert_not_called()
+
+        self.pdf1.summary = 'Updated.'
+        self.pdf1.save()
+        self.pdf2.delete()
+        self.assertEqual(mock_task.call_count, 2)
+        mock_task.assert_called_with(self.workspace.id)
@@ -0,0 +1,82 @@
+"""
+Tests for pluggable embedding providers and index model manifests.
+"""
+import sys
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+
+from .embeddings import (
+    LEGACY_MODEL_ID,
+    EmbeddingModelMismatch,
+    LocalONNXEmbeddings,
+    configured_model_id,
+    ensure_index_model,
+    load_embeddings,
+    read_index_model_id,
+    write_index_manifest,
+)
+
+
+class ProviderSelectionTestCase(SimpleTestCase):
+    """Test provider configuration."""
+
+    @override_settings(CHATBOT_EMBEDDING_PROVIDER='cohere', CHATBOT_EMBEDDING_MODEL='')
+    def test_default_cohere_model(self):
+        self.assertEqual(configured_model_id(), LEGACY_MODEL_ID)
+
+    @override_settings(CHATBOT_EMBEDDING_PROVIDER='local', CHATBOT_EMBEDDING_MODEL='my/onnx-model')
+    def test_local_model_loads_through_fastembed(self):
+        fake_model = MagicMock()
+        fake_model.embed.return_value = iter([np.array([1.0, 0.0]), np.array([0.0, 1.0])])
+        fake_model.query_embed.return_value = iter([np.array([0.5, 0.5])])
+        fake_fastembed = MagicMock()
+        fake_fastembed.TextEmbedding.return_value = fake_model
+
+        with patch.dict(sys.modules, {'fastembed': fake_fastembed}):
+            embeddings, model_id = load_embeddings()
+
+        self.assertIsInstance(embeddings, LocalONNXEmbeddings)
+        self.assertEqual(model_id, 'local:my/onnx-model')
+        fake_fastembed.TextEmbedding.assert_called_once_with(model_name='my/onnx-model')
+        self.assertEqual(embeddings.embed_documents(['a', 'b']), [[1.0, 0.0], [0.0, 1.0]])
+        self.assertEqual(embeddings.embed_query('q'), [0.5, 0.5])
+
+    @override_settings(CHATBOT_EMBEDDING_PROVIDER='local', CHATBOT_EMBEDDING_MODEL='')
+    def test_missing_local_backend_returns_none(self):
+        with patch.dict(sys.modules, {'fastembed': None}):
+            embeddings, model_id = load_embeddings()
+        self.assertIsNone(embeddings)
+        self.assertTrue(model_id.startswith('local:'))
+
+
+class IndexManifestTestCase(SimpleTestCase):
+    """Test that indexes built with different models are never mixed."""
+
+    def test_manifest_round_trip(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            write_index_manifest(index_path, 'local:model-a', dimension=384)
+            self.assertEqual(read_index_model_id(index_path), 'local:model-a')
+            ensure_index_model(index_path, 'local:model-a')
+
+    def test_legacy_index_is_cohere(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            self.assertEqual(read_index_model_id(index_path), LEGACY_MODEL_ID)
+
+    def test_mismatch_raises(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            write_index_manifest(index_path, 'local:model-a')
+            with self.assertRaises(EmbeddingModelMismatch):
+                ensure_index_model(index_path, 'cohere:embed-english-v3.0')
+
+    @patch('chatbot.engine.FAISS')
+    def test_vector_store_refuses_other_model(self, mock_faiss):
+        from chatbot.engine import get_cached_vector_store
+
+        with tempfile.TemporaryDirectory() as index_path:
+            write_index_manifest(index_path, 'local:model-a')
+            with patch('chatbot.engine.EMBEDDING_MODEL_ID', 'cohere:embed-english-v3.0'):
+                with self.assertRaises(EmbeddingModelMismatch):
+                    get_cached_vector_store(index_path)
+        mock_faiss.load_local.assert_not_called()
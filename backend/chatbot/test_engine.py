@@ -611,3 +611,220 @@ class EngineFunctionsTestCase(TestCase):
         self.assertEqual(self.workspace.processing_status, Workspace.ProcessingStatus.FAILED)
 
 
+
+
+class SpeculativeRetrievalTestCase(TestCase):
+    """Test retrieval started while the intent classifier runs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='specuser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Speculative Workspace',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_speculative_result_is_used_for_rag(self, mock_retrieve, mock_classify):
+        from chatbot.engine import _answer_ready_workspace
+
+        mock_doc = MagicMock(page_content="Adam optimizer", metadata={})
+        mock_retrieve.return_value = [mock_doc]
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = "It uses Adam."
+
+        with self.settings(CHATBOT_SPECULATIVE_RETRIEVAL=True), \
+                patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            result = _answer_ready_workspace("which optimizer?", self.workspace, {'index_version': 'v'})
+
+        self.assertEqual(result, "It uses Adam.")
+        mock_retrieve.assert_called_once_with('/test/path', "which optimizer?", 5, None)
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_speculative_result_discarded_for_off_topic(self, mock_retrieve, mock_classify):
+        from chatbot.engine import _answer_ready_workspace
+
+        mock_retrieve.return_value = []
+        mock_classify.return_value = {'intent': 'off_topic', 'doc_name': 'none'}
+        mock_qa = MagicMock()
+
+        with self.settings(CHATBOT_SPECULATIVE_RETRIEVAL=True), patch('chatbot.engine.QA_CHAIN', mock_qa):
+            result = _answer_ready_workspace("tell me a joke", self.workspace, {'index_version': 'v'})
+
+        self.assertIn("cannot find", result)
+        mock_qa.invoke.assert_not_called()
+
+    def test_changed_filter_is_not_used(self):
+        from concurrent.futures import Future
+        from chatbot.engine import SpeculativeRetrieval
+
+        future = Future()
+        future.set_result(["chunk"])
+        speculation = SpeculativeRetrieval(future, None)
+        self.assertIsNone(speculation.result_for({"pdf_id": 3}))
+
+        future = Future()
+        future.set_result(["chunk"])
+        self.assertEqual(SpeculativeRetrieval(future, {"pdf_id": 3}).result_for({"pdf_id": 3}), ["chunk"])
+
+    def test_failed_speculation_falls_back(self):
+        from concurrent.futures import Future
+        from chatbot.engine import SpeculativeRetrieval
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        future.set_exception(RuntimeError("embedding timeout"))
+        self.assertIsNone(SpeculativeRetrieval(future, None).result_for(None))
+
+
+class StreamedAnswerTestCase(TestCase):
+    """Test token streaming of RAG answers."""
+
+    def setUp(self):
+        from chatbot.caching import ANSWER_CACHE
+
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='streamengine', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Streaming',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+
+    @patch('chatbot.engine._get_query_classification')
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_rag_answer_streams_and_is_cached(self, mock_retrieve, mock_classify):
+        from chatbot.engine import get_chatbot_response, stream_chatbot_response
+
+        mock_retrieve.return_value = [MagicMock(page_content="Adam optimizer", metadata={})]
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_qa = MagicMock()
+        mock_qa.stream.return_value = iter(["It ", "uses ", "Adam."])
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            chunks = list(stream_chatbot_response("which optimizer?", self.workspace.id))
+
+        self.assertEqual(chunks, ["It ", "uses ", "Adam."])
+        mock_qa.invoke.assert_not_called()
+        # The completed stream is cached for later non-streaming requests.
+        self.assertEqual(get_chatbot_response("which optimizer?", self.workspace.id), "It uses Adam.")
+
+    def test_failed_stream_is_not_cached(self):
+        from chatbot.engine import StreamedAnswer
+
+        def chunks():
+            yield "Partial "
+            raise Exception("quota exceeded")
+
+        completed = []
+        answer = StreamedAnswer(chunks())
+        answer.on_complete(completed.append)
+        text = "".join(answer)
+
+        self.assertTrue(answer.failed)
+        self.assertIn("quota exceeded", text)
+        self.assertEqual(completed, [answer])
+
+    def test_close_hooks_run_when_consumer_stops_early(self):
+        from chatbot.engine import StreamedAnswer
+
+        closed = []
+        answer = StreamedAnswer(iter(["a", "b", "c"]))
+        answer.on_close(lambda: closed.append(True))
+        stream = iter(answer)
+        next(stream)
+        stream.close()
+
+        self.assertEqual(closed, [True])
+
+    def test_non_rag_routes_yield_whole_answer(self):
+        from chatbot.engine import stream_chatbot_response
+
+        self.workspace.processing_status = Workspace.ProcessingStatus.PROCESSING
+        self.workspace.save()
+        self.assertEqual(
+            list(stream_chatbot_response("anything", self.workspace.id)),
+            ["The chatbot is currently processing new documents..."],
+        )
+
+
+class AsyncEngineTestCase(TestCase):
+    """Test the async chatbot pipeline."""
+
+    def setUp(self):
+        from chatbot.caching import ANSWER_CACHE
+
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='asyncengine', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Async',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+
+    @patch('chatbot.engine._aget_query_classification')
+    @patch('chatbot.engine.get_cached_vector_store')
+    async def test_rag_awaits_search_and_generation(self, mock_get_store, mock_classify):
+        from unittest.mock import AsyncMock
+        from chatbot.engine import aget_chatbot_response
+
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_store = MagicMock()
+        mock_store.asimilarity_search = AsyncMock(return_value=[MagicMock(page_content="Adam optimizer", metadata={})])
+        mock_get_store.return_value = mock_store
+        mock_qa = MagicMock()
+        mock_qa.ainvoke = AsyncMock(return_value="It uses Adam.")
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answer = await aget_chatbot_response("which optimizer?", self.workspace.id)
+
+        self.assertEqual(answer, "It uses Adam.")
+        mock_store.asimilarity_search.assert_awaited_once_with("which optimizer?", k=5, filter=None)
+        mock_qa.invoke.assert_not_called()
+
+    @patch('chatbot.engine._aget_query_classification')
+    async def test_off_topic_uses_shared_router(self, mock_classify):
+        from chatbot.engine import aget_chatbot_response
+
+        mock_classify.return_value = {'intent': 'off_topic', 'doc_name': 'none'}
+        answer = await aget_chatbot_response("tell me a joke", self.workspace.id)
+        self.assertIn("cannot find", answer)
+
+    @patch('chatbot.engine._aget_query_classification')
+    @patch('chatbot.engine.get_cached_vector_store')
+    async def test_identical_concurrent_questions_share_one_run(self, mock_get_store, mock_classify):
+        import asyncio
+        from unittest.mock import AsyncMock
+        from chatbot.engine import aget_chatbot_response
+
+        async def slow_answer(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return "Shared."
+
+        mock_classify.return_value = {'intent': 'pdf_question', 'doc_name': 'all'}
+        mock_store = MagicMock()
+        mock_store.asimilarity_search = AsyncMock(return_value=[MagicMock(page_content="Adam", metadata={})])
+        mock_get_store.return_value = mock_store
+        mock_qa = MagicMock()
+        mock_qa.ainvoke = AsyncMock(side_effect=slow_answer)
+
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            answers = await asyncio.gather(
+                aget_chatbot_response("Which optimizer?", self.workspace.id),
+                aget_chatbot_response("  which   OPTIMIZER? ", self.workspace.id),
+            )
+
+        self.assertEqual(answers, ["Shared.", "Shared."])
+        self.assertEqual(mock_qa.ainvoke.await_count, 1)
+        self.assertEqual(mock_classify.await_count, 1)
+
+    async def test_missing_workspace(self):
+        from chatbot.engine import aget_chatbot_response
+
+        self.assertIn("does not exist", await aget_chatbot_response("hi", 999999))
@@ -0,0 +1,118 @@
+"""
+Tests for hedged LLM calls.
+"""
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from .hedging import Hedger, percentile
+
+
+def _warm(hedger, latency=0.01, samples=20):
+    """Give the hedger a latency history so it starts hedging."""
+    for _ in range(samples):
+        hedger._record_latency(latency)
+    hedger.calls = samples
+
+
+class HedgerTestCase(SimpleTestCase):
+    """Test hedge timing, winners, budgets and metrics."""
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 95))
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+
+    def test_no_hedging_without_budget_or_history(self):
+        self.assertIsNone(Hedger('qa', budget=0).hedge_delay())
+        self.assertIsNone(Hedger('qa', budget=0.5).hedge_delay())
+
+        hedger = Hedger('qa', budget=0.5, min_delay=0.05)
+        _warm(hedger, latency=0.2)
+        self.assertEqual(hedger.hedge_delay(), 0.2)
+
+    def test_slow_primary_is_hedged(self):
+        hedger = Hedger('qa', budget=0.5, min_delay=0.05)
+        _warm(hedger)
+        calls = []
+        lock = threading.Lock()
+
+        def invoke(inputs):
+            with lock:
+                calls.append(inputs)
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.01)
+            return "primary" if first else "hedge"
+
+        started = time.monotonic()
+        self.assertEqual(hedger.call(invoke, {"question": "q"}), "hedge")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(calls), 2)
+        stats = hedger.stats()
+        self.assertEqual(stats['hedged'], 1)
+        self.assertEqual(stats['hedge_wins'], 1)
+        self.assertEqual(stats['hedge_win_rate'], 1.0)
+
+    def test_fast_primary_is_not_hedged(self):
+        hedger = Hedger('qa', budget=0.5, min_delay=0.2)
+        _warm(hedger)
+
+        self.assertEqual(hedger.call(lambda: "answer"), "answer")
+        self.assertEqual(hedger.stats()['hedged'], 0)
+
+    def test_budget_limits_hedges(self):
+        hedger = Hedger('qa', budget=0.01, min_delay=0.05)
+        _warm(hedger)
+        calls = []
+
+        def invoke():
+            calls.append(1)
+            time.sleep(0.1)
+            return "answer"
+
+        self.assertEqual(hedger.call(invoke), "answer")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(hedger.stats()['over_budget'], 1)
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        hedger = Hedger('qa', budget=0.5, min_delay=0.05)
+        _warm(hedger)
+        calls = []
+
+        def invoke():
+            calls.append(1)
+            if len(calls) == 2:
+                raise ConnectionError("hedge failed")
+            time.sleep(0.2)
+            return "primary"
+
+        self.assertEqual(hedger.call(invoke), "primary")
+        self.assertEqual(hedger.stats()['hedge_wins'], 0)
+
+    def test_async_hedge_cancels_loser(self):
+        hedger = Hedger('classifier', budget=0.5, min_delay=0.05)
+        _warm(hedger)
+        cancelled = []
+        calls = []
+
+        async def ainvoke(inputs):
+            calls.append(inputs)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(1.0)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return "primary"
+            return "hedge"
+
+        async def run():
+            result = await hedger.acall(ainvoke, {"question": "q"})
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(run()), "hedge")
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(hedger.stats()['hedge_wins'], 1)
@@ -0,0 +1,111 @@
+"""
+Tests for the shared vector-search server.
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+from langchain_core.documents import Document
+
+from .index_server import (
+    IndexServerClient,
+    IndexServerUnavailable,
+    IndexStore,
+    SearchBatcher,
+    create_server,
+    get_index_server_client,
+)
+
+
+class FakeVectorStore:
+    def similarity_search_by_vector(self, vector, k=5, filter=None):
+        return [Document(page_content=f"hit for {vector[0]}", metadata={"pdf_id": 1, "filter": filter})]
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_queries(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class IndexServerTestCase(SimpleTestCase):
+    """Test the index server and client over a Unix socket."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpdir.name, 'workspace_index_1')
+        os.makedirs(self.index_path)
+        open(os.path.join(self.index_path, 'index.faiss'), 'wb').close()
+
+        self.loader = MagicMock(return_value=FakeVectorStore())
+        self.embeddings = FakeEmbeddings()
+        store = IndexStore(loader=self.loader, allowed_root=self.tmpdir.name)
+        batcher = SearchBatcher(store, embeddings_factory=lambda: self.embeddings, window=0.05)
+
+        self.address = f"unix:{os.path.join(self.tmpdir.name, 'index.sock')}"
+        self.server = create_server(self.address, batcher)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = IndexServerClient(self.address, timeout=5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_ping(self):
+        self.assertTrue(self.client.ping())
+
+    def test_search_returns_documents(self):
+        docs = self.client.search(self.index_path, 'abc', k=3, filter={'pdf_id': 1})
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].page_content, 'hit for 3.0')
+        self.assertEqual(docs[0].metadata['filter'], {'pdf_id': 1})
+
+    def test_index_loaded_once(self):
+        self.client.search(self.index_path, 'a')
+        self.client.search(self.index_path, 'b')
+        self.loader.assert_called_once()
+
+    def test_concurrent_queries_are_batched(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda q: self.client.search(self.index_path, q), ['a', 'bb', 'ccc', 'dddd']))
+        self.assertEqual(len(results), 4)
+        self.assertLess(len(self.embeddings.batches), 4)
+
+    def test_path_outside_root_is_rejected(self):
+        with self.assertRaises(IndexServerUnavailable):
+            self.client.search('/etc', 'a')
+
+
+class IndexServerFallbackTestCase(SimpleTestCase):
+    """Test that the engine searches in-process when the server is down."""
+
+    def test_unreachable_server_marks_down(self):
+        client = IndexServerClient('unix:/nonexistent/index.sock', retry_after=30)
+        with self.assertRaises(IndexServerUnavailable):
+            client.search('/tmp/index', 'a')
+        with patch('chatbot.index_server.socket.socket') as mock_socket:
+            with self.assertRaises(IndexServerUnavailable):
+                client.search('/tmp/index', 'a')
+            mock_socket.assert_not_called()
+
+    @override_settings(CHATBOT_INDEX_SERVER_ADDRESS='')
+    def test_no_client_without_address(self):
+        self.assertIsNone(get_index_server_client())
+
+    @override_settings(CHATBOT_INDEX_SERVER_ADDRESS='unix:/nonexistent/index.sock')
+    @patch('chatbot.engine.get_cached_vector_store')
+    def test_engine_falls_back_to_in_process_search(self, mock_get_store):
+        from chatbot.engine import _search_workspace_index
+
+        mock_get_store.return_value.similarity_search.return_value = ['local']
+        result = _search_workspace_index('/test/path', 'question', k=5)
+
+        self.assertEqual(result, ['local'])
+        mock_get_store.assert_called_once_with('/test/path')
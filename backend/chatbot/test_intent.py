@@ -0,0 +1,105 @@
+"""
+Tests for the local fast-path intent router.
+"""
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+
+from .intent import RouterStats, classify_locally
+
+
+class ClassifyLocallyTestCase(SimpleTestCase):
+    """Test rule-based intent scoring."""
+
+    def test_clear_summary_request(self):
+        result = classify_locally("Summarize the paper")
+        self.assertEqual(result['intent'], 'summary')
+        self.assertEqual(result['doc_name'], 'all')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+
+    def test_summary_hint_becomes_doc_name(self):
+        result = classify_locally("summary of attention pdf", doc_hint="attention")
+        self.assertEqual(result['intent'], 'summary')
+        self.assertEqual(result['doc_name'], 'attention')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+
+    def test_abstract_request(self):
+        result = classify_locally("abstract of bert", doc_hint="bert")
+        self.assertEqual(result['intent'], 'abstract')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+
+    def test_question_confident_when_terms_are_in_corpus(self):
+        result = classify_locally("What optimizer do they use?", corpus_coverage=1.0)
+        self.assertEqual(result['intent'], 'pdf_question')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+
+    def test_question_without_corpus_evidence_is_ambiguous(self):
+        result = classify_locally("What optimizer do they use?", corpus_coverage=0.0)
+        self.assertLess(result['confidence'], 0.8)
+
+    def test_off_topic_markers_are_left_to_llm(self):
+        self.assertLess(classify_locally("What is the capital of France?", corpus_coverage=0.5)['confidence'], 0.8)
+        self.assertLess(classify_locally("tell me a joke")['confidence'], 0.8)
+
+    def test_explicit_document_without_hint_is_ambiguous(self):
+        result = classify_locally("what does pdf2 say about the loss?", corpus_coverage=1.0)
+        self.assertLess(result['confidence'], 0.8)
+
+    def test_comparison_of_named_documents(self):
+        result = classify_locally("compare the methods in pdf1 and pdf2")
+        self.assertEqual(result['intent'], 'comparison')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+        self.assertEqual(classify_locally("how do both papers differ?")['intent'], 'comparison')
+
+    def test_comparison_without_documents_is_ambiguous(self):
+        self.assertLess(classify_locally("compare Adam with SGD")['confidence'], 0.8)
+
+    def test_summary_and_abstract_together_is_ambiguous(self):
+        self.assertLess(classify_locally("give the abstract and the summary")['confidence'], 0.8)
+
+    def test_router_stats(self):
+        stats = RouterStats()
+        stats.record(used_llm=False)
+        stats.record(used_llm=False)
+        stats.record(used_llm=True)
+        self.assertEqual(stats.as_dict()['local'], 2)
+        self.assertAlmostEqual(stats.as_dict()['avoided_ratio'], 2 / 3)
+        self.assertIn("2/3", stats.summary())
+
+
+@override_settings(CHATBOT_INTENT_CONFIDENCE_THRESHOLD=0.8)
+class EngineRoutingTestCase(SimpleTestCase):
+    """Test that the engine only calls the classifier LLM when needed."""
+
+    def test_confident_local_result_skips_llm(self):
+        from chatbot.engine import _get_query_classification
+
+        mock_chain = MagicMock()
+        with patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("Summarize the paper")
+
+        self.assertEqual(result, {'intent': 'summary', 'doc_name': 'all'})
+        mock_chain.invoke.assert_not_called()
+
+    def test_ambiguous_question_uses_llm(self):
+        from chatbot.engine import _get_query_classification
+
+        mock_chain = MagicMock()
+        mock_chain.invoke.return_value = {'intent': 'off_topic', 'doc_name': 'none'}
+        with patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("What is the capital of France?")
+
+        self.assertEqual(result['intent'], 'off_topic')
+        mock_chain.invoke.assert_called_once()
+
+    def test_corpus_coverage_from_lexical_index(self):
+        from chatbot.engine import _get_query_classification
+
+        lexical_index = MagicMock()
+        lexical_index.term_coverage.return_value = 1.0
+        mock_chain = MagicMock()
+        with patch('chatbot.engine.load_lexical_index', return_value=lexical_index), \
+                patch('chatbot.engine.CLASSIFIER_CHAIN', mock_chain), patch('chatbot.engine.LLM', MagicMock()):
+            result = _get_query_classification("Which optimizer is used?", index_path="/tmp/ws")
+
+        self.assertEqual(result['intent'], 'pdf_question')
+        mock_chain.invoke.assert_not_called()
@@ -0,0 +1,154 @@
+"""
+Tests for answering chatbot questions as background jobs.
+"""
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from unittest.mock import patch
+
+from workspaces.models import Workspace, WorkspaceMember
+from .consumer import ChatbotJobConsumer, job_group
+from .jobs import push_job, run_job
+from .models import AIChatMessage, ChatJob, ChatTrace
+from .scheduler import SchedulerBusy
+from .tasks import answer_chat_job_task
+
+
+class ChatJobTestCase(TestCase):
+    """Test job submission, the worker and polling."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='jobuser', password='testpass123')
+        self.other = User.objects.create_user(username='otheruser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Jobs', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        self.client.login(username='jobuser', password='testpass123')
+
+    def _submit(self, question='/ai What optimizer is used?'):
+        return self.client.post('/api/chatbot/ask/', json.dumps({
+            'question': question,
+            'workspace_id': self.workspace.id,
+            'mode': 'job',
+        }), content_type='application/json')
+
+    @patch('chatbot.views.get_chatbot_response')
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_submit_returns_job_id(self, mock_task, mock_get_response):
+        response = self._submit()
+
+        self.assertEqual(response.status_code, 202)
+        data = json.loads(response.content)
+        job = ChatJob.objects.get(id=data['job_id'])
+        self.assertEqual(data['status'], 'queued')
+        self.assertEqual(data['poll_url'], f'/api/chatbot/jobs/{job.id}/')
+        self.assertEqual(job.prompt, 'What optimizer is used?')
+        self.assertEqual(job.question_message.message, '/ai What optimizer is used?')
+        mock_task.assert_called_once_with(str(job.id))
+        mock_get_response.assert_not_called()
+
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_reviewers_cannot_submit(self, mock_task):
+        reviewer = User.objects.create_user(username='jobreviewer', password='testpass123')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=reviewer, role=WorkspaceMember.Role.REVIEWER)
+        self.client.login(username='jobreviewer', password='testpass123')
+
+        self.assertEqual(self._submit().status_code, 403)
+        self.assertFalse(ChatJob.objects.exists())
+        mock_task.assert_not_called()
+
+    @patch('chatbot.jobs.get_chatbot_response', return_value="Adam.")
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_worker_answers_and_pushes(self, mock_task, mock_get_response):
+        job_id = json.loads(self._submit().content)['job_id']
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(job_group(self.user.id), channel)
+
+        run_job(job_id)
+
+        job = ChatJob.objects.get(id=job_id)
+        self.assertEqual(job.status, ChatJob.Status.DONE)
+        self.assertEqual(job.answer_message.message, "Adam.")
+        self.assertIsNotNone(job.finished_at)
+        self.assertTrue(ChatTrace.objects.filter(endpoint='job', answer_message=job.answer_message).exists())
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event['type'], 'chatbot_job')
+        self.assertEqual(event['data']['type'], 'chatbot_answer')
+        self.assertEqual(event['data']['job_id'], job_id)
+        self.assertEqual(event['data']['ai_answer'], "Adam.")
+
+        response = self.client.get(f'/api/chatbot/jobs/{job_id}/')
+        self.assertEqual(json.loads(response.content)['ai_answer'], "Adam.")
+
+    @patch('chatbot.jobs.get_chatbot_response', side_effect=RuntimeError("LLM down"))
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_worker_error_fails_job(self, mock_task, mock_get_response):
+        job_id = json.loads(self._submit().content)['job_id']
+
+        run_job(job_id)
+
+        job = ChatJob.objects.get(id=job_id)
+        self.assertEqual(job.status, ChatJob.Status.FAILED)
+        self.assertEqual(job.error, "LLM down")
+        self.assertIn("LLM down", job.answer_message.message)
+
+    @patch('chatbot.jobs.get_chatbot_response', side_effect=SchedulerBusy(3, 12))
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_busy_scheduler_requeues(self, mock_task, mock_get_response):
+        job_id = json.loads(self._submit().content)['job_id']
+
+        with patch('chatbot.tasks.answer_chat_job_task') as mock_retry:
+            answer_chat_job_task.now(job_id)
+
+        mock_retry.assert_called_once_with(job_id, schedule=12)
+        job = ChatJob.objects.get(id=job_id)
+        self.assertEqual(job.status, ChatJob.Status.QUEUED)
+        self.assertFalse(AIChatMessage.objects.filter(is_from_bot=True).exists())
+
+    @patch('chatbot.views.answer_chat_job_task')
+    def test_poll_pending_and_other_users(self, mock_task):
+        job_id = json.loads(self._submit().content)['job_id']
+
+        data = json.loads(self.client.get(f'/api/chatbot/jobs/{job_id}/').content)
+        self.assertEqual(data['status'], 'queued')
+        self.assertNotIn('ai_answer', data)
+
+        self.client.login(username='otheruser', password='testpass123')
+        self.assertEqual(self.client.get(f'/api/chatbot/jobs/{job_id}/').status_code, 404)
+
+
+class ChatbotJobConsumerTestCase(TestCase):
+    """Test that finished jobs reach the job socket and not the notification socket."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobsocketuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Job socket', created_by=self.user)
+
+    def test_push_reaches_job_socket_only(self):
+        job = ChatJob.objects.create(user=self.user, workspace=self.workspace, prompt='Which optimizer?')
+        channel_layer = get_channel_layer()
+        notifications = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{self.user.id}", notifications)
+
+        async def receive_push():
+            communicator = WebsocketCommunicator(ChatbotJobConsumer.as_asgi(), "/ws/chatbot/jobs/")
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await sync_to_async(push_job)(job)
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(receive_push)()
+
+        self.assertEqual(message['type'], 'chatbot_answer')
+        self.assertEqual(message['job_id'], str(job.id))
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(channel_layer.receive(notifications), 0.1)
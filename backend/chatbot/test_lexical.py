@@ -0,0 +1,195 @@
+"""
+Tests for the BM25 keyword index and hybrid retrieval.
+"""
+import os
+import tempfile
+import threading
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest.mock import patch, MagicMock
+from langchain_core.documents import Document
+
+from workspaces.models import Workspace
+
+from .lexical import (
+    LEXICAL_INDEX_FILENAME,
+    LexicalIndex,
+    is_decisive,
+    load_lexical_index,
+    reciprocal_rank_fusion,
+    tokenize,
+    update_lexical_index,
+)
+
+
+def _doc(text, pdf_id=1, page=0):
+    return Document(page_content=text, metadata={"pdf_id": pdf_id, "page": page})
+
+
+class LexicalIndexTestCase(SimpleTestCase):
+    """Test BM25 indexing and search."""
+
+    def setUp(self):
+        self.index = LexicalIndex()
+        self.index.add_documents([
+            _doc("Vaswani et al. introduced the Transformer architecture.", pdf_id=1, page=0),
+            _doc("Adam is an adaptive learning rate optimizer.", pdf_id=1, page=1),
+            _doc("Equation 3 defines the attention score.", pdf_id=2, page=0),
+            _doc("Query optimizers choose join orders.", pdf_id=2, page=1),
+        ])
+
+    def test_tokenize_drops_stopwords(self):
+        self.assertEqual(tokenize("What is the BLEU score of GPT-2?"), ['bleu', 'score', 'gpt', '2'])
+
+    def test_search_ranks_exact_term_first(self):
+        results, coverage = self.index.search("who is Vaswani", k=2)
+        self.assertEqual(len(results), 1)
+        self.assertIn("Vaswani", results[0][0].page_content)
+        self.assertEqual(coverage, 1.0)
+
+    def test_search_respects_filter(self):
+        results, _ = self.index.search("attention transformer", k=5, filter={"pdf_id": 2})
+        self.assertEqual([doc.metadata["pdf_id"] for doc, _ in results], [2])
+
+    def test_search_without_matches(self):
+        self.assertEqual(self.index.search("photosynthesis"), ([], 0))
+
+    def test_term_coverage(self):
+        self.assertEqual(self.index.term_coverage("Which optimizer chooses join orders?"), 0.75)
+        self.assertEqual(self.index.term_coverage("the"), 0.0)
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            self.index.save(index_path)
+            loaded = LexicalIndex.load(index_path)
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(loaded.search("adam")[0][0][0].page_content, self.index.search("adam")[0][0][0].page_content)
+
+    def test_load_lexical_index_missing(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            self.assertIsNone(load_lexical_index(index_path))
+
+
+class UpdateLexicalIndexTestCase(SimpleTestCase):
+    """Test ingestion-time index updates."""
+
+    def test_new_index_is_created_and_extended(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            update_lexical_index(index_path, [_doc("first chunk")], had_existing_index=False)
+            update_lexical_index(index_path, [_doc("second chunk")], had_existing_index=True)
+            self.assertEqual(len(LexicalIndex.load(index_path)), 2)
+
+    def test_legacy_index_is_not_partially_indexed(self):
+        with tempfile.TemporaryDirectory() as index_path:
+            result = update_lexical_index(index_path, [_doc("chunk")], had_existing_index=True)
+            self.assertIsNone(result)
+            self.assertFalse(os.path.exists(os.path.join(index_path, LEXICAL_INDEX_FILENAME)))
+
+    def test_legacy_index_is_built_from_the_vector_store(self):
+        stored = {"a": _doc("older chunk"), "b": _doc("new chunk")}
+        vectorstore = MagicMock()
+        vectorstore.index_to_docstore_id = {0: "a", 1: "b"}
+        vectorstore.docstore.search.side_effect = stored.get
+
+        with tempfile.TemporaryDirectory() as index_path:
+            update_lexical_index(index_path, [stored["b"]], had_existing_index=True, vectorstore=vectorstore)
+            index = LexicalIndex.load(index_path)
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search("older", k=1)[0][0][0].page_content, "older chunk")
+        # Chunks indexed without a chunk_id are named by their docstore id, as vector search reports them.
+        self.assertEqual(index.search("older", k=1)[0][0][0].metadata["chunk_id"], "a")
+
+
+class AsyncHybridRetrievalTestCase(SimpleTestCase):
+    """Test that async retrieval keeps keyword index loading off the event loop."""
+
+    @patch('chatbot.engine._lexical_candidates')
+    async def test_keyword_search_runs_in_a_worker_thread(self, mock_lexical):
+        from chatbot.engine import _aretrieve_chunks
+
+        loop_thread = threading.get_ident()
+        threads = []
+
+        def candidates(*args):
+            threads.append(threading.get_ident())
+            return [(_doc("Vaswani"), 9.0)], [_doc("Vaswani")]
+        mock_lexical.side_effect = candidates
+
+        docs = await _aretrieve_chunks("/unused", "Vaswani", k=5)
+
+        self.assertEqual(docs[0].page_content, "Vaswani")
+        self.assertNotEqual(threads, [loop_thread])
+
+
+class BackfillCommandTestCase(TestCase):
+    """Test backfilling keyword indexes for workspaces indexed before them."""
+
+    def setUp(self):
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.index_path = index_dir.name
+        open(os.path.join(self.index_path, "index.faiss"), "wb").close()
+        user = User.objects.create_user(username='backfilluser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Backfill',
+            created_by=user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path=self.index_path,
+        )
+
+    @patch('chatbot.engine.load_models')
+    @patch('chatbot.engine.get_cached_vector_store')
+    def test_builds_missing_indexes_once(self, mock_get_store, mock_load_models):
+        mock_get_store.return_value.index_to_docstore_id = {0: "a"}
+        mock_get_store.return_value.docstore.search.return_value = _doc("Vaswani et al.")
+
+        call_command('backfill_lexical_indexes', stdout=StringIO())
+        call_command('backfill_lexical_indexes', stdout=StringIO())
+
+        mock_get_store.assert_called_once_with(self.index_path)
+        self.assertEqual(len(LexicalIndex.load(self.index_path)), 1)
+
+
+class HybridRetrievalTestCase(SimpleTestCase):
+    """Test fusion and the decisive keyword shortcut."""
+
+    @override_settings(CHATBOT_LEXICAL_DECISIVE_SCORE=5.0, CHATBOT_LEXICAL_DECISIVE_MARGIN=1.5)
+    def test_is_decisive(self):
+        self.assertTrue(is_decisive([(_doc("a"), 9.0), (_doc("b"), 3.0)], 1.0))
+        self.assertFalse(is_decisive([(_doc("a"), 9.0), (_doc("b"), 8.0)], 1.0))
+        self.assertFalse(is_decisive([(_doc("a"), 4.0)], 1.0))
+        self.assertFalse(is_decisive([(_doc("a"), 9.0)], 0.5))
+        self.assertFalse(is_decisive([], 0))
+
+    def test_reciprocal_rank_fusion_prefers_shared_documents(self):
+        shared = _doc("shared", page=1)
+        fused = reciprocal_rank_fusion([[_doc("vector only"), shared], [shared, _doc("keyword only")]], k=3)
+        self.assertEqual(fused[0].page_content, "shared")
+        self.assertEqual(len(fused), 3)
+
+    @override_settings(CHATBOT_LEXICAL_DECISIVE_SCORE=0.1, CHATBOT_LEXICAL_DECISIVE_MARGIN=1.0)
+    @patch('chatbot.engine._search_workspace_index')
+    def test_decisive_match_skips_vector_search(self, mock_vector_search):
+        from chatbot.engine import _retrieve_chunks
+
+        with tempfile.TemporaryDirectory() as index_path:
+            update_lexical_index(index_path, [_doc("Vaswani wrote this"), _doc("unrelated text")], False)
+            docs = _retrieve_chunks(index_path, "Vaswani", k=5)
+
+        self.assertIn("Vaswani", docs[0].page_content)
+        mock_vector_search.assert_not_called()
+
+    @patch('chatbot.engine._search_workspace_index')
+    def test_weak_match_is_fused_with_vector_results(self, mock_vector_search):
+        from chatbot.engine import _retrieve_chunks
+
+        mock_vector_search.return_value = [_doc("vector hit", page=9)]
+        with tempfile.TemporaryDirectory() as index_path:
+            update_lexical_index(index_path, [_doc("attention is all you need"), _doc("attention heads")], False)
+            docs = _retrieve_chunks(index_path, "attention mechanism", k=5)
+
+        mock_vector_search.assert_called_once()
+        self.assertEqual({doc.page_content for doc in docs}, {"vector hit", "attention is all you need", "attention heads"})
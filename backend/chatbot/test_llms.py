@@ -0,0 +1,121 @@
+"""
+Tests for per-chain model settings and chain metrics.
+"""
+import uuid
+
+from django.test import SimpleTestCase, override_settings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from unittest.mock import patch, MagicMock
+
+from . import engine
+from .llms import ChainMetrics, ChainMetricsHandler, chain_config, metered, token_usage
+
+TIERED = {
+    'classifier': {'model': 'gemini-flash-lite-latest', 'temperature': 0.0, 'timeout': 10.0},
+    'abstract': {'model': 'gemini-flash-lite-latest', 'temperature': 0.0, 'timeout': 10.0},
+}
+
+
+@override_settings(CHATBOT_LLM_MODEL='gemini-flash-latest', CHATBOT_LLM_TEMPERATURE=0.2, CHATBOT_LLM_TIMEOUT=30.0)
+class ChainConfigTestCase(SimpleTestCase):
+    """Test per-chain model selection."""
+
+    @override_settings(CHATBOT_CHAIN_LLMS=TIERED)
+    def test_chain_overrides_and_defaults(self):
+        self.assertEqual(chain_config('classifier')['model'], 'gemini-flash-lite-latest')
+        self.assertEqual(chain_config('classifier')['temperature'], 0.0)
+        self.assertEqual(chain_config('qa'), {'model': 'gemini-flash-latest', 'temperature': 0.2, 'timeout': 30.0})
+
+    @override_settings(CHATBOT_CHAIN_LLMS=TIERED)
+    @patch('chatbot.engine.build_chat_model')
+    def test_chains_with_the_same_settings_share_a_client(self, mock_build):
+        mock_build.side_effect = lambda config: MagicMock(name=config['model'])
+        with patch.object(engine, '_CHAT_LLMS', {}):
+            self.assertIs(engine._chat_llm('classifier'), engine._chat_llm('abstract'))
+            self.assertIs(engine._chat_llm('qa'), engine._chat_llm())
+            self.assertIsNot(engine._chat_llm('classifier'), engine._chat_llm('qa'))
+
+        self.assertEqual(mock_build.call_count, 2)
+
+    @override_settings(CHATBOT_CHAIN_LLMS=TIERED)
+    @patch('chatbot.engine.load_models')
+    def test_default_tier_chains_use_llm(self, mock_load_models):
+        llm, lite = MagicMock(), MagicMock()
+        with patch('chatbot.engine.LLM', llm), patch('chatbot.engine._chat_llm', return_value=lite):
+            engine._chain_llm('summary')
+            engine._chain_llm('abstract')
+
+        llm.with_config.assert_called_once()
+        lite.with_config.assert_called_once()
+
+
+class ChainMetricsTestCase(SimpleTestCase):
+    """Test latency and token accounting per chain."""
+
+    def test_metered_chain_records_calls(self):
+        metrics = ChainMetrics()
+        llm = FakeListChatModel(responses=["intent: summary"]).with_config(
+            callbacks=[ChainMetricsHandler('classifier', metrics)]
+        )
+        chain = ChatPromptTemplate.from_template("{question}") | llm | StrOutputParser()
+
+        self.assertEqual(chain.invoke({"question": "summarize"}), "intent: summary")
+        stats = metrics.stats()['classifier']
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertIsNotNone(stats['p95_seconds'])
+
+    def test_errors_are_counted(self):
+        metrics = ChainMetrics()
+        handler = ChainMetricsHandler('qa', metrics)
+        run_id = uuid.uuid4()
+        handler.on_chat_model_start({}, [], run_id=run_id)
+        handler.on_llm_error(ConnectionError("down"), run_id=run_id)
+
+        self.assertEqual(metrics.stats()['qa']['errors'], 1)
+
+    def test_token_usage(self):
+        message = AIMessage(
+            content="answer", usage_metadata={'input_tokens': 120, 'output_tokens': 30, 'total_tokens': 150}
+        )
+        result = LLMResult(generations=[[ChatGeneration(message=message)]])
+        self.assertEqual(token_usage(result), (120, 30))
+
+        metrics = ChainMetrics()
+        handler = ChainMetricsHandler('qa', metrics)
+        run_id = uuid.uuid4()
+        handler.on_chat_model_start({}, [], run_id=run_id)
+        handler.on_llm_end(result, run_id=run_id)
+        stats = metrics.stats()['qa']
+        self.assertEqual((stats['input_tokens'], stats['output_tokens']), (120, 30))
+        self.assertEqual(stats['avg_output_tokens'], 30.0)
+
+    def test_metered_none(self):
+        self.assertIsNone(metered(None, 'qa'))
+
+
+class DeadlineBoundChatModelTestCase(SimpleTestCase):
+    """Test that deadline-bounded calls pass their remaining time to the request."""
+
+    def test_request_timeout_follows_the_deadline(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from langchain_core.outputs import ChatResult
+
+        from .deadlines import call_with_timeout
+        from .llms import _chat_model_class
+
+        result = ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+        with patch.object(ChatGoogleGenerativeAI, '_generate', return_value=result) as mock_generate:
+            llm = _chat_model_class()(model='gemini-flash-latest', google_api_key='test-key', timeout=30.0)
+
+            self.assertEqual(call_with_timeout(5.0, llm.invoke, "hi").content, "ok")
+            timeout = mock_generate.call_args.kwargs['timeout']
+            self.assertGreater(timeout, 4.0)
+            self.assertLessEqual(timeout, 5.0)
+
+            llm.invoke("hi")
+            self.assertNotIn('timeout', mock_generate.call_args.kwargs)
@@ -0,0 +1,146 @@
+"""
+Tests for the bounded conversational memory.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from unittest.mock import patch, MagicMock
+
+from workspaces.models import Workspace
+from .caching import ANSWER_CACHE
+from .memory import MEMORY_CACHE, load_memory, looks_like_follow_up
+from .models import AIChatMessage
+
+
+class MemoryTestCase(TestCase):
+    """Test building and folding the per-chat memory."""
+
+    def setUp(self):
+        MEMORY_CACHE.clear()
+        self.user = User.objects.create_user(username='memoryuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Memory', created_by=self.user)
+
+    def _turn(self, question, answer):
+        AIChatMessage.objects.create(user=self.user, workspace=self.workspace, message=question)
+        AIChatMessage.objects.create(user=self.user, workspace=self.workspace, message=answer, is_from_bot=True)
+
+    def test_follow_up_detection(self):
+        self.assertTrue(looks_like_follow_up("and in the second paper?"))
+        self.assertTrue(looks_like_follow_up("Why does it converge faster?"))
+        self.assertTrue(looks_like_follow_up("what about pdf2"))
+        self.assertFalse(looks_like_follow_up("Which optimizer is used to train the transformer model?"))
+
+    def test_self_contained_questions_are_not_follow_ups(self):
+        for question in (
+            "What is the main contribution of this paper?",
+            "What are the limitations of these methods?",
+            "How does the model handle long inputs and why does it fail on them?",
+            "Does pdf1 also report results on ImageNet?",
+            "Which paper uses more training data?",
+            "Summarize pdf2 too",
+            "Summarize the paper",
+        ):
+            with self.subTest(question=question):
+                self.assertFalse(looks_like_follow_up(question))
+
+    def test_dangling_references_are_follow_ups(self):
+        for question in ("What does that mean?", "Explain this", "Which one?", "Does it beat the baseline?"):
+            with self.subTest(question=question):
+                self.assertTrue(looks_like_follow_up(question))
+
+    def test_pending_question_is_not_a_turn(self):
+        self._turn("Which optimizer does pdf1 use?", "Adam.")
+        AIChatMessage.objects.create(user=self.user, workspace=self.workspace, message="and pdf2?")
+
+        memory = load_memory(self.user.id, self.workspace.id)
+
+        self.assertEqual(memory.turns, (("Which optimizer does pdf1 use?", "Adam."),))
+        self.assertEqual(memory.summary, '')
+
+    @override_settings(CHATBOT_MEMORY_RECENT_TURNS=2, CHATBOT_MEMORY_SUMMARY_CHARS=200)
+    def test_memory_stays_bounded_and_updates_incrementally(self):
+        summarize = MagicMock(side_effect=lambda summary, turns: f"{summary} {len(turns)} turns".strip())
+        for i in range(3):
+            self._turn(f"question {i}", f"answer {i}")
+
+        memory = load_memory(self.user.id, self.workspace.id, summarize)
+        self.assertEqual([question for question, _ in memory.turns], ["question 2"])
+        self.assertEqual(memory.summary, "2 turns")
+
+        with self.assertNumQueries(1):
+            self.assertIs(load_memory(self.user.id, self.workspace.id, summarize), memory)
+
+        for i in range(3, 20):
+            self._turn(f"question {i}", "x" * 2000)
+            memory = load_memory(self.user.id, self.workspace.id, summarize)
+            self.assertLessEqual(len(memory.turns), 2)
+            self.assertLessEqual(len(memory.text()), 200 + 2 * 1300)
+
+        self.assertEqual(memory.turns[-1][0], "question 19")
+        self.assertEqual(summarize.call_count, 9)
+
+    @override_settings(CHATBOT_MEMORY_RECENT_TURNS=2, CHATBOT_MEMORY_SUMMARY_CHARS=200)
+    def test_every_turn_since_the_last_load_is_folded(self):
+        folded = []
+        summarize = MagicMock(side_effect=lambda summary, turns: folded.extend(turns) or f"{summary} folded".strip())
+        self._turn("question 0", "answer 0")
+        load_memory(self.user.id, self.workspace.id, summarize)
+        for i in range(1, 15):
+            self._turn(f"question {i}", f"answer {i}")
+
+        memory = load_memory(self.user.id, self.workspace.id, summarize)
+
+        self.assertEqual([question for question, _ in memory.turns], ["question 14"])
+        self.assertEqual([question for question, _ in folded], [f"question {i}" for i in range(14)])
+        self.assertLessEqual(len(memory.summary), 200)
+
+
+class EngineMemoryTestCase(TestCase):
+    """Test follow-up rewriting in the engine."""
+
+    def setUp(self):
+        MEMORY_CACHE.clear()
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='followup', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Follow ups',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+        AIChatMessage.objects.create(user=self.user, workspace=self.workspace, message="Which optimizer does pdf1 use?")
+        AIChatMessage.objects.create(user=self.user, workspace=self.workspace, message="Adam.", is_from_bot=True)
+
+    @patch('chatbot.engine._answer_and_cache', return_value="SGD.")
+    @patch('chatbot.engine._chain_llm')
+    def test_follow_up_is_answered_as_standalone_question(self, mock_chain_llm, mock_answer):
+        from chatbot.engine import get_chatbot_response
+
+        mock_chain_llm.return_value = FakeListChatModel(responses=["Which optimizer does pdf2 use?"])
+
+        self.assertEqual(get_chatbot_response("and in pdf2?", self.workspace.id, user_id=self.user.id), "SGD.")
+
+        mock_chain_llm.assert_called_with('memory')
+        self.assertEqual(mock_answer.call_args[0][0], "Which optimizer does pdf2 use?")
+
+    @patch('chatbot.engine._answer_and_cache', return_value="Adam.")
+    @patch('chatbot.engine._chain_llm')
+    def test_standalone_question_skips_memory(self, mock_chain_llm, mock_answer):
+        from chatbot.engine import get_chatbot_response
+
+        question = "Which optimizer is used to train the transformer model?"
+        get_chatbot_response(question, self.workspace.id, user_id=self.user.id)
+
+        mock_chain_llm.assert_not_called()
+        self.assertEqual(mock_answer.call_args[0][0], question)
+
+    @override_settings(CHATBOT_MEMORY=False)
+    @patch('chatbot.engine._answer_and_cache', return_value="Adam.")
+    @patch('chatbot.engine._chain_llm')
+    def test_memory_can_be_disabled(self, mock_chain_llm, mock_answer):
+        from chatbot.engine import get_chatbot_response
+
+        get_chatbot_response("and in pdf2?", self.workspace.id, user_id=self.user.id)
+
+        mock_chain_llm.assert_not_called()
+        self.assertEqual(mock_answer.call_args[0][0], "and in pdf2?")
@@ -0,0 +1,180 @@
+"""
+Tests for the chatbot pipeline scheduler.
+"""
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from .scheduler import FairScheduler, SchedulerBusy, parse_weights
+
+
+class FairSchedulerTestCase(SimpleTestCase):
+    """Test admission, fair ordering and busy rejection."""
+
+    def _busy_scheduler(self, **kwargs):
+        """A scheduler whose only slot is taken, so new requests queue."""
+        scheduler = FairScheduler(max_concurrent=1, queue_timeout=1000, **kwargs)
+        return scheduler, scheduler.acquire('held')
+
+    def test_free_slot_starts_immediately(self):
+        scheduler = FairScheduler(max_concurrent=2)
+        with scheduler.acquire(1, 10):
+            self.assertEqual(scheduler.stats()['active'], 1)
+        self.assertEqual(scheduler.stats()['active'], 0)
+
+    def test_release_is_idempotent(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        slot = scheduler.acquire(1)
+        slot.release()
+        slot.release()
+        self.assertEqual(scheduler.active, 0)
+
+    def test_workspaces_take_turns(self):
+        scheduler, _ = self._busy_scheduler()
+        for _ in range(3):
+            scheduler._admit('A', 1)
+        scheduler._admit('B', 2)
+
+        self.assertEqual([w.workspace_id for w in scheduler._order()], ['A', 'B', 'A', 'A'])
+        self.assertEqual(scheduler.queue_positions(2), [{'workspace_id': 'B', 'position': 2}])
+
+    def test_users_take_turns_within_workspace(self):
+        scheduler, _ = self._busy_scheduler()
+        scheduler._admit('A', 1)
+        scheduler._admit('A', 1)
+        scheduler._admit('A', 2)
+
+        self.assertEqual([w.user_id for w in scheduler._order()], [1, 2, 1])
+
+    def test_workspace_weights(self):
+        scheduler, _ = self._busy_scheduler(workspace_weights={'A': 2.0})
+        for _ in range(4):
+            scheduler._admit('A', 1)
+        for _ in range(2):
+            scheduler._admit('B', 2)
+
+        self.assertEqual([w.workspace_id for w in scheduler._order()], ['A', 'B', 'A', 'A', 'B', 'A'])
+
+    def test_user_weights(self):
+        scheduler, _ = self._busy_scheduler(user_weights={1: 2.0})
+        for _ in range(4):
+            scheduler._admit('A', 1)
+        for _ in range(2):
+            scheduler._admit('A', 2)
+
+        self.assertEqual([w.user_id for w in scheduler._order()], [1, 2, 1, 1, 2, 1])
+
+    def test_release_grants_in_fair_order(self):
+        scheduler, held = self._busy_scheduler()
+        first = scheduler._admit('A', 1)
+        second = scheduler._admit('A', 1)
+        other = scheduler._admit('B', 2)
+
+        held.release()
+        self.assertTrue(first.granted)
+        scheduler._release(0.0)
+        self.assertTrue(other.granted)
+        self.assertFalse(second.granted)
+
+    def test_idle_workspace_does_not_bank_credit(self):
+        scheduler, held = self._busy_scheduler()
+        for _ in range(3):
+            scheduler._admit('A', 1)
+        held.release()
+        scheduler._release(0.0)
+        # 'A' has run twice; a newcomer joins at the current virtual time, not at
+        # zero, so it gets the next turn but cannot then monopolise the slot.
+        scheduler._admit('B', 2)
+        scheduler._admit('B', 2)
+        self.assertEqual([w.workspace_id for w in scheduler._order()], ['B', 'A', 'B'])
+
+    def test_idle_workspaces_and_users_are_forgotten(self):
+        scheduler = FairScheduler(max_concurrent=1, queue_timeout=1000)
+        held = scheduler.acquire('held', 0)
+        waiters = [threading.Thread(target=lambda ws=ws: scheduler.acquire(ws, ws).release()) for ws in range(20)]
+        for thread in waiters:
+            thread.start()
+        while scheduler.stats()['queued'] < 20:
+            threading.Event().wait(0.01)
+
+        held.release()
+        for thread in waiters:
+            thread.join(5)
+
+        self.assertEqual(scheduler.stats()['active'], 0)
+        self.assertEqual(scheduler._workspace_vtime, {})
+        self.assertEqual(scheduler._user_vtime, {})
+        self.assertEqual(scheduler._user_floor, {})
+
+    def test_running_workspace_keeps_its_share(self):
+        scheduler, held = self._busy_scheduler()
+        scheduler._admit('A', 1)
+        held.release()
+
+        # 'A' is still running, so the virtual time it was charged is kept.
+        self.assertEqual(scheduler._workspace_vtime, {'A': 1.0})
+
+    def test_fast_busy_rejection(self):
+        scheduler = FairScheduler(max_concurrent=1, queue_timeout=8, initial_service_time=5)
+        scheduler.acquire('A')
+        scheduler._admit('A', 1)  # ~5s: fits
+
+        with self.assertRaises(SchedulerBusy) as ctx:
+            scheduler.acquire('B', 2)  # ~10s: cannot meet the deadline
+        self.assertEqual(ctx.exception.queue_position, 2)
+        self.assertEqual(ctx.exception.retry_after, 10)
+        self.assertEqual(scheduler.stats()['rejected'], 1)
+
+    def test_queue_deadline(self):
+        scheduler, _ = self._busy_scheduler()
+        with self.assertRaises(SchedulerBusy):
+            scheduler.acquire('A', 1, timeout=0.05)
+        self.assertEqual(scheduler.stats()['queued'], 0)
+        self.assertEqual(scheduler.stats()['timed_out'], 1)
+
+    def test_blocking_acquire_is_woken(self):
+        scheduler, held = self._busy_scheduler()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(scheduler.acquire('A', 1)))
+        thread.start()
+        while not scheduler.stats()['queued']:
+            threading.Event().wait(0.01)
+        held.release()
+        thread.join(5)
+
+        self.assertEqual(len(acquired), 1)
+        self.assertEqual(scheduler.active, 1)
+
+    def test_async_acquire(self):
+        scheduler, held = self._busy_scheduler()
+
+        async def main():
+            waiter = asyncio.ensure_future(scheduler.aacquire('A', 1))
+            await asyncio.sleep(0.01)
+            self.assertEqual(scheduler.stats()['queued'], 1)
+            held.release()
+            return await waiter
+
+        slot = asyncio.run(main())
+        self.assertEqual(scheduler.active, 1)
+        slot.release()
+        self.assertEqual(scheduler.active, 0)
+
+    def test_cancelled_async_waiter_leaves_queue(self):
+        scheduler, _ = self._busy_scheduler()
+
+        async def main():
+            waiter = asyncio.ensure_future(scheduler.aacquire('A', 1))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(main())
+        self.assertEqual(scheduler.stats()['queued'], 0)
+        self.assertEqual(scheduler.active, 1)
+
+    def test_parse_weights(self):
+        self.assertEqual(parse_weights("12:2, 15:0.5,bad,7:0"), {12: 2.0, 15: 0.5})
+        self.assertEqual(parse_weights(''), {})
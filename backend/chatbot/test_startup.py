@@ -0,0 +1,99 @@
+"""
+Tests for lazy model loading and the import-time budget.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from unittest.mock import patch, MagicMock
+
+from chatbot import engine
+
+# django.setup() measured ~0.3s once the LangChain stack became lazy (~1.8s before).
+IMPORT_BUDGET_SECONDS = 1.0
+
+HEAVY_MODULES = [
+    'langchain_core',
+    'langchain_google_genai',
+    'langchain_cohere',
+    'langchain_community',
+    'langchain_text_splitters',
+    'faiss',
+]
+
+SETUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+class ImportBudgetTestCase(SimpleTestCase):
+    """django.setup() must not import or build the chatbot's LangChain stack."""
+
+    def test_django_setup_is_fast(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='genscholar.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', SETUP_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(report['loaded'], [])
+        self.assertLess(report['elapsed'], IMPORT_BUDGET_SECONDS)
+
+
+class LazyModelsTestCase(SimpleTestCase):
+    """Test on-demand construction of the models and chains."""
+
+    def _unloaded(self):
+        return patch.multiple(
+            engine,
+            EMBEDDINGS=engine._NOT_LOADED,
+            LLM=engine._NOT_LOADED,
+            CLASSIFIER_CHAIN=engine._NOT_LOADED,
+            QA_CHAIN=engine._NOT_LOADED,
+        )
+
+    @patch('chatbot.engine._chat_llm', return_value=None)
+    @patch('chatbot.engine.load_embeddings')
+    def test_load_models_builds_once(self, mock_load_embeddings, mock_chat_llm):
+        embeddings = MagicMock()
+        mock_load_embeddings.return_value = (embeddings, 'cohere:test')
+
+        with self._unloaded():
+            engine.load_models()
+            engine.load_models()
+            self.assertIs(engine.EMBEDDINGS, embeddings)
+            self.assertIsNone(engine.LLM)
+            self.assertIsNone(engine.QA_CHAIN)
+            self.assertIsNone(engine.CLASSIFIER_CHAIN)
+
+        mock_load_embeddings.assert_called_once()
+
+    @patch('chatbot.engine._chat_llm', return_value=None)
+    @patch('chatbot.engine.load_embeddings', return_value=(None, 'cohere:test'))
+    def test_patched_models_are_left_alone(self, mock_load_embeddings, mock_chat_llm):
+        llm = MagicMock()
+        with self._unloaded(), patch('chatbot.engine.LLM', llm):
+            engine.load_models()
+            self.assertIs(engine.LLM, llm)
+
+    @patch('chatbot.engine.FAISS')
+    @patch('chatbot.engine.load_models')
+    def test_warm_up(self, mock_load_models, mock_faiss):
+        engine.warm_up()
+        mock_load_models.assert_called_once()
+        mock_faiss.load.assert_called_once()
+
+    def test_lazy_class_imports_on_use(self):
+        lazy = engine._LazyClass('collections', 'OrderedDict')
+        self.assertEqual(lazy(a=1), {'a': 1})
+        self.assertEqual(lazy.__name__, 'OrderedDict')
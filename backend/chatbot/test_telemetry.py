@@ -0,0 +1,194 @@
+"""
+Tests for per-request chatbot telemetry.
+"""
+import json
+
+from django.contrib.auth.models import User
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from langchain_core.documents import Document
+from unittest.mock import patch, MagicMock
+
+from workspaces.models import Workspace, WorkspaceMember
+from .caching import ANSWER_CACHE
+from .deadlines import call_with_timeout
+from .models import AIChatMessage, ChatTrace
+from .telemetry import NULL_TRACE, Trace, activate, current_trace, summarize_traces
+
+
+class TraceTestCase(SimpleTestCase):
+    """Test recording into a trace."""
+
+    def test_records_stages_tokens_and_caches(self):
+        trace = Trace('ask')
+        trace.add_stage('search', 0.010)
+        trace.add_stage('search', 0.005)
+        trace.add_tokens('qa', 100, 20)
+        trace.add_tokens('classifier', 30, 5)
+        trace.cache('query_embedding', True)
+        trace.cache('query_embedding', False)
+        trace.cache('answer', False)
+        trace.set_chunks([
+            Document(page_content="a", metadata={'pdf_id': 3, 'page': 7, 'chunk_id': '3:12'}),
+            Document(page_content="b", metadata={'pdf_id': 3, 'page': 7, 'chunk_id': '3:13'}),
+            Document(id='f1c2', page_content="c", metadata={'pdf_id': 4, 'page': 1}),
+            Document(page_content="d"),
+        ])
+
+        fields = trace.fields()
+        self.assertEqual(fields['stages'], {'search': 15.0})
+        self.assertEqual((fields['prompt_tokens'], fields['completion_tokens']), (130, 25))
+        self.assertEqual(fields['tokens_by_chain']['qa'], [100, 20])
+        self.assertEqual(fields['cache_hits'], {'query_embedding': True, 'answer': False})
+        self.assertEqual(fields['chunk_ids'], ['3:12', '3:13', 'f1c2', None])
+
+    def test_no_trace_outside_a_request(self):
+        self.assertIs(current_trace(), NULL_TRACE)
+        current_trace().add_stage('search', 1.0)
+        self.assertEqual(NULL_TRACE.stages, {})
+
+    def test_trace_follows_work_into_the_deadline_pool(self):
+        trace = Trace()
+        with activate(trace):
+            call_with_timeout(5, lambda: current_trace().add_stage('generate', 0.002))
+        self.assertIs(current_trace(), NULL_TRACE)
+        self.assertEqual(trace.stages, {'generate': 2.0})
+
+    def test_summarize(self):
+        traces = [
+            MagicMock(total_ms=ms, stages={'generate': ms - 10}, prompt_tokens=100, completion_tokens=10,
+                      cache_hits={'answer': ms == 100}, partial=False)
+            for ms in (100, 200, 300, 400)
+        ]
+        summary = summarize_traces(traces)
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['total_ms'], {'p50': 200, 'p95': 400})
+        self.assertEqual(summary['stages_ms']['generate']['p95'], 390)
+        self.assertEqual(summary['cache_hit_rates'], {'answer': 0.25})
+        self.assertEqual(summarize_traces([])['count'], 0)
+
+
+class EngineTelemetryTestCase(TestCase):
+    """Test what the engine records for one answer."""
+
+    def setUp(self):
+        ANSWER_CACHE.clear()
+        self.user = User.objects.create_user(username='traceuser', password='testpass123')
+        self.workspace = Workspace.objects.create(
+            name='Telemetry',
+            created_by=self.user,
+            processing_status=Workspace.ProcessingStatus.READY,
+            index_path='/test/path',
+        )
+        patcher = patch('chatbot.engine.load_models')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(CHATBOT_SPECULATIVE_RETRIEVAL=False)
+    @patch('chatbot.engine._get_query_classification', return_value={'intent': 'pdf_question', 'doc_name': 'all'})
+    @patch('chatbot.engine._retrieve_chunks')
+    def test_rag_answer_trace(self, mock_retrieve, mock_classify):
+        from chatbot.engine import get_chatbot_response
+
+        mock_retrieve.return_value = [Document(page_content="Adam.", metadata={'pdf_id': 5, 'page': 2, 'chunk_id': '5:4'})]
+        mock_qa = MagicMock()
+        mock_qa.invoke.return_value = "Adam."
+        first, second = Trace(), Trace()
+        with patch('chatbot.engine.QA_CHAIN', mock_qa), patch('chatbot.engine.LLM', MagicMock()):
+            with activate(first):
+                get_chatbot_response("which optimizer?", self.workspace.id)
+            with activate(second):
+                get_chatbot_response("which optimizer?", self.workspace.id)
+
+        self.assertEqual(first.intent, 'pdf_question')
+        self.assertTrue({'queue', 'classify', 'generate'} <= set(first.stages))
+        self.assertEqual(first.chunk_ids, ['5:4'])
+        self.assertFalse(first.caches['answer'])
+        self.assertTrue(second.caches['answer'])
+        self.assertNotIn('generate', second.stages)
+
+
+class TelemetryViewsTestCase(TestCase):
+    """Test trace storage and the telemetry endpoint."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='telemetryuser', password='testpass123')
+        self.reviewer = User.objects.create_user(username='telemetryreviewer', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Telemetry Workspace', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.reviewer, role=WorkspaceMember.Role.REVIEWER)
+        self.client.login(username='telemetryuser', password='testpass123')
+
+    @patch('chatbot.views.get_chatbot_response')
+    def test_ask_stores_trace_for_message_pair(self, mock_get_response):
+        def answer(*args, **kwargs):
+            current_trace().add_stage('generate', 0.05)
+            current_trace().note('pdf_question')
+            return "An answer"
+
+        mock_get_response.side_effect = answer
+        self.client.post('/api/chatbot/ask/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+        trace = ChatTrace.objects.get(workspace=self.workspace)
+        self.assertEqual(trace.endpoint, 'ask')
+        self.assertEqual(trace.intent, 'pdf_question')
+        self.assertEqual(trace.stages['generate'], 50.0)
+        self.assertEqual(trace.question_message.message, 'What is this?')
+        self.assertEqual(trace.answer_message.message, 'An answer')
+
+    @override_settings(CHATBOT_TELEMETRY=False)
+    @patch('chatbot.views.get_chatbot_response', return_value="An answer")
+    def test_telemetry_can_be_disabled(self, mock_get_response):
+        self.client.post('/api/chatbot/ask/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+        self.assertTrue(AIChatMessage.objects.filter(workspace=self.workspace, is_from_bot=True).exists())
+        self.assertFalse(ChatTrace.objects.exists())
+
+    def test_workspace_percentiles(self):
+        for ms in (100, 200, 300, 400):
+            ChatTrace.objects.create(
+                workspace=self.workspace, user=self.user, endpoint='ask', intent='pdf_question',
+                total_ms=ms, stages={'generate': ms - 50}, cache_hits={'answer': False},
+            )
+        ChatTrace.objects.create(workspace=self.workspace, endpoint='ask', intent='summary', total_ms=20)
+
+        response = self.client.get(f'/api/chatbot/telemetry/?workspace_id={self.workspace.id}')
+
+        data = json.loads(response.content)
+        self.assertEqual(data['overall']['count'], 5)
+        self.assertEqual(data['by_intent']['pdf_question']['total_ms'], {'p50': 200, 'p95': 400})
+        self.assertEqual(data['by_intent']['pdf_question']['stages_ms']['generate']['p50'], 150)
+        self.assertEqual(data['by_intent']['summary']['count'], 1)
+
+    def test_reviewers_cannot_read_telemetry(self):
+        self.client.login(username='telemetryreviewer', password='testpass123')
+        response = self.client.get(f'/api/chatbot/telemetry/?workspace_id={self.workspace.id}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_parameters(self):
+        url = '/api/chatbot/telemetry/'
+        for query in ('workspace_id=abc', 'days=nan', 'days=inf', 'days=-1', 'days=0', 'days=soon'):
+            if not query.startswith('workspace_id'):
+                query = f'workspace_id={self.workspace.id}&{query}'
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'{url}?{query}').status_code, 400)
+
+    def test_days_are_capped(self):
+        from .views import TELEMETRY_MAX_DAYS
+
+        response = self.client.get(f'/api/chatbot/telemetry/?workspace_id={self.workspace.id}&days=1e9')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['days'], TELEMETRY_MAX_DAYS)
+
+    def test_staff_need_membership(self):
+        User.objects.create_user(username='telemetrystaff', password='testpass123', is_staff=True)
+        self.client.login(username='telemetrystaff', password='testpass123')
+        response = self.client.get(f'/api/chatbot/telemetry/?workspace_id={self.workspace.id}')
+        self.assertEqual(response.status_code, 403)
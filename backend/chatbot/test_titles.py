@@ -0,0 +1,107 @@
+"""
+Tests for the per-workspace title index.
+"""
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from unittest.mock import patch
+
+from pdfs.models import PDFFile
+from workspaces.models import Workspace
+from .titles import MAX_FUZZY_CANDIDATES, TitleIndex, get_title_index, normalize_title
+
+
+class TitleIndexTestCase(SimpleTestCase):
+    """Test name matching against normalized titles."""
+
+    def setUp(self):
+        self.index = TitleIndex([
+            (1, "Attention Is All You Need"),
+            (2, "BERT: Pre-training of Deep Bidirectional Transformers"),
+            (3, "EJ1172284"),
+            (4, "   "),
+        ])
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("BERT: Pre-training!"), "bert pre training")
+        self.assertEqual(normalize_title(None), "")
+
+    def test_blank_titles_are_skipped(self):
+        self.assertEqual(self.index.titles, [
+            "Attention Is All You Need",
+            "BERT: Pre-training of Deep Bidirectional Transformers",
+            "EJ1172284",
+        ])
+
+    def test_match_substring(self):
+        entry, ratio = self.index.match("bert")
+        self.assertEqual(entry.id, 2)
+        self.assertEqual(ratio, 1.0)
+
+    def test_match_fuzzy(self):
+        entry, ratio = self.index.match("atention is all u need")
+        self.assertEqual(entry.id, 1)
+        self.assertGreater(ratio, 0.65)
+        self.assertLess(ratio, 1.0)
+
+    def test_match_empty_name(self):
+        self.assertEqual(self.index.match("!!"), (None, 0.0))
+
+    def test_detect_title_mentioned_in_query(self):
+        entry, _ = self.index.detect("what does ej1172284 conclude?", 0.65)
+        self.assertEqual(entry.id, 3)
+
+    def test_mentioned_in_order(self):
+        entries = self.index.mentioned("Does ej1172284 cite Attention Is All You Need?")
+        self.assertEqual([entry.id for entry in entries], [3, 1])
+        self.assertEqual(self.index.mentioned("does attention help?"), [])
+
+    def test_detect_nothing(self):
+        entry, _ = self.index.detect("which optimizer was used for training?", 0.65)
+        self.assertIsNone(entry)
+
+    def test_large_workspace_prefilters_by_ngrams(self):
+        titles = [(i, f"Unrelated paper number {i}") for i in range(MAX_FUZZY_CANDIDATES * 5)]
+        titles.append((999, "Graph Neural Networks for Molecules"))
+        index = TitleIndex(titles)
+        entry, ratio = index.match("graph neural netwrks for molecule")
+        self.assertEqual(entry.id, 999)
+        self.assertGreater(ratio, 0.65)
+
+
+class TitleIndexCacheTestCase(TestCase):
+    """Test caching and invalidation of workspace title indexes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='titleuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Titles', created_by=self.user)
+        self.pdf = PDFFile.objects.create(
+            workspace=self.workspace, uploaded_by=self.user, title='Attention Is All You Need', file=b'%PDF-1.4'
+        )
+
+    def test_cached_index_needs_no_queries(self):
+        get_title_index(self.workspace.id)
+        # Only the PDF generation lookup; the titles are not loaded again.
+        with self.assertNumQueries(1):
+            entry, _ = get_title_index(self.workspace.id).match("attention")
+        self.assertEqual(entry.id, self.pdf.id)
+
+    def test_rename_invalidates(self):
+        self.assertEqual(get_title_index(self.workspace.id).titles, ['Attention Is All You Need'])
+        self.pdf.title = 'Transformers Revisited'
+        self.pdf.save()
+        self.assertEqual(get_title_index(self.workspace.id).titles, ['Transformers Revisited'])
+
+    def test_create_and_delete_invalidate(self):
+        get_title_index(self.workspace.id)
+        other = PDFFile.objects.create(workspace=self.workspace, uploaded_by=self.user, title='BERT', file=b'%PDF-1.4')
+        self.assertIn('BERT', get_title_index(self.workspace.id).titles)
+        other.delete()
+        self.assertNotIn('BERT', get_title_index(self.workspace.id).titles)
+
+    def test_change_made_by_another_process_is_seen(self):
+        get_title_index(self.workspace.id)
+        # Another worker handles the rename, so this process's cache is not invalidated.
+        with patch('pdfs.signals.invalidate_title_index'):
+            self.pdf.title = 'Transformers Revisited'
+            self.pdf.save()
+        self.assertEqual(get_title_index(self.workspace.id).titles, ['Transformers Revisited'])
@@ -1,12 +1,14 @@
 """
 Tests for chatbot views.
 """
+from asgiref.sync import async_to_sync
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from workspaces.models import Workspace, WorkspaceMember
 from .models import AIChatMessage
 import json
+import threading
 
 
 class ChatbotViewsTestCase(TestCase):
@@ -173,3 +175,211 @@ class ChatbotViewsTestCase(TestCase):
         data = json.loads(response.content)
         self.assertIn('error', data['ai_answer'].lower())
 
+
+
+class ChatbotStreamViewsTestCase(TestCase):
+    """Test the streaming chatbot endpoint."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='streamuser', password='testpass123')
+        self.reviewer = User.objects.create_user(username='streamreviewer', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Stream Workspace', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.reviewer, role=WorkspaceMember.Role.REVIEWER)
+        self.client.login(username='streamuser', password='testpass123')
+
+    def _post(self):
+        return self.client.post('/api/chatbot/ask/stream/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+    def _events(self, response):
+        async def read():
+            return [chunk async for chunk in response.streaming_content]
+
+        body = b"".join(async_to_sync(read)()).decode()
+        return [json.loads(line) for line in body.splitlines() if line]
+
+    @patch('chatbot.views.stream_chatbot_response')
+    def test_stream_tokens_and_persist(self, mock_stream):
+        mock_stream.return_value = iter(["This is ", "streamed."])
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        events = self._events(response)
+        self.assertEqual([e['text'] for e in events if e['type'] == 'token'], ["This is ", "streamed."])
+        done = events[-1]
+        self.assertEqual(done['type'], 'done')
+        self.assertEqual(done['ai_answer'], "This is streamed.")
+        self.assertIsNotNone(done['time_to_first_token_ms'])
+        self.assertTrue(AIChatMessage.objects.filter(
+            workspace=self.workspace, user=self.user, message="This is streamed.", is_from_bot=True
+        ).exists())
+
+    @patch('chatbot.views.stream_chatbot_response')
+    def test_stream_error_is_saved_as_answer(self, mock_stream):
+        def failing(*args, **kwargs):
+            yield "Partial"
+            raise Exception("LLM down")
+        mock_stream.side_effect = failing
+
+        events = self._events(self._post())
+
+        self.assertIn("LLM down", events[-1]['ai_answer'])
+        self.assertTrue(events[-1]['ai_answer'].startswith("Partial"))
+
+    @patch('chatbot.views.stream_chatbot_response')
+    def test_stream_busy_event(self, mock_stream):
+        from chatbot.scheduler import SchedulerBusy
+
+        def busy(*args, **kwargs):
+            raise SchedulerBusy(4, 12)
+            yield
+        mock_stream.side_effect = busy
+
+        events = self._events(self._post())
+
+        self.assertEqual(events, [{
+            'type': 'busy', 'error': events[0]['error'], 'busy': True, 'queue_position': 4, 'retry_after': 12,
+        }])
+        self.assertFalse(AIChatMessage.objects.filter(workspace=self.workspace).exists())
+
+    def test_stream_reviewer_forbidden(self):
+        self.client.login(username='streamreviewer', password='testpass123')
+        response = self._post()
+        self.assertEqual(response.status_code, 403)
+
+    @patch('chatbot.views.stream_chatbot_response')
+    async def test_first_token_is_sent_before_generation_finishes(self, mock_stream):
+        from django.test import AsyncClient
+
+        release = threading.Event()
+
+        def slow(*args, **kwargs):
+            yield "First "
+            release.wait(5)
+            yield "second."
+        mock_stream.side_effect = slow
+
+        client = AsyncClient()
+        await client.alogin(username='streamuser', password='testpass123')
+        response = await client.post('/api/chatbot/ask/stream/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(json.loads(await anext(chunks)), {'type': 'token', 'text': 'First '})
+        self.assertFalse(release.is_set())
+        release.set()
+        events = [json.loads(chunk) async for chunk in chunks]
+        self.assertEqual(events[-1]['ai_answer'], "First second.")
+
+
+class ChatbotAsyncViewsTestCase(TestCase):
+    """Test the async chatbot endpoint."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.reviewer = User.objects.create_user(username='asyncreviewer', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Async Workspace', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.reviewer, role=WorkspaceMember.Role.REVIEWER)
+
+    async def _post(self, username):
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        await client.alogin(username=username, password='testpass123')
+        return await client.post('/api/chatbot/ask/async/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+    @patch('chatbot.views.aget_chatbot_response')
+    async def test_async_success(self, mock_response):
+        mock_response.return_value = "Async answer"
+
+        response = await self._post('asyncuser')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['ai_answer'], "Async answer")
+        mock_response.assert_awaited_once_with('What is this?', self.workspace.id, user_id=self.user.id, timeout=ANY)
+        self.assertTrue(await AIChatMessage.objects.filter(message="Async answer", is_from_bot=True).aexists())
+
+    @patch('chatbot.views.aget_chatbot_response')
+    async def test_async_timeout(self, mock_response):
+        import asyncio
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(5)
+        mock_response.side_effect = slow
+
+        with self.settings(CHATBOT_RESPONSE_TIMEOUT=0.05):
+            response = await self._post('asyncuser')
+
+        self.assertIn('too long', json.loads(response.content)['ai_answer'].lower())
+
+    async def test_async_reviewer_forbidden(self):
+        response = await self._post('asyncreviewer')
+        self.assertEqual(response.status_code, 403)
+
+
+class ChatbotSchedulerViewsTestCase(TestCase):
+    """Test busy rejection and queue status."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='queueuser', password='testpass123')
+        self.workspace = Workspace.objects.create(name='Queue Workspace', created_by=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role=WorkspaceMember.Role.RESEARCHER)
+        self.client.login(username='queueuser', password='testpass123')
+
+    @patch('chatbot.views.get_chatbot_response')
+    def test_busy_returns_503_without_saving(self, mock_get_response):
+        from chatbot.scheduler import SchedulerBusy
+
+        mock_get_response.side_effect = SchedulerBusy(3, 20)
+
+        response = self.client.post('/api/chatbot/ask/', json.dumps({
+            'question': 'What is this?',
+            'workspace_id': self.workspace.id
+        }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '20')
+        data = json.loads(response.content)
+        self.assertTrue(data['busy'])
+        self.assertEqual(data['queue_position'], 3)
+        self.assertFalse(AIChatMessage.objects.filter(workspace=self.workspace).exists())
+        mock_get_response.assert_called_once_with('What is this?', self.workspace.id, user_id=self.user.id, timeout=85.0)
+
+    @patch('chatbot.views.SCHEDULER')
+    def test_queue_status(self, mock_scheduler):
+        mock_scheduler.queue_positions.return_value = [{'workspace_id': self.workspace.id, 'position': 2}]
+        mock_scheduler.stats.return_value = {'active': 8, 'max_concurrent': 8, 'queued': 5, 'avg_service_time': 4.2}
+
+        response = self.client.get('/api/chatbot/queue/')
+
+        data = json.loads(response.content)
+        self.assertEqual(data['positions'], [{'workspace_id': self.workspace.id, 'position': 2}])
+        self.assertEqual(data['queued'], 5)
+        mock_scheduler.queue_positions.assert_called_once_with(self.user.id)
+
+    def test_provider_status(self):
+        from chatbot.breaker import CircuitBreaker
+
+        tripped = CircuitBreaker('llm', minimum_calls=1)
+        tripped.record_failure(ConnectionError("provider down"))
+        with patch('chatbot.views.BREAKERS', {'llm': tripped, 'embeddings': CircuitBreaker('embeddings')}):
+            response = self.client.get('/api/chatbot/status/')
+
+        data = json.loads(response.content)
+        self.assertTrue(data['degraded'])
+        self.assertEqual(data['breakers']['llm']['state'], 'open')
+        self.assertEqual(data['breakers']['embeddings']['state'], 'closed')
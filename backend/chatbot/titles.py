@@ -0,0 +1,130 @@
+"""
+Per-workspace index of normalized PDF titles for document name resolution.
+
+Resolving a name like "summary of attention paper" used to load every
+PDFFile row of the workspace (including the `file` bytes) and run
+SequenceMatcher against every title, up to three times per question.
+A TitleIndex is built once from (id, title) pairs, cached per worker under
+the workspace's PDF generation (one small aggregate query), and ranks titles by character trigram
+overlap so SequenceMatcher only runs on the closest few.
+"""
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from pdfs.models import PDFFile
+from .caching import TTLCache, pdf_generation
+
+NGRAM_SIZE = 3
+MAX_FUZZY_CANDIDATES = 8
+
+TitleEntry = namedtuple("TitleEntry", ["id", "title", "normalized", "ngrams"])
+
+
+def normalize_title(text):
+    if not text:
+        return ''
+    lowered = text.lower()
+    cleaned = re.sub(r'[^a-z0-9]+', ' ', lowered)
+    return cleaned.strip()
+
+
+def char_ngrams(normalized, size=NGRAM_SIZE):
+    padded = f" {normalized} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+class TitleIndex:
+    """Normalized titles and character n-grams for one workspace's PDFs."""
+
+    def __init__(self, pdfs):
+        self.entries = []
+        for pdf_id, title in pdfs:
+            normalized = normalize_title(title)
+            if normalized:
+                self.entries.append(TitleEntry(pdf_id, title, normalized, char_ngrams(normalized)))
+
+    @property
+    def titles(self):
+        return [entry.title for entry in self.entries]
+
+    def _fuzzy_candidates(self, normalized_text):
+        """The titles sharing the most n-grams with the text (Dice coefficient)."""
+        if len(self.entries) <= MAX_FUZZY_CANDIDATES:
+            return self.entries
+        ngrams = char_ngrams(normalized_text)
+        scored = sorted(
+            self.entries,
+            key=lambda entry: 2 * len(ngrams & entry.ngrams) / (len(ngrams) + len(entry.ngrams)),
+            reverse=True,
+        )
+        return scored[:MAX_FUZZY_CANDIDATES]
+
+    def _best_ratio(self, normalized_text):
+        best_entry = None
+        best_ratio = 0.0
+        for entry in self._fuzzy_candidates(normalized_text):
+            ratio = SequenceMatcher(None, normalized_text, entry.normalized).ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_entry = entry
+        return best_entry, best_ratio
+
+    def match(self, doc_name):
+        """Return (entry, ratio) for the title best matching a document name."""
+        normalized_target = normalize_title(doc_name)
+        if not normalized_target:
+            return None, 0.0
+
+        for entry in self.entries:
+            if (entry.normalized == normalized_target
+                    or normalized_target in entry.normalized
+                    or entry.normalized in normalized_target):
+                return entry, 1.0
+
+        return self._best_ratio(normalized_target)
+
+    def mentioned(self, query_text):
+        """Entries whose full title appears in the query, in the order they are mentioned."""
+        normalized_query = f" {normalize_title(query_text)} "
+        found = [(normalized_query.find(f" {entry.normalized} "), entry) for entry in self.entries]
+        return [entry for position, entry in sorted(found, key=lambda item: item[0]) if position >= 0]
+
+    def detect(self, query_text, threshold):
+        """Return the entry whose title the query mentions or closely resembles."""
+        normalized_query = normalize_title(query_text)
+        if not normalized_query:
+            return None, 0.0
+
+        for entry in self.entries:
+            if entry.normalized in normalized_query or normalized_query in entry.normalized:
+                return entry, 1.0
+
+        entry, ratio = self._best_ratio(normalized_query)
+        if ratio >= threshold:
+            return entry, ratio
+        return None, ratio
+
+
+_TITLE_INDEXES = TTLCache(maxsize=256, ttl=3600)
+
+
+def get_title_index(workspace_id):
+    """
+    Worker-level cached TitleIndex. Keyed by the PDF generation, which is
+    read from the database on every call, so a PDF created, renamed or
+    deleted through another worker is picked up on the next question.
+    """
+    key = (workspace_id, pdf_generation(workspace_id))
+    index = _TITLE_INDEXES.get(key)
+    if index is None:
+        pdfs = PDFFile.objects.filter(workspace_id=workspace_id).order_by('id').values_list('id', 'title')
+        index = TitleIndex(pdfs)
+        _TITLE_INDEXES.set(key, index)
+    return index
+
+
+def invalidate_title_index(workspace_id):
+    _TITLE_INDEXES.discard_if(lambda key: key[0] == workspace_id)
@@ -1,14 +1,204 @@
 import json
+import math
+import time
+import asyncio
 import concurrent.futures
-from django.http import JsonResponse
+import contextvars
+import threading
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from .models import AIChatMessage
+from django.utils import timezone
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+from .models import AIChatMessage, ChatJob, ChatTrace
 from workspaces.models import Workspace
 from workspaces.models import WorkspaceMember
 
 
-from .engine import get_chatbot_response
+from .engine import aget_chatbot_response, get_chatbot_response, iter_batch_responses, stream_chatbot_response
+from .breaker import BREAKERS
+from .hedging import HEDGERS
+from .jobs import job_payload
+from .llms import CHAIN_METRICS
+from .scheduler import SCHEDULER, SchedulerBusy
+from .tasks import answer_chat_job_task
+from .telemetry import activate, save_trace, start_trace, summarize_traces
+
+# Most recent traces aggregated by the telemetry endpoint.
+TELEMETRY_SAMPLE_LIMIT = 2000
+
+# Longest window, in days, the telemetry endpoint aggregates over.
+TELEMETRY_MAX_DAYS = 90
+
+# The engine's own deadline ends this much earlier than the request timeout,
+# leaving time to save and return a partial answer.
+RESPONSE_GRACE_SECONDS = 5
+
+
+def _engine_timeout():
+    return max(1.0, settings.CHATBOT_RESPONSE_TIMEOUT - RESPONSE_GRACE_SECONDS)
+
+
+def _busy_payload(busy):
+    return {
+        'error': str(busy),
+        'busy': True,
+        'queue_position': busy.queue_position,
+        'retry_after': busy.retry_after,
+    }
+
+
+def _busy_response(busy):
+    """503 for a question the scheduler could not start in time."""
+    response = JsonResponse(_busy_payload(busy), status=503)
+    response['Retry-After'] = str(busy.retry_after)
+    return response
+
+
+_STREAM_END = object()
+
+
+async def _aiter_in_thread(make_iterator):
+    """
+    Run a blocking iterator in a worker thread and yield its items on the
+    event loop as they are produced. Under ASGI, StreamingHttpResponse reads
+    a sync iterator with sync_to_async(list), which buffers the whole answer
+    before the first byte is sent. Closing this iterator (the client went
+    away) stops the worker at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def publish(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:  # the event loop is gone
+            stop.set()
+
+    def produce():
+        close_old_connections()
+        iterator = None
+        try:
+            iterator = iter(make_iterator())
+            for item in iterator:
+                publish(item)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            publish(_STREAM_END, e)
+            return
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            close_old_connections()
+        publish(_STREAM_END)
+
+    loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def _load_ask_request(request):
+    """
+    Parse and permission-check a chatbot question.
+    Returns (workspace, question_text, error_response).
+    """
+    data = json.loads(request.body)
+    question_text = data.get('question')
+    workspace_id = data.get('workspace_id')
+
+    if not question_text:
+        return None, None, JsonResponse({'error': 'No "question" provided.'}, status=400)
+    if not workspace_id:
+        return None, None, JsonResponse({'error': 'No "workspace_id" provided.'}, status=400)
+
+    workspace, error_response = _check_workspace_access(request, workspace_id)
+    return workspace, question_text, error_response
+
+
+def _check_workspace_access(request, workspace_id):
+    """
+    Load the workspace and check the user may use its AI chatbot.
+    Returns (workspace, error_response).
+    """
+    # --- Get models and check permissions ---
+    try:
+        workspace = Workspace.objects.get(id=workspace_id)
+    except Workspace.DoesNotExist:
+        return None, JsonResponse({'error': 'Workspace not found.'}, status=404)
+    
+    if not workspace.members.filter(user=request.user).exists():
+        return None, JsonResponse({'error': 'You do not have permission to access this workspace.'}, status=403)
+    
+    try:
+        member = WorkspaceMember.objects.get(workspace=workspace, user=request.user)
+        if member.role == WorkspaceMember.Role.REVIEWER:
+            return None, JsonResponse({'error': 'Reviewers do not have access to AI ChatBot.'}, status=403)
+    except WorkspaceMember.DoesNotExist:
+        return None, JsonResponse({'error': 'You are not a member of this workspace.'}, status=403)
+
+    return workspace, None
+
+
+def _wants_job(request):
+    """True when the client asked for a job id instead of waiting for the answer."""
+    return json.loads(request.body).get('mode') == 'job'
+
+
+def _submit_job(request, workspace, user_message, ai_prompt):
+    """Queue the question for the background worker and return 202 with the job id."""
+    job = ChatJob.objects.create(
+        user=request.user,
+        workspace=workspace,
+        question_message=user_message,
+        prompt=ai_prompt,
+    )
+    answer_chat_job_task(str(job.id))
+    print(f"[ask_question] Queued job {job.id} for question: {ai_prompt[:100]}...")
+    return JsonResponse({
+        'status': 'queued',
+        'job_id': str(job.id),
+        'poll_url': reverse('chatbot_job_status', args=[job.id]),
+        'user_question': user_message.message,
+    }, status=202)
+
+
+async def _aload_ask_request(request):
+    """Async-ORM version of _load_ask_request."""
+    data = json.loads(request.body)
+    question_text = data.get('question')
+    workspace_id = data.get('workspace_id')
+
+    if not question_text:
+        return None, None, JsonResponse({'error': 'No "question" provided.'}, status=400)
+    if not workspace_id:
+        return None, None, JsonResponse({'error': 'No "workspace_id" provided.'}, status=400)
+
+    workspace = await Workspace.objects.filter(id=workspace_id).afirst()
+    if workspace is None:
+        return None, None, JsonResponse({'error': 'Workspace not found.'}, status=404)
+
+    user = await request.auser()
+    member = await WorkspaceMember.objects.filter(workspace=workspace, user=user).afirst()
+    if member is None:
+        return None, None, JsonResponse({'error': 'You do not have permission to access this workspace.'}, status=403)
+    if member.role == WorkspaceMember.Role.REVIEWER:
+        return None, None, JsonResponse({'error': 'Reviewers do not have access to AI ChatBot.'}, status=403)
+
+    return workspace, question_text, None
 
 
 @login_required
@@ -17,32 +207,14 @@ def ask_question(request):
     """
     API endpoint for the PRIVATE AI chatbot.
     This view is now SIMPLE. It just passes the request to the engine.
+    With "mode": "job" it returns a job id at once instead (see chatbot.jobs).
     """
     try:
-        data = json.loads(request.body)
-        question_text = data.get('question')
-        workspace_id = data.get('workspace_id')
-
-        if not question_text:
-            return JsonResponse({'error': 'No "question" provided.'}, status=400)
-        if not workspace_id:
-            return JsonResponse({'error': 'No "workspace_id" provided.'}, status=400)
-
-        # --- Get models and check permissions ---
-        try:
-            workspace = Workspace.objects.get(id=workspace_id)
-        except Workspace.DoesNotExist:
-            return JsonResponse({'error': 'Workspace not found.'}, status=404)
-        
-        if not workspace.members.filter(user=request.user).exists():
-            return JsonResponse({'error': 'You do not have permission to access this workspace.'}, status=403)
-        
-        try:
-            member = WorkspaceMember.objects.get(workspace=workspace, user=request.user)
-            if member.role == WorkspaceMember.Role.REVIEWER:
-                return JsonResponse({'error': 'Reviewers do not have access to AI ChatBot.'}, status=403)
-        except WorkspaceMember.DoesNotExist:
-            return JsonResponse({'error': 'You are not a member of this workspace.'}, status=403)
+        workspace, question_text, error_response = _load_ask_request(request)
+        if error_response:
+            return error_response
+        workspace_id = workspace.id
+        trace = start_trace('ask')
         
         # --- 1. Save User's Question ---
         user_message = AIChatMessage.objects.create(
@@ -54,19 +226,30 @@ def ask_question(request):
         
         
         ai_prompt = question_text.lstrip('/ai').strip()
+        if _wants_job(request):
+            return _submit_job(request, workspace, user_message, ai_prompt)
         
-        
+        timeout = settings.CHATBOT_RESPONSE_TIMEOUT
         print(f"[ask_question] Starting chatbot response for question: {ai_prompt[:100]}...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(get_chatbot_response, ai_prompt, workspace_id)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor, activate(trace):
+            future = executor.submit(
+                contextvars.copy_context().run,
+                get_chatbot_response, ai_prompt, workspace_id, user_id=request.user.id, timeout=_engine_timeout()
+            )
             try:
-                # Set timeout to 90 seconds for LLM calls (matching frontend timeout)
-                print(f"[ask_question] Waiting for response (timeout: 90s)...")
-                answer = future.result(timeout=90)
+                # The engine works within _engine_timeout(); this is only a backstop (matching frontend timeout)
+                print(f"[ask_question] Waiting for response (timeout: {timeout:g}s)...")
+                answer = future.result(timeout=timeout)
                 print(f"[ask_question] Received answer, length: {len(answer) if answer else 0} chars")
             except concurrent.futures.TimeoutError:
-                answer = "Sorry, the AI response took too long (over 90 seconds). The question might be too complex or the AI service is slow. Please try again with a simpler question."
+                answer = f"Sorry, the AI response took too long (over {timeout:g} seconds). The question might be too complex or the AI service is slow. Please try again with a simpler question."
                 print(f"[ask_question] Timeout error for question: {ai_prompt}")
+                if trace:
+                    trace.note(partial=True)
+            except SchedulerBusy as busy:
+                # Nothing was answered, so drop the question and let the client retry.
+                user_message.delete()
+                return _busy_response(busy)
             except Exception as e:
                 answer = f"Error generating response: {str(e)}"
                 print(f"[ask_question] Error in chatbot response: {e}")
@@ -80,6 +263,7 @@ def ask_question(request):
             message=answer,
             is_from_bot=True
         )
+        save_trace(trace, workspace, request.user, user_message, ai_message)
         
         # --- 4. Return both messages to the frontend ---
         return JsonResponse({
@@ -91,3 +275,355 @@ def ask_question(request):
     except Exception as e:
         print(f"Error in ask_question view: {e}")
         return JsonResponse({'error': f'An internal error occurred: {e}'}, status=500)
+
+
+@login_required
+@require_POST
+def ask_question_stream(request):
+    """
+    Streaming variant of ask_question. The response is newline-delimited JSON:
+    {"type": "token", "text": ...} events as the answer is generated, then one
+    {"type": "done", ...} event once the answer has been saved. The body is an
+    async iterator, so under ASGI each token is sent as soon as it exists.
+    """
+    started = time.monotonic()
+    try:
+        workspace, question_text, error_response = _load_ask_request(request)
+        if error_response:
+            return error_response
+
+        user_message = AIChatMessage.objects.create(
+            user=request.user,
+            workspace=workspace,
+            message=question_text,
+            is_from_bot=False
+        )
+    except Exception as e:
+        print(f"Error in ask_question_stream view: {e}")
+        return JsonResponse({'error': f'An internal error occurred: {e}'}, status=500)
+
+    ai_prompt = question_text.lstrip('/ai').strip()
+    user = request.user
+    trace = start_trace('stream')
+
+    async def events():
+        parts = []
+        first_token_ms = None
+        try:
+            with activate(trace):
+                chunks = _aiter_in_thread(
+                    lambda: stream_chatbot_response(ai_prompt, workspace.id, user_id=user.id, timeout=_engine_timeout())
+                )
+                async for chunk in chunks:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.monotonic() - started) * 1000)
+                        print(f"[ask_question_stream] Time to first token: {first_token_ms} ms")
+                    parts.append(chunk)
+                    yield json.dumps({'type': 'token', 'text': chunk}) + "\n"
+        except SchedulerBusy as busy:
+            await user_message.adelete()
+            yield json.dumps({'type': 'busy', **_busy_payload(busy)}) + "\n"
+            return
+        except Exception as e:
+            print(f"[ask_question_stream] Error in chatbot response: {e}")
+            error_text = f"Error generating response: {str(e)}"
+            parts.append(error_text)
+            yield json.dumps({'type': 'token', 'text': error_text}) + "\n"
+
+        ai_message = await AIChatMessage.objects.acreate(
+            user=user,
+            workspace=workspace,
+            message="".join(parts),
+            is_from_bot=True
+        )
+        if trace and first_token_ms is not None:
+            trace.add_stage('first_token', first_token_ms / 1000)
+        await sync_to_async(save_trace)(trace, workspace, user, user_message, ai_message)
+        total_ms = round((time.monotonic() - started) * 1000)
+        print(f"[ask_question_stream] Answer complete in {total_ms} ms ({len(ai_message.message)} chars)")
+        yield json.dumps({
+            'type': 'done',
+            'status': 'ok',
+            'user_question': user_message.message,
+            'ai_answer': ai_message.message,
+            'time_to_first_token_ms': first_token_ms,
+            'total_ms': total_ms,
+        }) + "\n"
+
+    response = StreamingHttpResponse(events(), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass tokens through unbuffered
+    return response
+
+
+def _load_batch_request(request):
+    """
+    Parse and permission-check a batch of chatbot questions.
+    Returns (workspace, questions, stream, error_response).
+    """
+    data = json.loads(request.body)
+    questions = data.get('questions')
+    workspace_id = data.get('workspace_id')
+    max_questions = settings.CHATBOT_BATCH_MAX_QUESTIONS
+
+    if not isinstance(questions, list) or not questions or not all(
+        isinstance(question, str) and question.strip() for question in questions
+    ):
+        return None, None, False, JsonResponse({'error': '"questions" must be a non-empty list of questions.'}, status=400)
+    if len(questions) > max_questions:
+        return None, None, False, JsonResponse({'error': f'At most {max_questions} questions can be asked at once.'}, status=400)
+    if not workspace_id:
+        return None, None, False, JsonResponse({'error': 'No "workspace_id" provided.'}, status=400)
+
+    workspace, error_response = _check_workspace_access(request, workspace_id)
+    return workspace, questions, bool(data.get('stream')), error_response
+
+
+@login_required
+@require_POST
+def ask_question_batch(request):
+    """
+    Answer a checklist of questions about one workspace in one request. The
+    index is loaded and the questions embedded once, and the answers are
+    generated in parallel (each still taking a scheduler slot).
+
+    Returns every answer in question order, or with "stream": true
+    newline-delimited JSON: one {"type": "answer", ...} event per question as
+    it completes, then {"type": "done", ...}. Each question/answer pair is
+    saved to the chat history as it completes.
+    """
+    started = time.monotonic()
+    try:
+        workspace, questions, stream, error_response = _load_batch_request(request)
+        if error_response:
+            return error_response
+    except Exception as e:
+        print(f"Error in ask_question_batch view: {e}")
+        return JsonResponse({'error': f'An internal error occurred: {e}'}, status=500)
+
+    user = request.user
+    prompts = [question.lstrip('/ai').strip() for question in questions]
+    traces = [start_trace('batch') for _ in questions]
+    print(f"[ask_question_batch] Answering {len(questions)} questions for workspace {workspace.id}")
+
+    def batch_answers():
+        return iter_batch_responses(prompts, workspace.id, user_id=user.id, timeout=_engine_timeout(), traces=traces)
+
+    def save_answer(position, answer):
+        user_message = AIChatMessage.objects.create(
+            user=user,
+            workspace=workspace,
+            message=questions[position],
+            is_from_bot=False
+        )
+        ai_message = AIChatMessage.objects.create(
+            user=user,
+            workspace=workspace,
+            message=answer,
+            is_from_bot=True
+        )
+        save_trace(traces[position], workspace, user, user_message, ai_message)
+        return {
+            'index': position,
+            'user_question': user_message.message,
+            'ai_answer': ai_message.message,
+        }
+
+    if not stream:
+        try:
+            results = sorted(
+                (save_answer(position, answer) for position, answer in batch_answers()),
+                key=lambda result: result['index'],
+            )
+        except Exception as e:
+            print(f"Error in ask_question_batch view: {e}")
+            return JsonResponse({'error': f'An internal error occurred: {e}'}, status=500)
+        return JsonResponse({
+            'status': 'ok',
+            'answers': results,
+            'total_ms': round((time.monotonic() - started) * 1000),
+        })
+
+    async def events():
+        try:
+            async for position, answer in _aiter_in_thread(batch_answers):
+                result = await sync_to_async(save_answer)(position, answer)
+                yield json.dumps({'type': 'answer', **result}) + "\n"
+        except Exception as e:
+            print(f"[ask_question_batch] Error in batch response: {e}")
+            yield json.dumps({'type': 'error', 'error': f'An internal error occurred: {e}'}) + "\n"
+            return
+        yield json.dumps({
+            'type': 'done',
+            'status': 'ok',
+            'count': len(questions),
+            'total_ms': round((time.monotonic() - started) * 1000),
+        }) + "\n"
+
+    response = StreamingHttpResponse(events(), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@require_POST
+async def ask_question_async(request):
+    """
+    Async variant of ask_question for ASGI deployments. The chatbot pipeline
+    is awaited instead of blocking a worker thread, the answer is bounded by
+    CHATBOT_RESPONSE_TIMEOUT, and a client disconnect cancels the LLM calls.
+    """
+    try:
+        workspace, question_text, error_response = await _aload_ask_request(request)
+        if error_response:
+            return error_response
+
+        user = await request.auser()
+        user_message = await AIChatMessage.objects.acreate(
+            user=user,
+            workspace=workspace,
+            message=question_text,
+            is_from_bot=False
+        )
+
+        ai_prompt = question_text.lstrip('/ai').strip()
+        timeout = settings.CHATBOT_RESPONSE_TIMEOUT
+        trace = start_trace('async')
+        print(f"[ask_question_async] Starting chatbot response for question: {ai_prompt[:100]}...")
+        try:
+            with activate(trace):
+                answer = await asyncio.wait_for(
+                    aget_chatbot_response(ai_prompt, workspace.id, user_id=user.id, timeout=_engine_timeout()),
+                    timeout=timeout,
+                )
+        except asyncio.TimeoutError:
+            answer = f"Sorry, the AI response took too long (over {timeout:g} seconds). The question might be too complex or the AI service is slow. Please try again with a simpler question."
+            print(f"[ask_question_async] Timeout error for question: {ai_prompt}")
+            if trace:
+                trace.note(partial=True)
+        except SchedulerBusy as busy:
+            await user_message.adelete()
+            return _busy_response(busy)
+        except asyncio.CancelledError:
+            print(f"[ask_question_async] Client disconnected; cancelled response for question: {ai_prompt[:100]}")
+            raise
+        except Exception as e:
+            answer = f"Error generating response: {str(e)}"
+            print(f"[ask_question_async] Error in chatbot response: {e}")
+
+        ai_message = await AIChatMessage.objects.acreate(
+            user=user,
+            workspace=workspace,
+            message=answer,
+            is_from_bot=True
+        )
+        await sync_to_async(save_trace)(trace, workspace, user, user_message, ai_message)
+        return JsonResponse({
+            'status': 'ok',
+            'user_question': user_message.message,
+            'ai_answer': ai_message.message
+        })
+
+    except Exception as e:
+        print(f"Error in ask_question_async view: {e}")
+        return JsonResponse({'error': f'An internal error occurred: {e}'}, status=500)
+
+
+@login_required
+@require_GET
+def chatbot_queue_status(request):
+    """
+    Where the current user's waiting questions stand in the chatbot queue,
+    for clients to show while an ask request is pending.
+    """
+    stats = SCHEDULER.stats()
+    return JsonResponse({
+        'status': 'ok',
+        'positions': SCHEDULER.queue_positions(request.user.id),
+        'active': stats['active'],
+        'max_concurrent': stats['max_concurrent'],
+        'queued': stats['queued'],
+        'estimated_service_seconds': stats['avg_service_time'],
+    })
+
+
+@login_required
+@require_GET
+def chatbot_job_status(request, job_id):
+    """
+    Polling fallback for job mode: the job's status, and its answer once
+    finished. Only the user who asked can see a job.
+    """
+    job = ChatJob.objects.select_related('question_message', 'answer_message').filter(
+        id=job_id, user=request.user
+    ).first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found.'}, status=404)
+    return JsonResponse(job_payload(job))
+
+
+@login_required
+@require_GET
+def chatbot_provider_status(request):
+    """
+    Circuit breaker state of the LLM and embedding providers, plus per-chain
+    latency, token usage and hedging metrics. `degraded` is true while either provider is failing
+    fast, so clients can warn that answers are limited to retrieved excerpts.
+    """
+    breakers = {name: breaker.status() for name, breaker in BREAKERS.items()}
+    return JsonResponse({
+        'status': 'ok',
+        'degraded': any(status['state'] != 'closed' for status in breakers.values()),
+        'breakers': breakers,
+        'chains': CHAIN_METRICS.stats(),
+        'hedging': {name: hedger.stats() for name, hedger in HEDGERS.items()},
+    })
+
+
+@login_required
+@require_GET
+def chatbot_telemetry(request):
+    """
+    Aggregated answer telemetry for one workspace over the last `days`
+    (default 7, at most TELEMETRY_MAX_DAYS): p50/p95 of total and per-stage
+    latency, average tokens and cache hit rates, overall and per intent. Only
+    researchers of the workspace can read it.
+    """
+    if not request.GET.get('workspace_id'):
+        return JsonResponse({'error': 'No "workspace_id" provided.'}, status=400)
+    try:
+        workspace_id = int(request.GET['workspace_id'])
+    except ValueError:
+        return JsonResponse({'error': '"workspace_id" must be an integer.'}, status=400)
+    try:
+        days = float(request.GET.get('days', 7))
+    except ValueError:
+        return JsonResponse({'error': '"days" must be a number.'}, status=400)
+    if not math.isfinite(days) or days <= 0:
+        return JsonResponse({'error': '"days" must be a positive number.'}, status=400)
+    days = min(days, TELEMETRY_MAX_DAYS)
+
+    workspace = Workspace.objects.filter(id=workspace_id).first()
+    if workspace is None:
+        return JsonResponse({'error': 'Workspace not found.'}, status=404)
+    is_researcher = workspace.members.filter(user=request.user).exclude(role=WorkspaceMember.Role.REVIEWER).exists()
+    if not is_researcher:
+        return JsonResponse({'error': 'You do not have permission to access this workspace.'}, status=403)
+
+    traces = list(ChatTrace.objects.filter(
+        workspace=workspace, created_at__gte=timezone.now() - timedelta(days=days)
+    ).only(
+        'intent', 'partial', 'total_ms', 'stages', 'prompt_tokens', 'completion_tokens', 'cache_hits'
+    )[:TELEMETRY_SAMPLE_LIMIT])
+    intents = sorted({trace.intent for trace in traces if trace.intent})
+    return JsonResponse({
+        'status': 'ok',
+        'workspace_id': workspace.id,
+        'days': days,
+        'overall': summarize_traces(traces),
+        'by_intent': {
+            intent: summarize_traces(trace for trace in traces if trace.intent == intent)
+            for intent in intents
+        },
+    })
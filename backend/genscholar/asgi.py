@@ -23,12 +23,20 @@ django_asgi_app = get_asgi_application()
 from chat import routing as chat_routing
 from threads import routing as threads_routing
 from notifications import routing as notifications_routing
+from chatbot import routing as chatbot_routing
+from django.conf import settings
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             chat_routing.websocket_urlpatterns + threads_routing.websocket_urlpatterns + notifications_routing.websocket_urlpatterns
+            + chatbot_routing.websocket_urlpatterns
         )
     ),
 })
+
+# Load the chatbot models in the background so the first question is not slow.
+if settings.CHATBOT_WARM_UP:
+    from chatbot.engine import warm_up
+    warm_up(background=True)
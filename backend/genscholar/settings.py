@@ -374,6 +374,122 @@ else:
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# --- Chatbot embedding provider ---
+# "cohere" (default, needs COHERE_API_KEY) or "local" (ONNX on CPU, needs the `fastembed` package).
+# Indexes record the model they were built with; switching models requires re-indexing.
+CHATBOT_EMBEDDING_PROVIDER = os.getenv('CHATBOT_EMBEDDING_PROVIDER', 'cohere')
+CHATBOT_EMBEDDING_MODEL = os.getenv('CHATBOT_EMBEDDING_MODEL', '')  # empty = provider default
+
+# --- Chatbot performance tuning ---
+# Query embeddings are cached per worker, keyed by normalized question text and model.
+CHATBOT_QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('CHATBOT_QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+CHATBOT_QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('CHATBOT_QUERY_EMBEDDING_CACHE_TTL', '3600'))  # seconds
+# Final answers are cached per (workspace, index version, question).
+# Set CHATBOT_ANSWER_CACHE_SIMILARITY (e.g. 0.97) to also serve near-duplicate questions.
+CHATBOT_ANSWER_CACHE_SIZE = int(os.getenv('CHATBOT_ANSWER_CACHE_SIZE', '512'))
+CHATBOT_ANSWER_CACHE_TTL = int(os.getenv('CHATBOT_ANSWER_CACHE_TTL', '3600'))  # seconds
+CHATBOT_ANSWER_CACHE_SIMILARITY = float(os.getenv('CHATBOT_ANSWER_CACHE_SIMILARITY', '0'))
+# Optional shared vector-search process (`manage.py run_index_server`), e.g.
+# "unix:/tmp/genscholar-index.sock" or "127.0.0.1:8765". Empty = search in-process.
+CHATBOT_INDEX_SERVER_ADDRESS = os.getenv('CHATBOT_INDEX_SERVER_ADDRESS', '')
+CHATBOT_INDEX_SERVER_TIMEOUT = float(os.getenv('CHATBOT_INDEX_SERVER_TIMEOUT', '10'))  # seconds
+# Hybrid retrieval: a BM25 hit that covers every query term, scores at least
+# DECISIVE_SCORE and beats the runner-up by DECISIVE_MARGIN skips the embedding call.
+CHATBOT_LEXICAL_DECISIVE_SCORE = float(os.getenv('CHATBOT_LEXICAL_DECISIVE_SCORE', '8.0'))
+CHATBOT_LEXICAL_DECISIVE_MARGIN = float(os.getenv('CHATBOT_LEXICAL_DECISIVE_MARGIN', '1.5'))
+# Questions the local intent router scores at or above this confidence skip the classifier LLM call.
+CHATBOT_INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('CHATBOT_INTENT_CONFIDENCE_THRESHOLD', '0.8'))
+# Start query embedding and similarity search while the intent is being classified;
+# the result is dropped if the question turns out not to need retrieval, on a pool of
+# CHATBOT_SPECULATIVE_WORKERS threads.
+CHATBOT_SPECULATIVE_RETRIEVAL = os.getenv('CHATBOT_SPECULATIVE_RETRIEVAL', 'true').lower() == 'true'
+CHATBOT_SPECULATIVE_WORKERS = int(os.getenv('CHATBOT_SPECULATIVE_WORKERS', '4'))
+# Let concurrent identical questions in a workspace share one pipeline run.
+CHATBOT_COALESCE_QUESTIONS = os.getenv('CHATBOT_COALESCE_QUESTIONS', 'true').lower() == 'true'
+# Build the chatbot LLM/embedding clients when a web worker boots instead of on the first question.
+CHATBOT_WARM_UP = os.getenv('CHATBOT_WARM_UP', 'true').lower() == 'true'
+# Chatbot pipelines (LLM calls) allowed to run at once across the whole deployment, to stay
+# within the provider's rate limits.
+CHATBOT_GLOBAL_MAX_PIPELINES = int(os.getenv('CHATBOT_GLOBAL_MAX_PIPELINES', '8'))
+# Processes that answer chatbot questions (web workers plus the process_tasks worker).
+CHATBOT_WORKER_PROCESSES = max(1, int(os.getenv('CHATBOT_WORKER_PROCESSES', '1')))
+# Cap on concurrently running chatbot pipelines in each process. The scheduler enforces it per
+# process, so by default every process gets an equal share of CHATBOT_GLOBAL_MAX_PIPELINES.
+CHATBOT_MAX_CONCURRENT_PIPELINES = int(os.getenv(
+    'CHATBOT_MAX_CONCURRENT_PIPELINES', str(max(1, CHATBOT_GLOBAL_MAX_PIPELINES // CHATBOT_WORKER_PROCESSES))
+))
+# A queued question that cannot start within this many seconds is rejected as busy.
+CHATBOT_QUEUE_TIMEOUT = float(os.getenv('CHATBOT_QUEUE_TIMEOUT', '30'))
+# Fair-share weights for workspaces, e.g. "12:2,15:0.5" (unlisted workspaces weigh 1).
+CHATBOT_WORKSPACE_WEIGHTS = os.getenv('CHATBOT_WORKSPACE_WEIGHTS', '')
+# Fair-share weights for users within each workspace they ask in, in the same format.
+CHATBOT_USER_WEIGHTS = os.getenv('CHATBOT_USER_WEIGHTS', '')
+# Upper bound on one chatbot answer, in seconds; the engine plans its stages within it.
+CHATBOT_RESPONSE_TIMEOUT = float(os.getenv('CHATBOT_RESPONSE_TIMEOUT', '90'))
+# Deadline for questions asked in job mode ("mode": "job"), which are answered by the
+# process_tasks worker rather than within an HTTP request.
+CHATBOT_JOB_TIMEOUT = float(os.getenv('CHATBOT_JOB_TIMEOUT', '300'))
+# Per-stage caps within that deadline, in seconds. Generation is not started with less
+# than CHATBOT_MIN_GENERATION_SECONDS left; the retrieved excerpts are returned instead.
+CHATBOT_CLASSIFY_TIMEOUT = float(os.getenv('CHATBOT_CLASSIFY_TIMEOUT', '8'))
+CHATBOT_RETRIEVAL_TIMEOUT = float(os.getenv('CHATBOT_RETRIEVAL_TIMEOUT', '15'))
+CHATBOT_MIN_GENERATION_SECONDS = float(os.getenv('CHATBOT_MIN_GENERATION_SECONDS', '5'))
+# Threads that run deadline-bounded calls (LLM calls and retrieval). An LLM call stops at its
+# deadline, but keep this well above CHATBOT_MAX_CONCURRENT_PIPELINES so calls still finishing
+# never make retrieval queue behind them.
+CHATBOT_DEADLINE_WORKERS = int(os.getenv('CHATBOT_DEADLINE_WORKERS', '32'))
+# Batch questions (/api/chatbot/ask/batch/): at most MAX_QUESTIONS per request, answered
+# WORKERS at a time (each answer still takes a pipeline slot) on one pool of POOL_WORKERS
+# threads shared by every batch in the process.
+CHATBOT_BATCH_MAX_QUESTIONS = int(os.getenv('CHATBOT_BATCH_MAX_QUESTIONS', '20'))
+CHATBOT_BATCH_WORKERS = int(os.getenv('CHATBOT_BATCH_WORKERS', '4'))
+CHATBOT_BATCH_POOL_WORKERS = int(os.getenv('CHATBOT_BATCH_POOL_WORKERS', '16'))
+# Chat model defaults. Each chain (CLASSIFIER, QA, SUMMARY, ABSTRACT, COMBINE, MEMORY) can override
+# them with CHATBOT_<CHAIN>_MODEL, CHATBOT_<CHAIN>_TEMPERATURE and CHATBOT_<CHAIN>_LLM_TIMEOUT,
+# e.g. a smaller, faster model for routing and abstract extraction.
+CHATBOT_LLM_MODEL = os.getenv('CHATBOT_LLM_MODEL', 'gemini-flash-latest')
+CHATBOT_LLM_TEMPERATURE = float(os.getenv('CHATBOT_LLM_TEMPERATURE', '0.2'))
+CHATBOT_LLM_TIMEOUT = float(os.getenv('CHATBOT_LLM_TIMEOUT', '30'))  # seconds, per provider call
+CHATBOT_CHAIN_LLMS = {
+    chain: {
+        'model': os.getenv(f'CHATBOT_{chain.upper()}_MODEL') or CHATBOT_LLM_MODEL,
+        'temperature': float(os.getenv(f'CHATBOT_{chain.upper()}_TEMPERATURE') or CHATBOT_LLM_TEMPERATURE),
+        'timeout': float(os.getenv(f'CHATBOT_{chain.upper()}_LLM_TIMEOUT') or CHATBOT_LLM_TIMEOUT),
+    }
+    for chain in ('classifier', 'qa', 'summary', 'abstract', 'combine', 'memory')
+}
+# Circuit breakers for the LLM and embedding providers: once at least MIN_CALLS calls in the
+# last WINDOW seconds fail at FAILURE_RATE or more, calls fail fast (degraded answers) for
+# OPEN_SECONDS, after which a single probe call decides whether to close again.
+CHATBOT_BREAKER_FAILURE_RATE = float(os.getenv('CHATBOT_BREAKER_FAILURE_RATE', '0.5'))
+CHATBOT_BREAKER_MIN_CALLS = int(os.getenv('CHATBOT_BREAKER_MIN_CALLS', '5'))
+CHATBOT_BREAKER_WINDOW = float(os.getenv('CHATBOT_BREAKER_WINDOW', '60'))
+CHATBOT_BREAKER_OPEN_SECONDS = float(os.getenv('CHATBOT_BREAKER_OPEN_SECONDS', '30'))
+# Hedged LLM calls: a classifier/QA call still running after the chain's PERCENTILE latency
+# (at least MIN_DELAY seconds) gets a duplicate request, and the first answer wins. BUDGETS caps
+# the fraction of each chain's calls that may be hedged, e.g. "qa:0.1,classifier:0.05"; off when empty.
+CHATBOT_HEDGE_BUDGETS = os.getenv('CHATBOT_HEDGE_BUDGETS', '')
+CHATBOT_HEDGE_PERCENTILE = float(os.getenv('CHATBOT_HEDGE_PERCENTILE', '95'))
+CHATBOT_HEDGE_MIN_DELAY = float(os.getenv('CHATBOT_HEDGE_MIN_DELAY', '0.5'))
+# Conversational memory: follow-up questions are rewritten into standalone ones using the last
+# RECENT_TURNS question/answer pairs and a rolling summary of older turns (at most SUMMARY_CHARS),
+# kept per user and workspace and updated incrementally from the chat history.
+CHATBOT_MEMORY = os.getenv('CHATBOT_MEMORY', 'true').lower() == 'true'
+CHATBOT_MEMORY_RECENT_TURNS = int(os.getenv('CHATBOT_MEMORY_RECENT_TURNS', '4'))
+CHATBOT_MEMORY_SUMMARY_CHARS = int(os.getenv('CHATBOT_MEMORY_SUMMARY_CHARS', '1200'))
+CHATBOT_MEMORY_CACHE_SIZE = int(os.getenv('CHATBOT_MEMORY_CACHE_SIZE', '1024'))
+CHATBOT_MEMORY_CACHE_TTL = int(os.getenv('CHATBOT_MEMORY_CACHE_TTL', '3600'))  # seconds
+# Store a ChatTrace (stage timings, tokens, chunk ids, cache hits) for every chatbot answer.
+CHATBOT_TELEMETRY = os.getenv('CHATBOT_TELEMETRY', 'true').lower() == 'true'
+# Upper bound on the (deduplicated) retrieved context sent to the QA prompt, in estimated tokens.
+CHATBOT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHATBOT_CONTEXT_TOKEN_BUDGET', '1500'))
+# Comparison questions search each of at most MAX_DOCUMENTS documents separately for its top
+# K_PER_DOCUMENT chunks, and split the context budget evenly between them. The index is loaded
+# and the question embedded once; the filtered searches run on a pool of WORKERS threads.
+CHATBOT_COMPARE_MAX_DOCUMENTS = int(os.getenv('CHATBOT_COMPARE_MAX_DOCUMENTS', '4'))
+CHATBOT_COMPARE_K_PER_DOCUMENT = int(os.getenv('CHATBOT_COMPARE_K_PER_DOCUMENT', '3'))
+CHATBOT_COMPARE_WORKERS = int(os.getenv('CHATBOT_COMPARE_WORKERS', '8'))
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -71,6 +71,13 @@ urlpatterns = [
     path('pdfs/', include('pdfs.urls')),
     path('workspace/<int:workspace_id>/delete/', workspace_views.delete_workspace_view, name='delete_workspace'),
     path('api/chatbot/ask/', chatbot_views.ask_question, name='chatbot_ask'),
+    path('api/chatbot/ask/stream/', chatbot_views.ask_question_stream, name='chatbot_ask_stream'),
+    path('api/chatbot/ask/batch/', chatbot_views.ask_question_batch, name='chatbot_ask_batch'),
+    path('api/chatbot/ask/async/', chatbot_views.ask_question_async, name='chatbot_ask_async'),
+    path('api/chatbot/jobs/<uuid:job_id>/', chatbot_views.chatbot_job_status, name='chatbot_job_status'),
+    path('api/chatbot/queue/', chatbot_views.chatbot_queue_status, name='chatbot_queue_status'),
+    path('api/chatbot/status/', chatbot_views.chatbot_provider_status, name='chatbot_provider_status'),
+    path('api/chatbot/telemetry/', chatbot_views.chatbot_telemetry, name='chatbot_telemetry'),
 
     # ================
     #   DRF Routers
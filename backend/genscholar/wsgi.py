@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'genscholar.settings')
 
 application = get_wsgi_application()
+
+# Load the chatbot models in the background so the first question is not slow.
+if settings.CHATBOT_WARM_UP:
+    from chatbot.engine import warm_up
+    warm_up(background=True)
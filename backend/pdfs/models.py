@@ -10,6 +10,7 @@ class PDFFile(models.Model):
     title = models.CharField(max_length=200)
     file = models.BinaryField()  # Store PDF bytes directly in database
     uploaded_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     
     # --- MODIFIED FIELDS FOR CHATBOT ---
     
@@ -1,5 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from chatbot.caching import ANSWER_CACHE
+from chatbot.tasks import refresh_workspace_digests_task
+from chatbot.titles import invalidate_title_index
 from .models import PDFFile  
 from .tasks import process_pdf_task  # Import our new task
 
@@ -13,4 +16,30 @@ def schedule_pdf_processing(sender, instance, created, **kwargs):
         print(f"New PDFFile created (ID: {instance.id}). Scheduling processing task.")
         # This is the magic: it adds the task to the database queue
         # It will run as soon as 'python manage.py process_tasks' is running
-        process_pdf_task(instance.id)
\ No newline at end of file
+        process_pdf_task(instance.id)
+
+
+@receiver(post_save, sender=PDFFile)
+@receiver(post_delete, sender=PDFFile)
+def invalidate_chatbot_caches(sender, instance, **kwargs):
+    """
+    Any upload, rename or delete changes what the chatbot can answer from.
+    The workspace index version is derived from the PDF rows, so other
+    workers miss their stale entries on their own; this process frees its
+    entries right away.
+    """
+    ANSWER_CACHE.invalidate_workspace(instance.workspace_id)
+    invalidate_title_index(instance.workspace_id)
+
+
+@receiver(post_save, sender=PDFFile)
+@receiver(post_delete, sender=PDFFile)
+def schedule_digest_refresh(sender, instance, created=False, **kwargs):
+    """
+    Refresh the workspace's combined summary/abstract when a document's
+    summary, abstract or title changes or a document is removed. A fresh
+    upload has neither yet; its processing save schedules the refresh.
+    """
+    if created:
+        return
+    refresh_workspace_digests_task(instance.workspace_id)
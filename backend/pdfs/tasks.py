@@ -1,6 +1,13 @@
 from background_task import background
-# --- UPDATED IMPORT ---
-from chatbot.engine import add_pdf_to_workspace_index
+
+
+def add_pdf_to_workspace_index(pdf_id):
+    # Imported here rather than at module level: pdfs.signals imports this
+    # module during django.setup(), and the chatbot engine pulls in LangChain.
+    from chatbot.engine import add_pdf_to_workspace_index as add_to_index
+
+    return add_to_index(pdf_id)
+
 
 # This registers our function as a background task
 @background(schedule=5) # 5-second delay
@@ -13,4 +20,4 @@ def process_pdf_task(pdf_document_id):
     
     # --- UPDATED FUNCTION CALL ---
     # Call the new function that adds the PDF to the *workspace* index
-    add_pdf_to_workspace_index(pdf_document_id)
\ No newline at end of file
+    add_pdf_to_workspace_index(pdf_document_id)
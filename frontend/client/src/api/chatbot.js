@@ -80,3 +80,180 @@ export async function askChatbot(workspaceId, question) {
   }
 }
 
+
+/**
+ * Ask a question to the AI chatbot and receive the answer as it is generated
+ * @param {string|number} workspaceId - Workspace ID
+ * @param {string} question - User's question
+ * @param {function(string): void} onToken - Called with each new piece of the answer
+ * @returns {Promise<object>} - Final event with user_question, ai_answer and time_to_first_token_ms
+ */
+export async function askChatbotStream(workspaceId, question, onToken) {
+  const csrfToken = await getCsrfToken();
+
+  const controller = new AbortController();
+  const timeoutId = setTimeout(() => controller.abort(), 90000); // 90 second timeout
+
+  try {
+    const response = await fetch(buildApiUrl('/api/chatbot/ask/stream/'), {
+      method: 'POST',
+      credentials: 'include',
+      signal: controller.signal,
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': csrfToken,
+      },
+      body: JSON.stringify({
+        question: question,
+        workspace_id: workspaceId,
+      }),
+    });
+
+    if (!response.ok || !response.body) {
+      let errorMessage = `Failed to get chatbot response: ${response.statusText}`;
+      try {
+        const errorData = await response.json();
+        errorMessage = errorData.error || errorData.detail || errorData.message || errorMessage;
+      } catch (e) {
+        // Keep the status text
+      }
+      throw new Error(errorMessage);
+    }
+
+    // Newline-delimited JSON: {"type": "token", "text": ...} ... {"type": "done", ...},
+    // or a single {"type": "busy", ...} when the question could not be started.
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let finalEvent = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.type === 'token') {
+          // The answer is arriving, so the request is no longer at risk of hanging.
+          clearTimeout(timeoutId);
+          onToken(event.text);
+        } else if (event.type === 'done') {
+          finalEvent = event;
+        } else if (event.type === 'busy') {
+          // The server queue is full; the message says how long to wait before retrying.
+          const busyError = new Error(event.error);
+          busyError.busy = true;
+          throw busyError;
+        }
+      }
+    }
+
+    clearTimeout(timeoutId);
+    if (!finalEvent) {
+      throw new Error('The AI response ended unexpectedly. Please try again.');
+    }
+    return finalEvent;
+  } catch (error) {
+    clearTimeout(timeoutId);
+    if (error.name === 'AbortError') {
+      throw new Error('Request timed out. The AI is taking too long to respond. Please try again with a simpler question.');
+    }
+    throw error;
+  }
+}
+
+
+/**
+ * Get the status of a chatbot job, and its answer once finished
+ * @param {string} jobId - Job ID returned by askChatbotJob
+ * @returns {Promise<object>} - Job with status, user_question and, when finished, ai_answer or error
+ */
+export async function getChatbotJob(jobId) {
+  const response = await fetch(buildApiUrl(`/api/chatbot/jobs/${jobId}/`), {
+    method: 'GET',
+    credentials: 'include',
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to get chatbot job: ${response.statusText}`);
+  }
+  return response.json();
+}
+
+
+/**
+ * Ask a question as a background job and wait for its answer. The server
+ * queues the question instead of holding the request open, and the answer
+ * arrives on the chatbot job socket; the job is polled in case the push is missed.
+ * @param {string|number} workspaceId - Workspace ID
+ * @param {string} question - User's question
+ * @param {number} pollInterval - Milliseconds between status checks
+ * @returns {Promise<object>} - Finished job with user_question and ai_answer
+ */
+export async function askChatbotJob(workspaceId, question, pollInterval = 5000) {
+  const csrfToken = await getCsrfToken();
+
+  const response = await fetch(buildApiUrl('/api/chatbot/ask/'), {
+    method: 'POST',
+    credentials: 'include',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-CSRFToken': csrfToken,
+    },
+    body: JSON.stringify({
+      question: question,
+      workspace_id: workspaceId,
+      mode: 'job',
+    }),
+  });
+
+  const submitted = await response.json().catch(() => ({}));
+  if (response.status !== 202 || !submitted.job_id) {
+    throw new Error(submitted.error || `Failed to queue chatbot question: ${response.statusText}`);
+  }
+
+  return new Promise((resolve, reject) => {
+    let socket = null;
+    let pollId = null;
+    let finished = false;
+
+    const finish = (job) => {
+      if (finished || (job.status !== 'done' && job.status !== 'failed')) return;
+      finished = true;
+      clearInterval(pollId);
+      if (socket) socket.close();
+      if (job.status === 'failed') {
+        reject(new Error(job.error || 'The AI could not answer this question.'));
+      } else {
+        resolve(job);
+      }
+    };
+
+    const protocol = window.location.protocol === "https:" ? "wss" : "ws";
+    socket = new WebSocket(`${protocol}://${window.location.host}/ws/chatbot/jobs/`);
+    socket.onmessage = (e) => {
+      const job = JSON.parse(e.data);
+      if (job.type === 'chatbot_answer' && job.job_id === submitted.job_id) {
+        finish(job);
+      }
+    };
+    socket.onerror = (error) => {
+      console.error('Chatbot job socket error:', error);
+    };
+
+    const poll = async () => {
+      try {
+        finish(await getChatbotJob(submitted.job_id));
+      } catch (error) {
+        console.error('Failed to poll chatbot job:', error);
+      }
+    };
+    pollId = setInterval(poll, pollInterval);
+    // The job may have finished before the socket connected.
+    socket.onopen = poll;
+  });
+}
@@ -3,7 +3,7 @@ import { storage } from '../utils/storage';
 import { STORAGE_KEYS } from '../utils/constants';
 import { generateId } from '../utils/ids';
 import Icon from './Icon';
-import { askChatbot } from '../api/chatbot.js';
+import { askChatbotJob, askChatbotStream } from '../api/chatbot.js';
 import MentionAutocomplete from './MentionAutocomplete';
 import { renderMessageWithMentions } from '../utils/mentions.jsx';
 
@@ -48,9 +48,36 @@ export default function ChatbotPanel({ workspaceId }) {
     setInput('');
     setIsTyping(true);
 
+    const botMessageId = generateId();
+    const botCreatedAt = new Date().toISOString();
+    let streamedAnswer = '';
+
+    const streamAnswer = async () => {
+      try {
+        return await askChatbotStream(workspaceId, userInput, (token) => {
+          streamedAnswer += token;
+          setIsTyping(false);
+          setMessages([
+            ...updatedWithUser,
+            {
+              id: botMessageId,
+              role: 'assistant',
+              content: streamedAnswer.replace(/\*/g, ''),
+              createdAt: botCreatedAt
+            }
+          ]);
+          shouldAutoScroll.current = true;
+        });
+      } catch (error) {
+        if (!error.busy) throw error;
+        // The server is at capacity: queue the question and wait for the job to finish instead.
+        return askChatbotJob(workspaceId, userInput);
+      }
+    };
+
     try {
-      // Call the real API
-      const response = await askChatbot(workspaceId, userInput);
+      // Call the streaming API; show the answer as the tokens arrive
+      const response = await streamAnswer();
       
       // Remove markdown asterisks from the response
       const cleanAnswer = (response.ai_answer || 'Sorry, I could not generate a response.')
@@ -58,10 +85,10 @@ export default function ChatbotPanel({ workspaceId }) {
         .replace(/\*/g, ''); // Remove any remaining asterisks
       
       const botMessage = {
-        id: generateId(),
+        id: botMessageId,
         role: 'assistant',
         content: cleanAnswer,
-        createdAt: new Date().toISOString()
+        createdAt: botCreatedAt
       };
 
       const updatedWithBot = [...updatedWithUser, botMessage];